@@ -0,0 +1,196 @@
+import os
+import threading
+import time
+from collections import Counter
+
+from flask import g, request
+
+from backend.metrics import metrics
+
+# Most urgent first; a class is admitted only when no more urgent class is waiting for a slot it could take
+CRITICAL, WRITE, DASHBOARD, BULK = CLASSES = ('critical', 'write', 'dashboard', 'bulk')
+
+READ_METHODS = ('GET', 'HEAD')
+# Long-lived or operational routes that are never queued or shed
+EXEMPT_RULES = {'/api/stream'}
+# Routes that read or write whole tables; everything else is a write or a dashboard read
+BULK_RULES = {
+    '/api/donors', '/api/patients', '/api/inventory', '/api/inventory/ledger', '/api/requests',
+    '/api/donation-records', '/api/export/<string:table>', '/api/bulk/<string:table>', '/api/sync',
+}
+RETRY_AFTER_SECONDS = 1
+
+
+def classify():
+    """The admission class of the current request, or None when it bypasses admission control.
+
+    Creating a Critical request, fulfilling a request and running the
+    allocator are critical. Other writes come next, then single-row and
+    dashboard reads; list pages, exports and bulk imports are bulk.
+    """
+    rule = request.url_rule.rule if request.url_rule is not None else None
+    if rule is None or not rule.startswith('/api/') or rule in EXEMPT_RULES or request.method == 'OPTIONS':
+        return None
+    if rule == '/api/allocations/run':
+        return CRITICAL
+    if rule in ('/api/requests', '/api/requests/<int:request_id>') and request.method in ('POST', 'PUT'):
+        data = request.get_json(silent=True)
+        if isinstance(data, dict) and (data.get('priority') == 'Critical' or data.get('status') == 'Fulfilled'):
+            return CRITICAL
+    if rule in BULK_RULES and (request.method in READ_METHODS or rule == '/api/bulk/<string:table>'):
+        return BULK
+    return DASHBOARD if request.method in READ_METHODS else WRITE
+
+
+def parse_classes(value, cast):
+    """{class: value} from 'write=3,bulk=1' style settings; a dict is taken as is."""
+    if isinstance(value, dict):
+        parsed = dict(value)
+    else:
+        parsed = {}
+        for part in (value or '').split(','):
+            if part.strip():
+                name, _, number = part.partition('=')
+                parsed[name.strip()] = number
+    unknown = set(parsed) - set(CLASSES)
+    if unknown:
+        raise ValueError(f"Unknown admission class(es): {', '.join(sorted(unknown))}")
+    return {name: cast(number) for name, number in parsed.items()}
+
+
+class AdmissionController:
+    """Per-process concurrency limits by traffic class.
+
+    At most ``capacity`` admitted requests run at once, and at most
+    ``limits[class]`` of each class. Requests that find no slot wait up to
+    ``max_wait[class]`` seconds and are woken most urgent class first.
+    Non-critical requests, running and waiting together, never take more
+    than ``capacity - reserve`` slots, so ``reserve`` request threads are
+    always left for critical traffic. Beyond that, a new request evicts a
+    waiter of a less urgent class, or is shed itself when there is none.
+    """
+
+    def __init__(self, capacity, reserve, limits, max_wait):
+        self.capacity = capacity
+        self.reserve = reserve
+        self.limits = limits
+        self.max_wait = max_wait
+        self.running = Counter()
+        self.waiting = Counter()
+        self.evicted = Counter()
+        self._condition = threading.Condition()
+
+    def _occupied(self):
+        return sum(self.running[name] + self.waiting[name] for name in CLASSES if name != CRITICAL)
+
+    def _can_start(self, name):
+        if self.running[name] >= self.limits[name] or sum(self.running.values()) >= self.capacity:
+            return False
+        return not any(self.waiting[other] and self.running[other] < self.limits[other]
+                       for other in CLASSES[:CLASSES.index(name)])
+
+    def acquire(self, name):
+        """Wait for a slot of class ``name``: (seconds waited, None) or (seconds waited, 'shed' or 'timeout')."""
+        started = time.monotonic()
+        with self._condition:
+            if name != CRITICAL and self._occupied() >= self.capacity - self.reserve:
+                victims = [other for other in CLASSES[CLASSES.index(name) + 1:]
+                           if self.waiting[other] > self.evicted[other]]
+                if not victims:
+                    return 0.0, 'shed'
+                self.evicted[victims[-1]] += 1
+                self._condition.notify_all()
+            deadline = started + self.max_wait[name]
+            self.waiting[name] += 1
+            try:
+                while True:
+                    if self.evicted[name]:
+                        self.evicted[name] -= 1
+                        return time.monotonic() - started, 'shed'
+                    if self._can_start(name):
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        # Classes this waiter held back may start now
+                        self._condition.notify_all()
+                        return time.monotonic() - started, 'timeout'
+                    self._condition.wait(remaining)
+            finally:
+                self.waiting[name] -= 1
+                self.evicted[name] = min(self.evicted[name], self.waiting[name])
+            self.running[name] += 1
+        return time.monotonic() - started, None
+
+    def release(self, name):
+        with self._condition:
+            self.running[name] -= 1
+            self._condition.notify_all()
+
+    def stats(self):
+        """Gauges for /metrics: running, waiting and limit per class."""
+        with self._condition:
+            stats = {'capacity': self.capacity, 'critical_reserve': self.reserve}
+            for name in CLASSES:
+                stats[f'{name}_running'] = self.running[name]
+                stats[f'{name}_waiting'] = self.waiting[name]
+                stats[f'{name}_limit'] = self.limits[name]
+        return stats
+
+
+def init_admission(app):
+    """Queue or shed API requests by class when the process is saturated; returns the controller or None.
+
+    Config: ADMISSION_ENABLED (default False), ADMISSION_CAPACITY (admitted
+    requests running at once, default WEB_THREADS), ADMISSION_CRITICAL_RESERVE
+    (slots only critical requests may use, default 1), ADMISSION_LIMITS
+    (per-class concurrency, e.g. ``bulk=1``; by default every class but bulk
+    may use all non-reserved slots and bulk half of them) and
+    ADMISSION_MAX_WAIT (per-class seconds to wait for a slot, default
+    ``critical=10,write=2,dashboard=1,bulk=0.25``). Shed and timed-out requests
+    get 429 with Retry-After; a critical request that times out gets 503.
+    """
+    app.config.setdefault('ADMISSION_ENABLED', os.environ.get('ADMISSION_ENABLED', '').lower() == 'true')
+    app.config.setdefault('ADMISSION_CAPACITY', int(os.environ.get('ADMISSION_CAPACITY', app.config['WEB_THREADS'])))
+    app.config.setdefault('ADMISSION_CRITICAL_RESERVE', int(os.environ.get('ADMISSION_CRITICAL_RESERVE', 1)))
+    app.config.setdefault('ADMISSION_LIMITS', os.environ.get('ADMISSION_LIMITS', ''))
+    app.config.setdefault('ADMISSION_MAX_WAIT', os.environ.get('ADMISSION_MAX_WAIT', ''))
+    if not app.config['ADMISSION_ENABLED']:
+        return None
+
+    capacity = max(app.config['ADMISSION_CAPACITY'], 1)
+    reserve = min(max(app.config['ADMISSION_CRITICAL_RESERVE'], 0), capacity - 1)
+    shared = capacity - reserve
+    limits = {CRITICAL: capacity, WRITE: shared, DASHBOARD: shared, BULK: max(shared // 2, 1)}
+    limits.update(parse_classes(app.config['ADMISSION_LIMITS'], int))
+    max_wait = {CRITICAL: 10.0, WRITE: 2.0, DASHBOARD: 1.0, BULK: 0.25}
+    max_wait.update(parse_classes(app.config['ADMISSION_MAX_WAIT'], float))
+    controller = AdmissionController(capacity, reserve, {name: max(limit, 1) for name, limit in limits.items()},
+                                     max_wait)
+    app.extensions['admission'] = controller
+
+    @app.before_request
+    def _admit():
+        # g outlives the request when an app context is shared (tests, CLI)
+        g.pop('admission_class', None)
+        g.pop('admission_wait', None)
+        name = classify()
+        if name is None:
+            return None
+        waited, refused = controller.acquire(name)
+        metrics.observe_admission(name, waited, refused)
+        if refused is None:
+            g.admission_class = name
+            g.admission_wait = waited
+            return None
+        status = 503 if name == CRITICAL else 429
+        return ({'error': 'The server is busy; retry shortly', 'admission_class': name}, status,
+                {'Retry-After': str(RETRY_AFTER_SECONDS)})
+
+    @app.teardown_request
+    def _release(error=None):
+        # Runs after a streamed response (exports) has been sent, so the slot covers the whole body
+        name = g.pop('admission_class', None)
+        if name is not None:
+            controller.release(name)
+
+    return controller
@@ -0,0 +1,184 @@
+import json
+from datetime import date
+
+import click
+from flask import request
+from flask.cli import with_appcontext
+from flask_restful import Resource
+from sqlalchemy import case, func
+
+from backend.database import db
+from backend.models import Allocation, BloodInventory, Request
+
+# Donor groups a recipient can receive red cells from, in order of preference:
+# the identical group first and universal O- last so it is kept for those who need it
+COMPATIBLE_DONORS = {
+    'O-': ('O-',),
+    'O+': ('O+', 'O-'),
+    'A-': ('A-', 'O-'),
+    'A+': ('A+', 'A-', 'O+', 'O-'),
+    'B-': ('B-', 'O-'),
+    'B+': ('B+', 'B-', 'O+', 'O-'),
+    'AB-': ('AB-', 'A-', 'B-', 'O-'),
+    'AB+': ('AB+', 'AB-', 'A+', 'A-', 'B+', 'B-', 'O+', 'O-'),
+}
+
+PRIORITY_ORDER = ('Critical', 'High', 'Medium', 'Low')
+QUEUE_STATUSES = ('Pending', 'Approved')
+
+
+class AllocationError(Exception):
+    pass
+
+
+def _lot_sort_key(recipient_group):
+    preference = {group: rank for rank, group in enumerate(COMPATIBLE_DONORS[recipient_group])}
+    return lambda lot: (preference[lot.blood_group], lot.expiry_date, lot.id)
+
+
+def _lock_available_lots(groups, today=None):
+    """Lock every usable lot of ``groups`` (row-level FOR UPDATE where the database supports it)."""
+    today = today or date.today()
+    return BloodInventory.query.filter(
+        BloodInventory.blood_group.in_(groups),
+        BloodInventory.status == 'Available',
+        BloodInventory.units_available > 0,
+        BloodInventory.expiry_date >= today
+    ).order_by(BloodInventory.expiry_date, BloodInventory.id).with_for_update().all()
+
+
+def allocated_units(request_id):
+    return db.session.query(func.coalesce(func.sum(Allocation.units), 0)).filter(
+        Allocation.request_id == request_id
+    ).scalar()
+
+
+def _pick(lots, units_needed):
+    """Take ``units_needed`` from ``lots`` (already in pick order); returns [(lot, units)] or None."""
+    picks = []
+    remaining = units_needed
+    for lot in lots:
+        if remaining == 0:
+            break
+        if lot.units_available <= 0:
+            continue
+        take = min(lot.units_available, remaining)
+        picks.append((lot, take))
+        remaining -= take
+    return picks if remaining == 0 else None
+
+
+def _apply_picks(blood_request, picks):
+    allocations = []
+    for lot, units in picks:
+        lot.units_available -= units
+        allocation = Allocation()
+        allocation.request_id = blood_request.id
+        allocation.inventory_id = lot.id
+        allocation.blood_group = lot.blood_group
+        allocation.units = units
+        db.session.add(allocation)
+        allocations.append(allocation)
+    return allocations
+
+
+def allocate_request(blood_request):
+    """Allocate stock for one request in the current transaction.
+
+    Compatible lots are locked, then taken identical-group first and
+    first-expiry-first-out within each group. Units already allocated to the
+    request are not taken twice. Raises AllocationError and changes nothing
+    if there is not enough compatible stock; the caller commits or rolls back.
+    """
+    units_needed = blood_request.units_requested - allocated_units(blood_request.id)
+    if units_needed <= 0:
+        return []
+
+    lots = sorted(_lock_available_lots(COMPATIBLE_DONORS[blood_request.blood_group]),
+                  key=_lot_sort_key(blood_request.blood_group))
+    picks = _pick(lots, units_needed)
+    if picks is None:
+        available = sum(lot.units_available for lot in lots)
+        raise AllocationError(
+            f'Insufficient compatible stock for {blood_request.blood_group}: '
+            f'{units_needed} units needed, {available} available'
+        )
+    return _apply_picks(blood_request, picks)
+
+
+def allocate_queue(statuses=QUEUE_STATUSES, limit=None, dry_run=False):
+    """Fulfil queued requests in priority order in one pass and one transaction.
+
+    All usable lots are locked and loaded once into a per-group stock index that
+    is consumed in memory; requests that cannot be fully served are left queued.
+    """
+    priority_rank = case({priority: rank for rank, priority in enumerate(PRIORITY_ORDER)},
+                         value=Request.priority)
+    query = Request.query.filter(Request.status.in_(statuses)).order_by(priority_rank, Request.date, Request.id)
+    if limit:
+        query = query.limit(limit)
+    queue = query.all()
+
+    already_allocated = dict(db.session.query(Allocation.request_id, func.sum(Allocation.units)).filter(
+        Allocation.request_id.in_([blood_request.id for blood_request in queue])
+    ).group_by(Allocation.request_id).all()) if queue else {}
+
+    stock = {}
+    for lot in _lock_available_lots(list(COMPATIBLE_DONORS)):
+        stock.setdefault(lot.blood_group, []).append(lot)
+
+    fulfilled, skipped = [], []
+    for blood_request in queue:
+        units_needed = blood_request.units_requested - already_allocated.get(blood_request.id, 0)
+        lots = [lot for group in COMPATIBLE_DONORS[blood_request.blood_group] for lot in stock.get(group, ())]
+        picks = _pick(lots, units_needed) if units_needed > 0 else []
+        if picks is None:
+            skipped.append(blood_request.id)
+            continue
+        allocations = _apply_picks(blood_request, picks)
+        blood_request.status = 'Fulfilled'
+        fulfilled.append({
+            'request_id': blood_request.id,
+            'priority': blood_request.priority,
+            'lots': [{'inventory_id': lot.id, 'blood_group': lot.blood_group, 'units': units} for lot, units in picks]
+        })
+
+    if dry_run:
+        db.session.rollback()
+    else:
+        db.session.commit()
+    return {'fulfilled': fulfilled, 'skipped': skipped, 'dry_run': dry_run}
+
+
+class RequestAllocationsResource(Resource):
+    def get(self, request_id):
+        Request.query.get_or_404(request_id)
+        allocations = Allocation.query.filter_by(request_id=request_id).order_by(Allocation.id).all()
+        return {'allocations': [allocation.to_dict() for allocation in allocations]}, 200
+
+
+class AllocationRunResource(Resource):
+    def post(self):
+        data = request.get_json(silent=True) or {}
+        try:
+            result = allocate_queue(
+                statuses=tuple(data.get('statuses', QUEUE_STATUSES)),
+                limit=data.get('limit'),
+                dry_run=bool(data.get('dry_run', False))
+            )
+            return result, 200
+        except Exception as e:
+            db.session.rollback()
+            return {'error': str(e)}, 400
+
+
+@click.command('allocate')
+@click.option('--status', 'statuses', multiple=True, default=QUEUE_STATUSES, show_default=True,
+              help='Request statuses that form the queue.')
+@click.option('--limit', type=int, help='Maximum number of requests to consider.')
+@click.option('--dry-run', is_flag=True, help='Report the allocation without committing it.')
+@with_appcontext
+def allocate_command(statuses, limit, dry_run):
+    """Allocate stock to queued requests in priority order."""
+    result = allocate_queue(statuses=statuses, limit=limit, dry_run=dry_run)
+    click.echo(json.dumps(result, indent=2))
@@ -0,0 +1,238 @@
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+from flask import request
+from flask_restful import Resource
+from sqlalchemy import case, func
+
+from backend.archive import archived_columns
+from backend.cache import cached
+from backend.database import db
+from backend.models import Donor, DonationRecord, Patient, Request
+from backend.pagination import ListQueryError
+
+BUCKETS = ('day', 'week', 'month')
+MAX_BUCKETS = 3700
+DEFAULT_WINDOW_DAYS = 365
+DEFAULT_TOP_GROUPS = 20
+
+# metric -> (model, date column, {dimension: column}, join for location)
+METRICS = {
+    'donations': (DonationRecord, DonationRecord.date_of_donation, {
+        'blood_group': DonationRecord.blood_group,
+        'location': Donor.location,
+    }, (Donor, Donor.id == DonationRecord.donor_id)),
+    'requests': (Request, Request.date, {
+        'blood_group': Request.blood_group,
+        'priority': Request.priority,
+        'status': Request.status,
+        'location': Patient.location,
+    }, (Patient, Patient.id == Request.patient_id)),
+}
+
+
+def bucket_start(day, bucket):
+    """First day of the day/week (Monday)/month containing ``day``."""
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def bucket_starts(start, end, bucket):
+    """Every bucket start from the one containing ``start`` through ``end``."""
+    current = bucket_start(start, bucket)
+    starts = []
+    while current <= end:
+        starts.append(current)
+        if bucket == 'month':
+            current = (current + timedelta(days=32)).replace(day=1)
+        else:
+            current += timedelta(days=7 if bucket == 'week' else 1)
+    return starts
+
+
+def _measures(metric):
+    if metric == 'donations':
+        return [func.count(DonationRecord.id).label('count'), func.sum(DonationRecord.units_donated).label('units')]
+    return [
+        func.count(Request.id).label('count'),
+        func.sum(Request.units_requested).label('units'),
+        func.sum(case((Request.status == 'Fulfilled', 1), else_=0)).label('fulfilled'),
+        func.sum(case((Request.status == 'Rejected', 1), else_=0)).label('rejected'),
+    ]
+
+
+def _archived_rows(metric, start, end, group_by, filters):
+    """(day, group) rows like the GROUP BY query's, folded from archived partitions in the window.
+
+    Works on the partitions' column arrays directly: the fold needs no id order
+    and no per-row objects.
+    """
+    model, date_column, _, (owner_model, _) = METRICS[metric]
+    partitions = archived_columns(model.__tablename__, start, end)
+    if not partitions:
+        return []
+    owner = 'donor_id' if metric == 'donations' else 'patient_id'
+    units_name = 'units_donated' if metric == 'donations' else 'units_requested'
+    first, last = start.isoformat(), end.isoformat()
+    locations = None
+    if group_by == 'location' or 'location' in filters:
+        # One primary key range instead of an IN list per chunk of ids. Inner join
+        # semantics: rows whose donor or patient is gone drop out, as in the SQL query
+        locations = dict(db.session.query(owner_model.id, owner_model.location).filter(owner_model.id.between(
+            min(min(columns[owner]) for columns in partitions),
+            max(max(columns[owner]) for columns in partitions))))
+
+    folded = {}
+    for columns in partitions:
+        days, units, statuses = columns[date_column.key], columns[units_name], columns.get('status')
+        if locations is not None:
+            columns = {**columns, 'location': [locations.get(owner_id) for owner_id in columns[owner]]}
+        tests = [(columns[name], value) for name, value in filters.items()]
+        groups = columns[group_by] if group_by else None
+        owned = columns['location'] if locations is not None else None
+        for index, day in enumerate(days):
+            if not first <= day <= last or any(values[index] != value for values, value in tests):
+                continue
+            if owned is not None and owned[index] is None:
+                continue
+            group_key = groups[index] if groups is not None else None
+            measures = folded.get((day, group_key))
+            if measures is None:
+                measures = folded[day, group_key] = [0, 0, 0, 0]
+            measures[0] += 1
+            measures[1] += units[index]
+            if statuses is not None:
+                measures[2] += statuses[index] == 'Fulfilled'
+                measures[3] += statuses[index] == 'Rejected'
+    return [SimpleNamespace(day=date.fromisoformat(day), group_key=group_key, count=count, units=units,
+                            fulfilled=fulfilled, rejected=rejected)
+            for (day, group_key), (count, units, fulfilled, rejected) in folded.items()]
+
+
+def run_analytics(metric, bucket='month', group_by=None, start=None, end=None, filters=None,
+                  top=DEFAULT_TOP_GROUPS):
+    """Bucketed series for ``metric`` from a single GROUP BY query, returned as aligned columns.
+
+    The query groups by the raw date so it streams through the covering
+    analytics index in order; days are folded into weeks or months here,
+    which costs one step per (day, group) rather than per row. Groups beyond
+    the ``top`` largest are folded into an 'other' series; missing buckets are
+    zero-filled so every series has one value per entry of 'buckets'.
+    """
+    model, date_column, dimensions, location_join = METRICS[metric]
+    end = end or date.today()
+    start = start or end - timedelta(days=DEFAULT_WINDOW_DAYS)
+    starts = bucket_starts(start, end, bucket)
+    if len(starts) > MAX_BUCKETS:
+        raise ListQueryError(f'window spans {len(starts)} {bucket} buckets; at most {MAX_BUCKETS} are allowed')
+
+    filters = filters or {}
+    group_column = dimensions[group_by] if group_by else None
+    columns = [date_column.label('day')]
+    if group_column is not None:
+        columns.append(group_column.label('group_key'))
+    measures = _measures(metric)
+    query = db.session.query(*columns, *measures).select_from(model)
+    if group_by == 'location' or 'location' in filters:
+        query = query.join(*location_join)
+    query = query.filter(date_column >= start, date_column <= end)
+    for name, value in filters.items():
+        query = query.filter(dimensions[name] == value)
+    group_columns = [date_column] + ([group_column] if group_column is not None else [])
+    rows = query.group_by(*group_columns).all()
+    # Months moved to the archive are read from their partition files
+    rows += _archived_rows(metric, start, end, group_by, filters)
+
+    names = [measure.name for measure in measures]
+    index = {start_day.isoformat(): position for position, start_day in enumerate(starts)}
+    series = {}
+    for row in rows:
+        key = row.group_key if group_column is not None else 'all'
+        values = series.get(key)
+        if values is None:
+            values = series[key] = {name: [0] * len(starts) for name in names}
+        position = index[bucket_start(row.day, bucket).isoformat()]
+        for name in names:
+            values[name][position] += int(getattr(row, name) or 0)
+
+    ranked = sorted(series.items(), key=lambda item: (-sum(item[1]['count']), str(item[0])))
+    if top and len(ranked) > top:
+        other = {name: [0] * len(starts) for name in names}
+        for _, values in ranked[top:]:
+            for name in names:
+                other[name] = [a + b for a, b in zip(other[name], values[name])]
+        ranked = ranked[:top] + [('other', other)]
+
+    result_series = []
+    totals = {name: 0 for name in names}
+    for key, values in ranked:
+        entry = {'key': key, **values}
+        if metric == 'requests':
+            entry['fulfilment_rate'] = [round(fulfilled / count, 4) if count else None
+                                        for fulfilled, count in zip(values['fulfilled'], values['count'])]
+        for name in names:
+            totals[name] += sum(values[name])
+        result_series.append(entry)
+    if metric == 'requests':
+        totals['fulfilment_rate'] = round(totals['fulfilled'] / totals['count'], 4) if totals['count'] else None
+
+    return {
+        'metric': metric,
+        'bucket': bucket,
+        'group_by': group_by,
+        'date_from': start.isoformat(),
+        'date_to': end.isoformat(),
+        'buckets': [start_day.isoformat() for start_day in starts],
+        'series': result_series,
+        'totals': totals,
+    }
+
+
+def _parse_date(name, value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ListQueryError(f"'{name}' must be a date in YYYY-MM-DD format")
+
+
+def _parse_top(value):
+    try:
+        top = int(value)
+    except ValueError:
+        raise ListQueryError("'top' must be an integer")
+    if top < 0:
+        raise ListQueryError("'top' must be >= 0")
+    return top
+
+
+class AnalyticsResource(Resource):
+    @cached('donation_records', 'requests', 'donors', 'patients')
+    def get(self):
+        args = request.args
+        metric = args.get('metric', 'donations')
+        bucket = args.get('bucket', 'month')
+        group_by = args.get('group_by') or None
+        try:
+            if metric not in METRICS:
+                raise ListQueryError(f"'metric' must be one of {', '.join(METRICS)}")
+            if bucket not in BUCKETS:
+                raise ListQueryError(f"'bucket' must be one of {', '.join(BUCKETS)}")
+            dimensions = METRICS[metric][2]
+            if group_by and group_by not in dimensions:
+                raise ListQueryError(f"'group_by' for {metric} must be one of {', '.join(dimensions)}")
+            start = _parse_date('date_from', args['date_from']) if args.get('date_from') else None
+            end = _parse_date('date_to', args['date_to']) if args.get('date_to') else None
+            if start and end and start > end:
+                raise ListQueryError("'date_from' must not be after 'date_to'")
+            top = _parse_top(args.get('top', DEFAULT_TOP_GROUPS))
+            filters = {name: args[name] for name in dimensions if args.get(name)}
+            for name, value in filters.items():
+                enums = getattr(dimensions[name].type, 'enums', None)
+                if enums and value not in enums:
+                    raise ListQueryError(f"'{name}' must be one of {', '.join(enums)}")
+            return run_analytics(metric, bucket, group_by, start, end, filters, top), 200
+        except ListQueryError as e:
+            return {'error': str(e)}, 400
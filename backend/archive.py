@@ -0,0 +1,406 @@
+import gzip
+import hashlib
+import heapq
+import json
+import os
+from bisect import bisect_right
+from collections import Counter
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from itertools import islice
+from operator import itemgetter
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import Date, DateTime, delete, func, insert, select, update
+
+from backend.cache import bump_table_versions
+from backend.database import db
+from backend.models import Allocation, ArchivePartition, DonationRecord, Request
+from backend.pagination import EQUALITY_FILTERS, serialize_value
+from backend.serialization import dumps, loads
+from backend.stats import COUNTED_COLUMNS, add_row_deltas, month_starts
+from backend.sync import record_tombstones
+
+FORMAT_VERSION = 1
+COMPRESSION_LEVEL = 6
+# Ids per IN (...) when copying and deleting archived rows
+CHUNK_SIZE = 500
+# Decoded partitions kept in memory per process
+PARTITION_CACHE_SIZE = 16
+
+# table -> (model, partition date column, condition on the rows that may leave the hot table)
+ARCHIVED_TABLES = {
+    'donation_records': (DonationRecord, DonationRecord.date_of_donation, None),
+    # Pending and approved requests stay hot, however old, until they are fulfilled or rejected
+    'requests': (Request, Request.date, Request.status.in_(('Fulfilled', 'Rejected'))),
+}
+# Rows of another table that belong to an archived row and move with it: table -> (model, foreign key)
+DEPENDENTS = {
+    'requests': (Allocation, Allocation.request_id),
+}
+
+
+def archive_dir():
+    """ARCHIVE_DIR, by default ``archive`` in the instance folder."""
+    return (current_app.config.get('ARCHIVE_DIR') or os.environ.get('ARCHIVE_DIR')
+            or os.path.join(current_app.instance_path, 'archive'))
+
+
+def next_month(month):
+    return (month + timedelta(days=32)).replace(day=1)
+
+
+def archive_cutoff(after_months, today=None):
+    """First day of the oldest month kept hot: the current month and ``after_months`` full months before it."""
+    return month_starts(after_months + 1, today)[-1]
+
+
+def _chunks(values, size=CHUNK_SIZE):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _encode(columns, rows):
+    """Rows as {column: [values]}, with dates as ISO strings like the API returns them."""
+    return {column.name: [serialize_value(row[position]) for row in rows] for position, column in enumerate(columns)}
+
+
+def _decode(column, value):
+    if value is None:
+        return None
+    if isinstance(column.type, DateTime):
+        return datetime.fromisoformat(value)
+    if isinstance(column.type, Date):
+        return date.fromisoformat(value)
+    return value
+
+
+def _write_file(path, payload):
+    """Write ``payload`` gzip-compressed via a temporary file; returns (bytes, sha256)."""
+    data = gzip.compress(dumps(payload), COMPRESSION_LEVEL)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f'{path}.tmp'
+    with open(temporary, 'wb') as handle:
+        handle.write(data)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(temporary, path)
+    return len(data), hashlib.sha256(data).hexdigest()
+
+
+@lru_cache(maxsize=PARTITION_CACHE_SIZE)
+def _load(path, sha256):
+    # Keyed by checksum too: a month restored and archived again reuses its file name
+    with open(path, 'rb') as handle:
+        return loads(gzip.decompress(handle.read()))
+
+
+def load_partition(partition):
+    """The decoded contents of an archive_partitions row's file: {'columns': {name: [values]}, ...}."""
+    return _load(os.path.join(archive_dir(), partition.path), partition.sha256)
+
+
+def due_months(after_months, today=None):
+    """(table, month, rows) for every month with archivable rows dated before the hot window, oldest first."""
+    cutoff = archive_cutoff(after_months, today)
+    due = []
+    for table, (model, date_column, condition) in ARCHIVED_TABLES.items():
+        conditions = [condition] if condition is not None else []
+        oldest = db.session.query(func.min(date_column)).filter(date_column < cutoff, *conditions).scalar()
+        month = oldest.replace(day=1) if oldest else cutoff
+        while month < cutoff:
+            following = next_month(month)
+            rows = db.session.query(func.count(model.id)).filter(
+                date_column >= month, date_column < following, *conditions).scalar()
+            if rows:
+                due.append((table, month, rows))
+            month = following
+    return due
+
+
+def archive_month(table, month):
+    """Move the archivable rows of ``table`` dated in ``month`` to a new compressed partition file.
+
+    The catalog row is inserted first, so a second archiver of the same month
+    fails on the unique (table, month, part) key instead of rewriting the file.
+    The rows leave the hot table in the transaction that records the file.
+    Returns the catalog row, or None if the month had nothing to archive.
+    """
+    model, date_column, condition = ARCHIVED_TABLES[table]
+    source = model.__table__
+    catalog = ArchivePartition.__table__
+    connection = db.session.connection()
+    try:
+        part = (connection.execute(select(func.max(catalog.c.part)).where(
+            catalog.c.table_name == table, catalog.c.month == month)).scalar() or 0) + 1
+        path = f'{table}/{month:%Y-%m}.{part}.json.gz'
+        partition_id = connection.execute(insert(catalog).values(
+            table_name=table, month=month, part=part, path=path, rows=0, bytes=0, sha256='', counters='[]',
+            archived_at=datetime.utcnow())).inserted_primary_key[0]
+
+        query = select(*source.c).where(date_column >= month, date_column < next_month(month))
+        if condition is not None:
+            query = query.where(condition)
+        rows = connection.execute(query.order_by(source.c.id).with_for_update()).all()
+        if not rows:
+            db.session.rollback()
+            return None
+        ids = [row.id for row in rows]
+
+        counters = Counter()
+        for row in rows:
+            add_row_deltas(counters, table, {name: getattr(row, name) for name in COUNTED_COLUMNS[table]})
+        payload = {'format': FORMAT_VERSION, 'table': table, 'month': month.isoformat(),
+                   'columns': _encode(source.c, rows), 'dependents': {}}
+        dependent = DEPENDENTS.get(table)
+        if dependent:
+            dependent_model, foreign_key = dependent
+            dependent_rows = []
+            for chunk in _chunks(ids):
+                dependent_rows.extend(connection.execute(select(*dependent_model.__table__.c).where(
+                    foreign_key.in_(chunk)).order_by(dependent_model.id)).all())
+            payload['dependents'][dependent_model.__tablename__] = _encode(dependent_model.__table__.c,
+                                                                            dependent_rows)
+
+        size, digest = _write_file(os.path.join(archive_dir(), path), payload)
+        connection.execute(update(catalog).where(catalog.c.id == partition_id).values(
+            rows=len(rows), min_id=ids[0], max_id=ids[-1], bytes=size, sha256=digest,
+            counters=json.dumps([[scope, key, value] for (scope, key), value in sorted(counters.items()) if value])))
+        for chunk in _chunks(ids):
+            if dependent:
+                connection.execute(delete(dependent_model.__table__).where(foreign_key.in_(chunk)))
+            connection.execute(delete(source).where(source.c.id.in_(chunk)))
+        # Offline clients drop archived rows as the hot table did
+        record_tombstones(connection, table, ids)
+        # Counters are left alone: archived rows still count, through the catalog row's contributions
+        bump_table_versions(connection, [table])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return db.session.get(ArchivePartition, partition_id)
+
+
+def archive_due(after_months, today=None, keep_going=lambda: True):
+    """Archive every due month (see due_months) one transaction each; returns the partitions written."""
+    written = []
+    for table, month, _ in due_months(after_months, today):
+        partition = archive_month(table, month)
+        if partition is not None:
+            written.append(partition)
+        if not keep_going():
+            break
+    return written
+
+
+def _insert_columns(connection, table, columns):
+    names = list(columns)
+    count = len(columns[names[0]]) if names else 0
+    # Restored rows are stamped afresh (updated_at default), so delta sync clients get them back
+    rows = [{name: _decode(table.c[name], columns[name][index]) for name in names
+             if name in table.c and name != 'updated_at'} for index in range(count)]
+    for chunk in _chunks(rows):
+        connection.execute(insert(table), chunk)
+
+
+def restore_month(table, month):
+    """Move every partition of ``table`` for ``month`` back into the hot table; returns the rows restored."""
+    model = ARCHIVED_TABLES[table][0]
+    catalog = ArchivePartition.__table__
+    partitions = db.session.query(ArchivePartition).filter_by(table_name=table, month=month).order_by(
+        ArchivePartition.part).all()
+    paths = []
+    restored = 0
+    connection = db.session.connection()
+    try:
+        for partition in partitions:
+            path = os.path.join(archive_dir(), partition.path)
+            with open(path, 'rb') as handle:
+                data = handle.read()
+            if hashlib.sha256(data).hexdigest() != partition.sha256:
+                raise click.ClickException(f'{partition.path} does not match its checksum; not restoring it')
+            payload = loads(gzip.decompress(data))
+            _insert_columns(connection, model.__table__, payload['columns'])
+            for name, columns in payload['dependents'].items():
+                _insert_columns(connection, db.metadata.tables[name], columns)
+            connection.execute(delete(catalog).where(catalog.c.id == partition.id))
+            paths.append(path)
+            restored += partition.rows
+        bump_table_versions(connection, [table])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    for path in paths:
+        os.remove(path)
+    return restored
+
+
+def partitions_in_range(table, start=None, end=None, after_id=None):
+    """Catalog rows of ``table`` whose month overlaps [start, end] (either end open), in month order."""
+    query = db.session.query(ArchivePartition).filter(ArchivePartition.table_name == table)
+    if start is not None:
+        query = query.filter(ArchivePartition.month >= start.replace(day=1))
+    if end is not None:
+        query = query.filter(ArchivePartition.month <= end)
+    if after_id is not None:
+        query = query.filter(ArchivePartition.max_id > after_id)
+    return query.order_by(ArchivePartition.month, ArchivePartition.part).all()
+
+
+def _date_arg(value):
+    # Already validated by the caller (apply_filters)
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+
+
+def _matcher(columns, filters, date_field, search_fields):
+    """Predicate on a row position that mirrors apply_filters for a partition's columns."""
+    tests = []
+    for name in EQUALITY_FILTERS:
+        value = filters.get(name)
+        if value and name in columns:
+            tests.append((columns[name], lambda cell, value=value: cell is not None and str(cell) == value))
+    if filters.get('location') and 'location' in columns:
+        needle = filters['location'].lower()
+        tests.append((columns['location'], lambda cell: cell is not None and needle in cell.lower()))
+    # Dates are ISO strings, which order like the dates themselves
+    if filters.get('date_from'):
+        start = filters['date_from']
+        tests.append((columns[date_field], lambda cell: cell >= start))
+    if filters.get('date_to'):
+        end = filters['date_to']
+        tests.append((columns[date_field], lambda cell: cell <= end))
+    search = (filters.get('q') or '').strip().lower()
+    searched = [columns[name] for name in search_fields] if search else []
+
+    def matches(index):
+        for values, test in tests:
+            if not test(values[index]):
+                return False
+        if searched and not any(values[index] is not None and search in str(values[index]).lower()
+                                for values in searched):
+            return False
+        return True
+    return matches
+
+
+def _partition_rows(payload, names, filters, date_field, search_fields, after_id):
+    columns = payload['columns']
+    ids = columns['id']
+    matches = _matcher(columns, filters, date_field, search_fields)
+    # Columns added after the file was written read as NULL
+    selected = [columns.get(name) or [None] * len(ids) for name in names]
+    # Rows are stored in id order
+    for index in range(bisect_right(ids, after_id) if after_id is not None else 0, len(ids)):
+        if matches(index):
+            yield tuple(values[index] for values in selected)
+
+
+def archived_rows(model, names, filters, date_field, search_fields=(), after_id=None, limit=None):
+    """Archived rows of ``model`` matching list ``filters``, as id-ordered tuples of ``names``.
+
+    Partitions are read only when the filters carry a date range and it
+    reaches into archived months: a list without date_from or date_to shows
+    the hot table alone. Fits ``list_response(extra_rows=...)``; without a
+    ``limit`` the rows are returned as an iterator.
+    """
+    table = model.__tablename__
+    if table not in ARCHIVED_TABLES or date_field != ARCHIVED_TABLES[table][1].key:
+        return []
+    start, end = _date_arg(filters.get('date_from')), _date_arg(filters.get('date_to'))
+    if start is None and end is None:
+        return []
+    partitions = partitions_in_range(table, start, end, after_id)
+    if not partitions:
+        return []
+    streams = [_partition_rows(load_partition(partition), names, filters, date_field, search_fields, after_id)
+               for partition in partitions]
+    rows = heapq.merge(*streams, key=itemgetter(0))
+    return list(islice(rows, limit)) if limit is not None else rows
+
+
+def archived_columns(table, start=None, end=None):
+    """Decoded columns of every partition of ``table`` overlapping [start, end], for scans that need no id order."""
+    if table not in ARCHIVED_TABLES:
+        return []
+    return [load_partition(partition)['columns'] for partition in partitions_in_range(table, start, end)]
+
+
+@click.group('archive')
+def archive_cli():
+    """Cold archival of old donation records and closed requests."""
+
+
+@archive_cli.command('run')
+@click.option('--after-months', type=int, help='Full months kept hot before the current one '
+                                               '(default: ARCHIVE_AFTER_MONTHS).')
+@click.option('--dry-run', is_flag=True, help='List the months that would be archived.')
+@with_appcontext
+def run_command(after_months, dry_run):
+    """Archive every month older than the hot window to compressed files."""
+    if after_months is None:
+        after_months = current_app.config.get('ARCHIVE_AFTER_MONTHS', 0)
+    if not after_months:
+        raise click.ClickException('Set --after-months or ARCHIVE_AFTER_MONTHS.')
+    if dry_run:
+        for table, month, rows in due_months(after_months):
+            click.echo(f'{table} {month:%Y-%m}: {rows} rows')
+        return
+    partitions = archive_due(after_months)
+    for partition in partitions:
+        click.echo(f'{partition.table_name} {partition.month:%Y-%m}: {partition.rows} rows, '
+                   f'{partition.bytes} bytes -> {partition.path}')
+    click.echo(f'Archived {sum(partition.rows for partition in partitions)} rows '
+               f'into {len(partitions)} partition(s) under {archive_dir()}.')
+
+
+@archive_cli.command('status')
+@with_appcontext
+def status_command():
+    """Hot rows and archived partitions per table."""
+    for table, (model, _, _) in ARCHIVED_TABLES.items():
+        hot = db.session.query(func.count(model.id)).scalar()
+        archived, partitions, size = db.session.query(
+            func.coalesce(func.sum(ArchivePartition.rows), 0), func.count(ArchivePartition.id),
+            func.coalesce(func.sum(ArchivePartition.bytes), 0)).filter(ArchivePartition.table_name == table).one()
+        click.echo(f'{table}: {hot} hot rows, {archived} archived in {partitions} partition(s), {size} bytes')
+
+
+@archive_cli.command('verify')
+@with_appcontext
+def verify_command():
+    """Check every partition file exists, matches its checksum and holds its rows."""
+    problems = 0
+    for partition in db.session.query(ArchivePartition).order_by(ArchivePartition.id):
+        path = os.path.join(archive_dir(), partition.path)
+        try:
+            with open(path, 'rb') as handle:
+                data = handle.read()
+        except OSError as e:
+            problems += 1
+            click.echo(f'{partition.path}: {e.strerror}')
+            continue
+        if hashlib.sha256(data).hexdigest() != partition.sha256:
+            problems += 1
+            click.echo(f'{partition.path}: checksum mismatch')
+        elif len(loads(gzip.decompress(data))['columns']['id']) != partition.rows:
+            problems += 1
+            click.echo(f'{partition.path}: row count mismatch')
+    if problems:
+        raise SystemExit(1)
+    click.echo('Archive partitions are intact.')
+
+
+@archive_cli.command('restore')
+@click.argument('table', type=click.Choice(sorted(ARCHIVED_TABLES)))
+@click.argument('month')
+@with_appcontext
+def restore_command(table, month):
+    """Move an archived month (YYYY-MM) back into the hot table."""
+    try:
+        month = datetime.strptime(month, '%Y-%m').date()
+    except ValueError:
+        raise click.BadParameter('must be YYYY-MM', param_hint='MONTH')
+    click.echo(f'Restored {restore_month(table, month)} rows of {table} for {month:%Y-%m}.')
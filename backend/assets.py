@@ -0,0 +1,97 @@
+import hashlib
+import mimetypes
+import os
+import threading
+
+from flask import abort, request, Response
+
+from backend.compression import brotli, compress, negotiate
+
+# Files referenced from index.html that are served under content-hashed names
+HASHED_ASSETS = ('scripts.js',)
+
+# A hashed name never changes content, so browsers may keep it for a year without revalidating
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+class Asset:
+    """One static file held in memory, with gzip and brotli variants compressed once at maximum level."""
+
+    def __init__(self, data, mimetype):
+        self.mimetype = mimetype
+        self.digest = hashlib.sha256(data).hexdigest()[:12]
+        self.variants = {None: data, 'gzip': compress(data, 'gzip', 9)}
+        if brotli is not None:
+            self.variants['br'] = compress(data, 'br', 11)
+
+    def response(self, cache_control):
+        encoding = negotiate()
+        response = Response(self.variants[encoding], mimetype=self.mimetype)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = cache_control
+        response.set_etag(self.digest, weak=True)
+        return response.make_conditional(request)
+
+
+class AssetManifest:
+    """The frontend's index page and its assets under content-hashed names.
+
+    Built on the first request rather than at startup; ``index.html`` is
+    rewritten to reference ``/assets/<stem>.<hash><ext>`` so a deploy that
+    changes a file changes its URL.
+    """
+
+    def __init__(self, folder, names=HASHED_ASSETS):
+        self.folder = folder
+        self.names = names
+        self._built = None
+        self._lock = threading.Lock()
+
+    def build(self):
+        """(index Asset, {hashed name: Asset}) read from disk."""
+        assets, html = {}, self._read('index.html').decode()
+        for name in self.names:
+            asset = Asset(self._read(name), mimetypes.guess_type(name)[0])
+            stem, ext = os.path.splitext(name)
+            hashed_name = f'{stem}.{asset.digest}{ext}'
+            assets[hashed_name] = asset
+            html = html.replace(f'"{name}"', f'"/assets/{hashed_name}"')
+        return Asset(html.encode(), 'text/html'), assets
+
+    def get(self, reload=False):
+        if reload:
+            return self.build()
+        if self._built is None:
+            with self._lock:
+                if self._built is None:
+                    self._built = self.build()
+        return self._built
+
+    def _read(self, name):
+        with open(os.path.join(self.folder, name), 'rb') as f:
+            return f.read()
+
+
+def init_assets(app):
+    """Serve the single-page frontend: ``/`` revalidates every time, hashed assets are cached as immutable.
+
+    In debug mode the files are re-read on every request so edits show up
+    without a restart.
+    """
+    manifest = AssetManifest(app.static_folder)
+    app.extensions['asset_manifest'] = manifest
+
+    @app.route('/')
+    def index():
+        page, _ = manifest.get(reload=app.debug)
+        return page.response('no-cache')
+
+    @app.route('/assets/<filename>')
+    def hashed_asset(filename):
+        _, assets = manifest.get(reload=app.debug)
+        asset = assets.get(filename)
+        if asset is None:
+            abort(404)
+        return asset.response(IMMUTABLE)
@@ -0,0 +1,233 @@
+from collections import defaultdict
+
+from flask import request
+from flask_restful import Resource
+from sqlalchemy import inspect
+from sqlalchemy.orm.exc import StaleDataError
+
+from backend.allocation import allocate_request, AllocationError
+from backend.bulk import validate_row, RowError
+from backend.database import db
+from backend.idempotency import idempotent
+from backend.models import API_MODELS, BloodInventory, Donor, DonationRecord, Request, delete_conflict
+
+BATCH_MODES = ('atomic', 'partial')
+BATCH_OPERATIONS = ('create', 'update', 'delete')
+MAX_BATCH_OPERATIONS = 1000
+
+
+class OperationError(Exception):
+    def __init__(self, status, message, index=None):
+        super().__init__(message)
+        self.status = status
+        self.index = index
+
+
+class Operation:
+    def __init__(self, index, raw):
+        self.index = index
+        if not isinstance(raw, dict):
+            raise OperationError(400, 'operation must be an object')
+        self.op = raw.get('op')
+        if self.op not in BATCH_OPERATIONS:
+            raise OperationError(400, f"'op' must be one of {', '.join(BATCH_OPERATIONS)}")
+        self.table = raw.get('table')
+        self.model = API_MODELS.get(self.table)
+        if self.model is None:
+            raise OperationError(400, f"'table' must be one of {', '.join(API_MODELS)}")
+
+        self.id = None
+        self.version = None
+        if self.op != 'create':
+            try:
+                self.id = int(raw['id'])
+            except (KeyError, TypeError, ValueError):
+                raise OperationError(400, "'id' must be an integer")
+            # Optional optimistic concurrency check, like If-Match on PUT/DELETE
+            if raw.get('version') is not None:
+                if not isinstance(raw['version'], int) or isinstance(raw['version'], bool):
+                    raise OperationError(400, "'version' must be an integer")
+                self.version = raw['version']
+
+        data = raw.get('data') or {}
+        if self.op == 'delete':
+            self.values = {}
+            return
+        if not isinstance(data, dict):
+            raise OperationError(400, "'data' must be an object")
+        if 'id' in data:
+            raise OperationError(400, "'data' must not set 'id'")
+        try:
+            if self.op == 'create':
+                self.values = validate_row(self.model, data)
+            else:
+                self.values = validate_row(self.model, {**data, 'id': self.id}, partial=True)
+                del self.values['id']
+        except RowError as e:
+            raise OperationError(400, str(e))
+
+
+def _load_targets(operations):
+    """Load every row the batch touches with one IN query per table."""
+    ids = defaultdict(set)
+    for operation in operations:
+        if operation.id is not None:
+            ids[operation.model].add(operation.id)
+        if operation.model is DonationRecord and operation.op == 'create':
+            ids[Donor].add(operation.values['donor_id'])
+    loaded = {}
+    for model, model_ids in ids.items():
+        for obj in model.query.filter(model.id.in_(model_ids)):
+            loaded[(model, obj.id)] = obj
+    return loaded
+
+
+def _set_values(obj, values):
+    values = dict(values)
+    if isinstance(obj, BloodInventory) and 'status' in values:
+        # Same rule as PUT /api/inventory/{id}; an explicit discarded_at still wins
+        obj.set_status(values.pop('status'))
+    for name, value in values.items():
+        setattr(obj, name, value)
+
+
+def _apply(operation, loaded):
+    """Apply one operation to the session; returns (status, object, needs allocation)."""
+    model = operation.model
+    if operation.op == 'create':
+        obj = model()
+        _set_values(obj, operation.values)
+        db.session.add(obj)
+        if model is DonationRecord:
+            # Same rule as POST /api/donation-records
+            donor = loaded.get((Donor, obj.donor_id))
+            if donor and (donor.last_donation_date is None or donor.last_donation_date < obj.date_of_donation):
+                donor.last_donation_date = obj.date_of_donation
+        return 201, obj, model is Request and obj.status == 'Fulfilled'
+
+    obj = loaded.get((model, operation.id))
+    if obj is None or obj in db.session.deleted or inspect(obj).was_deleted:
+        raise OperationError(404, f'{operation.table} {operation.id} not found')
+    if operation.version is not None and obj.version != operation.version:
+        raise OperationError(412, f'{operation.table} {operation.id} is now at version {obj.version}')
+    if operation.op == 'delete':
+        conflict = delete_conflict(obj)
+        if conflict:
+            raise OperationError(409, conflict)
+        db.session.delete(obj)
+        return 200, None, False
+
+    was_fulfilled = model is Request and obj.status == 'Fulfilled'
+    _set_values(obj, operation.values)
+    return 200, obj, model is Request and obj.status == 'Fulfilled' and not was_fulfilled
+
+
+def _error(index, status, message):
+    return {'index': index, 'status': status, 'error': message}
+
+
+def _run_atomic(operations, loaded):
+    applied = []
+    previous_table = None
+    for operation in operations:
+        # Flush between tables so parents are written before rows that reference them
+        if previous_table is not None and operation.table != previous_table:
+            db.session.flush()
+        previous_table = operation.table
+        try:
+            status, obj, allocate = _apply(operation, loaded)
+        except OperationError as e:
+            e.index = operation.index
+            raise
+        applied.append((operation, status, obj, allocate))
+
+    db.session.flush()
+    for operation, status, obj, allocate in applied:
+        if allocate:
+            try:
+                allocate_request(obj)
+            except AllocationError as e:
+                raise OperationError(409, str(e), operation.index) from e
+    return applied
+
+
+def _run_partial(operations, loaded):
+    applied, errors = [], []
+    for operation in operations:
+        savepoint = db.session.begin_nested()
+        try:
+            status, obj, allocate = _apply(operation, loaded)
+            db.session.flush()
+            if allocate:
+                allocate_request(obj)
+            savepoint.commit()
+            applied.append((operation, status, obj, allocate))
+        except OperationError as e:
+            savepoint.rollback()
+            errors.append(_error(operation.index, e.status, str(e)))
+        except AllocationError as e:
+            savepoint.rollback()
+            errors.append(_error(operation.index, 409, str(e)))
+        except Exception as e:
+            savepoint.rollback()
+            errors.append(_error(operation.index, 400, str(getattr(e, 'orig', e))))
+    return applied, errors
+
+
+def run_batch(raw_operations, mode='atomic'):
+    """Apply a list of create/update/delete operations with a single commit.
+
+    Target rows are loaded up front with one query per table. In ``atomic``
+    mode the first failing operation rolls back the whole batch; in
+    ``partial`` mode each operation runs in its own savepoint and failures are
+    reported per operation while the rest commit. Returns (body, status).
+    """
+    operations, errors = [], []
+    for index, raw in enumerate(raw_operations):
+        try:
+            operations.append(Operation(index, raw))
+        except OperationError as e:
+            errors.append(_error(index, e.status, str(e)))
+    if errors and mode == 'atomic':
+        return {'mode': mode, 'committed': False, 'errors': errors}, 400
+
+    try:
+        loaded = _load_targets(operations)
+        if mode == 'atomic':
+            applied = _run_atomic(operations, loaded)
+        else:
+            applied, apply_errors = _run_partial(operations, loaded)
+            errors = sorted(errors + apply_errors, key=lambda error: error['index'])
+        # Serialize before committing so the commit does not expire and reload every row
+        results = [{'index': operation.index, 'status': status, 'op': operation.op, 'table': operation.table,
+                    'id': obj.id if obj is not None else operation.id,
+                    **({'record': obj.to_dict()} if obj is not None else {})}
+                   for operation, status, obj, _ in applied]
+        db.session.commit()
+    except OperationError as e:
+        db.session.rollback()
+        return {'mode': mode, 'committed': False, 'errors': [_error(e.index, e.status, str(e))]}, e.status
+    except StaleDataError:
+        db.session.rollback()
+        return {'mode': mode, 'committed': False,
+                'errors': [_error(None, 409, 'a row was changed by another request; reload it and retry')]}, 409
+    except Exception as e:
+        db.session.rollback()
+        return {'mode': mode, 'committed': False, 'errors': [_error(None, 400, str(getattr(e, 'orig', e)))]}, 400
+
+    body = {'mode': mode, 'committed': True, 'results': results, 'errors': errors}
+    return body, 207 if errors else 200
+
+
+class BatchResource(Resource):
+    @idempotent
+    def post(self):
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not isinstance(data.get('operations'), list):
+            return {'error': "body must be an object with an 'operations' list"}, 400
+        mode = data.get('mode', 'atomic')
+        if mode not in BATCH_MODES:
+            return {'error': f"'mode' must be one of {', '.join(BATCH_MODES)}"}, 400
+        if len(data['operations']) > MAX_BATCH_OPERATIONS:
+            return {'error': f'at most {MAX_BATCH_OPERATIONS} operations per batch'}, 400
+        return run_batch(data['operations'], mode)
@@ -0,0 +1,319 @@
+import csv
+import io
+import json
+from collections import Counter
+from datetime import date, datetime
+from itertools import islice
+
+import click
+from flask import request
+from flask.cli import with_appcontext
+from flask_restful import Resource
+from sqlalchemy import Date, DateTime, Enum, Integer, String, func, insert, select, text, update
+
+from backend.cache import bump_table_versions
+from backend.changefeed import publish_reset
+from backend.database import db
+from backend.eligibility import refresh_eligibility
+from backend.ledger import movements, parse_timestamp, record_receipts, write_entries
+from backend.models import API_MODELS
+from backend.search import refresh_search, SEARCH_TABLES
+from backend.stats import add_row_deltas, apply_deltas, COUNTED_COLUMNS
+
+# Import targets, keyed by the same path segment as the list endpoints
+IMPORT_MODELS = API_MODELS
+
+DEFAULT_CHUNK_SIZE = 1000
+MAX_CHUNK_SIZE = 10000
+MAX_REPORTED_ERRORS = 1000
+
+
+class RowError(ValueError):
+    pass
+
+
+def _coerce(column, value):
+    if value is None or (isinstance(value, str) and value.strip() == ''):
+        return None
+    column_type = column.type
+    if isinstance(column_type, Integer):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise RowError(f"'{column.name}' must be an integer")
+    if isinstance(column_type, Date):
+        if isinstance(value, date):
+            return value
+        try:
+            return datetime.strptime(str(value).strip(), '%Y-%m-%d').date()
+        except ValueError:
+            raise RowError(f"'{column.name}' must be a date in YYYY-MM-DD format")
+    if isinstance(column_type, DateTime):
+        if isinstance(value, datetime):
+            return value
+        try:
+            return parse_timestamp(str(value).strip())
+        except ValueError:
+            raise RowError(f"'{column.name}' must be an ISO 8601 date and time")
+    if isinstance(column_type, Enum):
+        value = str(value).strip()
+        if value not in column_type.enums:
+            raise RowError(f"'{column.name}' must be one of {', '.join(column_type.enums)}")
+        return value
+    if isinstance(column_type, String):
+        value = str(value).strip()
+        if column_type.length and len(value) > column_type.length:
+            raise RowError(f"'{column.name}' must be at most {column_type.length} characters")
+        return value
+    return value
+
+
+def validate_row(model, raw, partial=False):
+    """Coerce a raw CSV/NDJSON row into column values for ``model``.
+
+    ``partial`` rows (updates of existing ids) only need the columns they set;
+    new rows must carry every required column and get the model defaults.
+    """
+    if not isinstance(raw, dict):
+        raise RowError('row must be an object')
+    columns = model.__table__.columns
+    unknown = [name for name in raw if name not in columns]
+    if unknown:
+        raise RowError(f"unknown field(s): {', '.join(sorted(unknown))}")
+
+    values = {}
+    for column in columns:
+        # Maintained by the server; accepted so exported files import as-is
+        if column.name in ('created_at', 'updated_at', 'version'):
+            continue
+        if column.name in raw:
+            value = _coerce(column, raw[column.name])
+            if value is None and not column.nullable and not column.primary_key:
+                raise RowError(f"'{column.name}' is required")
+            if value is not None or column.nullable:
+                values[column.name] = value
+        elif not partial and not column.primary_key:
+            if column.default is not None and column.default.is_scalar:
+                values[column.name] = column.default.arg
+            elif column.default is not None and isinstance(column.type, Date):
+                values[column.name] = date.today()
+            elif not column.nullable:
+                raise RowError(f"'{column.name}' is required")
+    if partial and 'id' not in values:
+        raise RowError("'id' is required")
+    return values
+
+
+def read_rows(stream, fmt):
+    """Yield (row_number, raw_row_or_exception) from a text stream of CSV or NDJSON."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for number, row in enumerate(reader, start=2):
+            yield number, row
+        return
+    for number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as e:
+            yield number, RowError(f'invalid JSON: {e}')
+
+
+class ImportReport:
+    def __init__(self):
+        self.processed = 0
+        self.inserted = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, row_number, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row_number, 'error': message})
+
+    def to_dict(self):
+        return {
+            'processed': self.processed,
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors)
+        }
+
+
+def _write_chunk(model, inserts, updates):
+    """Write one validated chunk in the current transaction and keep counters in step."""
+    table = model.__tablename__
+    counted = COUNTED_COLUMNS[table]
+    deltas = Counter()
+    ledger_rows = []
+
+    if updates:
+        columns = [model.id, model.version] + [getattr(model, name) for name in counted]
+        existing = {row[0]: (row[1], dict(zip(counted, row[2:]))) for row in
+                    db.session.query(*columns).filter(model.id.in_([values['id'] for _, values in updates]))}
+        for _, values in updates:
+            version, old = existing[values['id']]
+            new = {**old, **{k: v for k, v in values.items() if k in counted}}
+            add_row_deltas(deltas, table, old, sign=-1)
+            add_row_deltas(deltas, table, new)
+            if table == 'blood_inventory':
+                ledger_rows += movements(values['id'], old, new)
+            # The ORM checks the version it was read at and bumps it, as for any update
+            values['version'] = version
+        db.session.execute(update(model), [values for _, values in updates])
+
+    connection = db.session.connection()
+    # Rows inserted without explicit ids are found by id range for the eligibility and search
+    # indexes (donors, patients) and the inventory ledger
+    last_id = None
+    if table in SEARCH_TABLES or table == 'blood_inventory':
+        last_id = connection.execute(select(func.max(model.id))).scalar() or 0
+
+    if inserts:
+        db.session.execute(insert(model), [values for _, values in inserts])
+        for _, values in inserts:
+            add_row_deltas(deltas, table, values)
+
+    written_ids = [values['id'] for _, values in inserts + updates if 'id' in values]
+    if table == 'donors':
+        refresh_eligibility(connection, written_ids, after_id=last_id)
+    if table in SEARCH_TABLES:
+        refresh_search(connection, table, written_ids, after_id=last_id)
+    if table == 'blood_inventory':
+        write_entries(connection, ledger_rows)
+        if inserts:
+            record_receipts(connection, [values['id'] for _, values in inserts if 'id' in values], after_id=last_id)
+    apply_deltas(connection, deltas)
+    bump_table_versions(connection, [table])
+    publish_reset(connection, [table])
+
+    if connection.dialect.name == 'postgresql' and any('id' in values for _, values in inserts):
+        # Explicit ids do not advance the serial sequence
+        connection.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT MAX(id) FROM {table}))"
+        ))
+
+
+def _flush_chunk(model, chunk, existing_ids, report):
+    if not chunk:
+        return
+    inserts, updates = [], []
+    for number, values in chunk:
+        if values.get('id') in existing_ids:
+            updates.append((number, values))
+        else:
+            inserts.append((number, values))
+
+    try:
+        _write_chunk(model, inserts, updates)
+        db.session.commit()
+        report.inserted += len(inserts)
+        report.updated += len(updates)
+        return
+    except Exception:
+        db.session.rollback()
+
+    # A row failed at the database level; retry one row per transaction to isolate it
+    for number, values in inserts:
+        try:
+            _write_chunk(model, [(number, values)], [])
+            db.session.commit()
+            report.inserted += 1
+        except Exception as e:
+            db.session.rollback()
+            report.error(number, str(getattr(e, 'orig', e)))
+    for number, values in updates:
+        try:
+            _write_chunk(model, [], [(number, values)])
+            db.session.commit()
+            report.updated += 1
+        except Exception as e:
+            db.session.rollback()
+            report.error(number, str(getattr(e, 'orig', e)))
+
+
+def import_rows(model, rows, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Validate and upsert ``rows`` ((row_number, raw) pairs) committing every ``chunk_size`` rows."""
+    report = ImportReport()
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, chunk_size))
+        if not batch:
+            break
+        # Rows whose id already exists are partial updates; one IN query per chunk
+        batch_ids = {_as_int(raw.get('id')) for _, raw in batch if isinstance(raw, dict)} - {None}
+        existing_ids = set()
+        if batch_ids:
+            existing_ids = {row[0] for row in db.session.query(model.id).filter(model.id.in_(batch_ids))}
+
+        chunk = []
+        for number, raw in batch:
+            report.processed += 1
+            try:
+                if isinstance(raw, Exception):
+                    raise raw
+                partial = _as_int(raw.get('id')) in existing_ids
+                chunk.append((number, validate_row(model, raw, partial=partial)))
+            except RowError as e:
+                report.error(number, str(e))
+        _flush_chunk(model, chunk, existing_ids, report)
+    return report
+
+
+def _as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _detect_format(explicit, content_type='', filename=''):
+    if explicit:
+        return explicit
+    if 'csv' in (content_type or '') or filename.endswith('.csv'):
+        return 'csv'
+    return 'ndjson'
+
+
+class BulkImportResource(Resource):
+    def post(self, table):
+        model = IMPORT_MODELS.get(table)
+        if model is None:
+            return {'error': f"Unknown table '{table}'"}, 404
+        try:
+            chunk_size = min(max(int(request.args.get('chunk_size', DEFAULT_CHUNK_SIZE)), 1), MAX_CHUNK_SIZE)
+        except ValueError:
+            return {'error': "'chunk_size' must be an integer"}, 400
+        fmt = _detect_format(request.args.get('format'), request.content_type)
+        if fmt not in ('csv', 'ndjson'):
+            return {'error': "'format' must be csv or ndjson"}, 400
+
+        stream = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+        report = import_rows(model, read_rows(stream, fmt), chunk_size=chunk_size)
+        status = 200 if report.failed == 0 else 207
+        return {'table': table, **report.to_dict()}, status
+
+
+@click.group('bulk')
+def bulk_cli():
+    """Bulk data import."""
+
+
+@bulk_cli.command('import')
+@click.argument('table', type=click.Choice(sorted(IMPORT_MODELS)))
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), help='Defaults from the file extension.')
+@click.option('--chunk-size', default=DEFAULT_CHUNK_SIZE, show_default=True, help='Rows per transaction.')
+@with_appcontext
+def import_command(table, source, fmt, chunk_size):
+    """Upsert rows from a CSV or NDJSON file (use - for stdin)."""
+    fmt = _detect_format(fmt, filename=source.name)
+    report = import_rows(IMPORT_MODELS[table], read_rows(source, fmt), chunk_size=chunk_size)
+    click.echo(json.dumps({'table': table, **report.to_dict()}, indent=2))
+    if report.failed:
+        raise SystemExit(1)
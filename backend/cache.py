@@ -0,0 +1,213 @@
+import hashlib
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import date
+from functools import wraps
+
+from flask import request, Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from backend.database import db
+from backend.models import StatCounter
+from backend.serialization import dumps
+from backend.stats import apply_deltas, TRACKED_TABLES
+
+# Per-table version counters live next to the dashboard counters so every worker sees the same value
+TABLE_VERSION = 'table_version'
+
+
+class ResponseCache:
+    """Bounded LRU of encoded GET response bodies with a per-entry TTL."""
+
+    def __init__(self, max_entries=1024, ttl=30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def configure(self, max_entries=None, ttl=None):
+        if max_entries is not None:
+            self.max_entries = max_entries
+        if ttl is not None:
+            self.ttl = ttl
+        self.clear()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, tables):
+        """Drop every entry that depends on one of ``tables``."""
+        tables = set(tables)
+        with self._lock:
+            stale = [key for key in self._entries if tables & set(key[0])]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
+
+
+response_cache = ResponseCache()
+
+
+def table_versions(tables):
+    rows = db.session.query(StatCounter.key, StatCounter.value).filter(
+        StatCounter.scope == TABLE_VERSION, StatCounter.key.in_(tables)
+    ).all()
+    versions = dict(rows)
+    return tuple(versions.get(table, 0) for table in tables)
+
+
+def _touched_tables(session):
+    tables = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, '__tablename__', None)
+        if table in TRACKED_TABLES:
+            tables.add(table)
+    return tables
+
+
+def _version_deltas(tables):
+    # Sorted so concurrent multi-table writes lock their table_version rows in the same order
+    return Counter({(TABLE_VERSION, table): 1 for table in sorted(tables)})
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_table_versions(session, flush_context):
+    tables = _touched_tables(session)
+    if not tables:
+        return
+    apply_deltas(session.connection(), _version_deltas(tables))
+    session.info.setdefault('cache_touched_tables', set()).update(tables)
+
+
+def bump_table_versions(connection, tables):
+    """Version bump for writes that bypass the ORM flush (bulk statements)."""
+    apply_deltas(connection, _version_deltas(tables))
+    response_cache.invalidate(tables)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    tables = session.info.pop('cache_touched_tables', None)
+    if tables:
+        response_cache.invalidate(tables)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rolled_back(session):
+    session.info.pop('cache_touched_tables', None)
+
+
+def row_etag(version):
+    """Entity tag of a single row: its version, quoted."""
+    return f'"{version}"'
+
+
+def _etag_matches(etag):
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    # Weak comparison: compressed responses carry the same tag marked W/
+    return header.strip() == '*' or etag in [tag.strip().removeprefix('W/') for tag in header.split(',')]
+
+
+def cached(*tables, row=None):
+    """Cache a Resource GET handler and tag it with a strong ETag.
+
+    The cache key is the endpoint, view arguments and query string; the ETag is
+    derived from that key plus the version counters of ``tables``, so any write
+    to one of them changes the tag and bypasses stale entries on every worker.
+    For a single-row handler, ``row`` names the body key holding the row and the
+    ETag is the row's version instead, which PUT/DELETE accept in If-Match.
+    """
+    tables = tuple(sorted(tables))
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(resource, *args, **kwargs):
+            versions = table_versions(tables)
+            key = (
+                tables,
+                request.endpoint,
+                tuple(sorted(kwargs.items())),
+                tuple(sorted(request.args.items(multi=True))),
+                versions,
+                date.today().isoformat()
+            )
+            etag = None
+            if row is None:
+                etag = '"%s"' % hashlib.sha1(repr(key).encode()).hexdigest()
+                if _etag_matches(etag):
+                    return Response(status=304, headers={'ETag': etag, 'Cache-Control': 'no-cache'})
+
+            entry = response_cache.get(key)
+            if entry is None:
+                result = method(resource, *args, **kwargs)
+                if isinstance(result, Response):
+                    if result.status_code != 200:
+                        return result
+                    body = result.get_data()
+                else:
+                    if result[1] != 200:
+                        return result
+                    # Encode once; cache hits are served without serializing again
+                    body = dumps(result[0]) + b'\n'
+                    if row is not None:
+                        etag = row_etag(result[0][row]['version'])
+                entry = (body, etag)
+                response_cache.set(key, entry)
+            body, etag = entry
+            headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+            if row is not None and _etag_matches(etag):
+                return Response(status=304, headers=headers)
+            return Response(body, status=200, headers=headers, mimetype='application/json')
+        return wrapper
+    return decorator
@@ -0,0 +1,272 @@
+import json
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app, request, Response
+from flask.cli import with_appcontext
+from flask_restful import Resource
+from sqlalchemy import delete, event, func, insert, select
+from sqlalchemy.orm import Session
+
+from backend.database import db
+from backend.models import ChangeEvent
+from backend.stats import TRACKED_TABLES
+
+logger = logging.getLogger('bbms.changefeed')
+
+POLL_SECONDS = 1.0
+HEARTBEAT_SECONDS = 15
+# Streams end after this long and the browser reconnects with Last-Event-ID,
+# so a client never holds a worker indefinitely
+STREAM_MAX_SECONDS = 300
+RETRY_MS = 2000
+BUFFER_SIZE = 5000
+REPLAY_LIMIT = 1000
+# An id gap is usually a transaction that has not committed yet; wait this long before skipping it
+GAP_GRACE_SECONDS = 2.0
+RETENTION = timedelta(hours=24)
+
+
+def _event_row(table, op, row_id, record):
+    return {
+        'table_name': table,
+        'op': op,
+        'row_id': row_id,
+        'data': json.dumps(record) if record is not None else None,
+        'created_at': datetime.utcnow(),
+    }
+
+
+@event.listens_for(Session, 'after_flush')
+def _record_changes(session, flush_context):
+    rows = []
+    for obj in session.new:
+        table = getattr(obj, '__tablename__', None)
+        if table in TRACKED_TABLES:
+            rows.append(_event_row(table, 'insert', obj.id, obj.to_dict()))
+    for obj in session.dirty:
+        table = getattr(obj, '__tablename__', None)
+        if table in TRACKED_TABLES and session.is_modified(obj, include_collections=False):
+            rows.append(_event_row(table, 'update', obj.id, obj.to_dict()))
+    for obj in session.deleted:
+        table = getattr(obj, '__tablename__', None)
+        if table in TRACKED_TABLES:
+            rows.append(_event_row(table, 'delete', obj.id, None))
+    if rows:
+        session.connection().execute(insert(ChangeEvent), rows)
+        session.info['published_changes'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _wake_broker(session):
+    if session.info.pop('published_changes', False):
+        broker.wake()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_changes(session):
+    session.info.pop('published_changes', None)
+
+
+def publish_reset(connection, tables):
+    """Tell subscribers to reload ``tables`` wholesale (for bulk writes that bypass the ORM)."""
+    connection.execute(insert(ChangeEvent), [_event_row(table, 'reset', None, None) for table in tables])
+
+
+def publish_update(connection, table, record):
+    """Publish one row updated by a statement that bypasses the ORM flush."""
+    connection.execute(insert(ChangeEvent), [_event_row(table, 'update', record['id'], record)])
+
+
+def _to_message(row):
+    return {
+        'id': row.id,
+        'table': row.table_name,
+        'op': row.op,
+        'row_id': row.row_id,
+        'record': json.loads(row.data) if row.data else None,
+    }
+
+
+class ChangeBroker:
+    """Per-process fan-out of committed change events.
+
+    One background thread reads new change_events rows (every POLL_SECONDS, or
+    immediately after a local commit) into a bounded in-memory buffer, and any
+    number of stream subscribers wait on it. Database load is therefore one
+    indexed query per process per interval, however many clients are connected.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._wakeup = threading.Event()
+        self._buffer = deque()
+        # The buffer holds every event with an id above the floor
+        self._floor = None
+        self._last_id = None
+        self._gap_since = None
+        self._thread = None
+        self._app = None
+
+    @property
+    def last_id(self):
+        return self._last_id
+
+    def start(self, app):
+        with self._condition:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._app = app
+            with app.app_context():
+                self._last_id = self._floor = latest_event_id()
+            self._thread = threading.Thread(target=self._run, name='change-broker', daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        self._wakeup.set()
+
+    def _run(self):
+        with self._app.app_context():
+            while True:
+                try:
+                    self._poll()
+                except Exception:
+                    logger.exception('Change feed poll failed')
+                self._wakeup.wait(POLL_SECONDS)
+                self._wakeup.clear()
+
+    def _poll(self):
+        with db.engine.connect() as connection:
+            rows = connection.execute(
+                select(ChangeEvent.__table__).where(ChangeEvent.id > self._last_id)
+                .order_by(ChangeEvent.id).limit(BUFFER_SIZE)
+            ).all()
+        accepted = []
+        expected = self._last_id + 1
+        for row in rows:
+            if row.id != expected:
+                # Ids are taken at insert but become visible at commit, possibly out of order
+                now = time.monotonic()
+                self._gap_since = self._gap_since or now
+                if now - self._gap_since < GAP_GRACE_SECONDS:
+                    break
+            self._gap_since = None
+            accepted.append(_to_message(row))
+            expected = row.id + 1
+        if not accepted:
+            return
+        with self._condition:
+            self._buffer.extend(accepted)
+            while len(self._buffer) > BUFFER_SIZE:
+                self._floor = self._buffer.popleft()['id']
+            self._last_id = accepted[-1]['id']
+            self._condition.notify_all()
+
+    def wait(self, after_id, timeout):
+        """Messages newer than ``after_id``, blocking up to ``timeout`` seconds for the first one.
+
+        Returns None when ``after_id`` predates the buffer and the caller must replay from the database.
+        """
+        with self._condition:
+            if after_id < self._floor:
+                return None
+            if self._last_id <= after_id:
+                self._condition.wait(timeout)
+            return [message for message in self._buffer if message['id'] > after_id]
+
+
+broker = ChangeBroker()
+
+
+def latest_event_id():
+    return db.session.query(func.coalesce(func.max(ChangeEvent.id), 0)).scalar()
+
+
+def replay(after_id, limit=REPLAY_LIMIT):
+    """Stored events after ``after_id``, or None when the client is too far behind to catch up."""
+    oldest = db.session.query(func.min(ChangeEvent.id)).scalar()
+    if oldest is not None and oldest > after_id + 1:
+        # Events the client never saw have been pruned
+        return None
+    rows = db.session.execute(
+        select(ChangeEvent.__table__).where(ChangeEvent.id > after_id).order_by(ChangeEvent.id).limit(limit + 1)
+    ).all()
+    if len(rows) > limit:
+        return None
+    return [_to_message(row) for row in rows]
+
+
+def prune_events(now=None):
+    """Delete change events older than RETENTION; returns how many went.
+
+    Run by the expiry sweeper's lease holder and ``flask changes prune``, so
+    the table is bounded whether or not any stream client is connected.
+    """
+    cutoff = (now or datetime.utcnow()) - RETENTION
+    with db.engine.begin() as connection:
+        return connection.execute(delete(ChangeEvent).where(ChangeEvent.created_at < cutoff)).rowcount
+
+
+def _format(message):
+    return f"id: {message['id']}\nevent: change\ndata: {json.dumps(message, separators=(',', ':'))}\n\n"
+
+
+def _parse_event_id(value):
+    try:
+        return int(value) if value not in (None, '') else None
+    except ValueError:
+        return None
+
+
+def event_stream(app, after_id, max_seconds=STREAM_MAX_SECONDS):
+    """Yield SSE messages for every change after ``after_id`` until ``max_seconds`` have passed."""
+    yield f'retry: {RETRY_MS}\n\n'
+    deadline = time.monotonic() + max_seconds
+    cursor = after_id
+    while time.monotonic() < deadline:
+        messages = broker.wait(cursor, min(HEARTBEAT_SECONDS, max(deadline - time.monotonic(), 0)))
+        if messages is None:
+            with app.app_context():
+                messages = replay(cursor)
+                db.session.remove()
+            if messages is None:
+                # Too far behind: the client reloads everything and continues from now
+                cursor = broker.last_id
+                yield f'id: {cursor}\nevent: reset\ndata: {{}}\n\n'
+                continue
+        if not messages:
+            yield ': keepalive\n\n'
+            continue
+        for message in messages:
+            yield _format(message)
+        cursor = messages[-1]['id']
+
+
+class ChangeStreamResource(Resource):
+    def get(self):
+        app = current_app._get_current_object()
+        broker.start(app)
+        after_id = _parse_event_id(request.headers.get('Last-Event-ID') or request.args.get('last_event_id'))
+        if after_id is None:
+            after_id = broker.last_id
+        max_seconds = app.config.get('STREAM_MAX_SECONDS', STREAM_MAX_SECONDS)
+        return Response(event_stream(app, after_id, max_seconds), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+        })
+
+
+@click.group('changes')
+def changes_cli():
+    """Change feed event retention."""
+
+
+@changes_cli.command('prune')
+@with_appcontext
+def prune_command():
+    """Delete change events older than 24 hours; streams further behind reload everything."""
+    click.echo(f'Pruned {prune_events()} change events.')
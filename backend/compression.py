@@ -0,0 +1,95 @@
+import os
+import zlib
+
+from flask import request
+
+# brotli is optional: without it clients that accept gzip still get compressed responses
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Preferred first when the client weights them equally
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+COMPRESSIBLE_TYPES = {
+    'application/json', 'application/x-ndjson', 'application/javascript', 'text/javascript',
+    'text/csv', 'text/html', 'text/css', 'text/plain',
+}
+
+
+def negotiate():
+    """The best content coding the current request accepts, or None."""
+    return request.accept_encodings.best_match(ENCODINGS)
+
+
+def compress(data, encoding, level):
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _stream_compressor(encoding, level):
+    """(compress and flush one chunk, finish) for a streamed body."""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=level)
+        return lambda chunk: compressor.process(chunk) + compressor.flush(), compressor.finish
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return lambda chunk: compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+
+def compress_stream(chunks, encoding, level):
+    """Compress a streamed body chunk by chunk, flushing after each so the client sees data as it is produced."""
+    process, finish = _stream_compressor(encoding, level)
+    try:
+        for chunk in chunks:
+            data = process(chunk.encode() if isinstance(chunk, str) else chunk)
+            if data:
+                yield data
+        yield finish()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def init_compression(app):
+    """Compress API and export responses for clients that accept gzip or brotli.
+
+    Config: COMPRESSION_ENABLED (default True), COMPRESS_MIN_BYTES (default
+    1024; smaller bodies are sent as-is), COMPRESS_GZIP_LEVEL (default 6) and
+    COMPRESS_BROTLI_QUALITY (default 5). Streamed responses such as exports are
+    compressed as they are generated; the SSE stream is left alone.
+    """
+    app.config.setdefault('COMPRESSION_ENABLED', os.environ.get('COMPRESSION_ENABLED', 'true').lower() == 'true')
+    app.config.setdefault('COMPRESS_MIN_BYTES', int(os.environ.get('COMPRESS_MIN_BYTES', 1024)))
+    app.config.setdefault('COMPRESS_GZIP_LEVEL', int(os.environ.get('COMPRESS_GZIP_LEVEL', 6)))
+    app.config.setdefault('COMPRESS_BROTLI_QUALITY', int(os.environ.get('COMPRESS_BROTLI_QUALITY', 5)))
+
+    @app.after_request
+    def _compress_response(response):
+        if (not app.config['COMPRESSION_ENABLED'] or response.status_code < 200
+                or response.status_code in (204, 206, 304) or response.direct_passthrough
+                or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_TYPES):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = negotiate()
+        if encoding is None:
+            return response
+        level = app.config['COMPRESS_BROTLI_QUALITY' if encoding == 'br' else 'COMPRESS_GZIP_LEVEL']
+
+        if response.is_streamed:
+            response.response = compress_stream(response.response, encoding, level)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < app.config['COMPRESS_MIN_BYTES']:
+                return response
+            response.set_data(compress(data, encoding, level))
+        response.headers['Content-Encoding'] = encoding
+
+        # The compressed bytes differ from the identity representation, so the tag can only be weak
+        tag, weak = response.get_etag()
+        if tag and not weak:
+            response.set_etag(tag, weak=True)
+        return response
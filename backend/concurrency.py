@@ -0,0 +1,100 @@
+from collections import Counter
+
+from flask import current_app, request
+from sqlalchemy import select, update
+
+from backend.cache import bump_table_versions, row_etag
+from backend.changefeed import publish_update
+from backend.database import db
+from backend.ledger import movements, write_entries
+from backend.models import BloodInventory
+from backend.stats import add_row_deltas, apply_deltas, COUNTED_COLUMNS
+
+
+class AdjustmentError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _if_match_tags():
+    header = request.headers.get('If-Match')
+    if header is None:
+        return None
+    # Compressed responses carry the same tag marked W/
+    return [tag.strip().removeprefix('W/') for tag in header.split(',')]
+
+
+def precondition_failure(obj):
+    """(body, status, headers) when the request's If-Match does not name ``obj``'s current version, else None.
+
+    Without If-Match the write goes ahead, unless REQUIRE_IF_MATCH is set (428).
+    """
+    tags = _if_match_tags()
+    etag = row_etag(obj.version)
+    if tags is None:
+        if current_app.config.get('REQUIRE_IF_MATCH'):
+            return {'error': 'If-Match is required; send the ETag of the row being changed'}, 428
+        return None
+    if '*' in tags or etag in tags:
+        return None
+    return ({'error': f'Precondition failed: the row is now at version {obj.version}', 'version': obj.version},
+            412, {'ETag': etag})
+
+
+def stale_write_response():
+    """Response for a StaleDataError: the row changed between reading it and writing it back."""
+    if _if_match_tags() is not None:
+        return {'error': 'Precondition failed: the row was changed by another request'}, 412
+    return {'error': 'The row was changed by another request; reload it and retry'}, 409
+
+
+def expected_versions():
+    """Row versions named by If-Match, or None without one (or with ``*``)."""
+    tags = _if_match_tags()
+    if tags is None or '*' in tags:
+        return None
+    return [int(tag.strip('"')) for tag in tags if tag.strip('"').isdigit()]
+
+
+def adjust_units(inventory_id, delta, versions=None):
+    """Add ``delta`` to a lot's units in one statement: ``SET units_available = units_available + :delta``.
+
+    Concurrent adjustments never overwrite each other, and the lot can never go
+    negative. With ``versions`` the update also requires the lot to be at one
+    of them. Counters, the cache version, the change feed and the inventory
+    ledger are kept in step by hand since the statement bypasses the ORM
+    flush. Returns the updated lot as a dict; raises AdjustmentError (404, 409
+    or 412) and changes nothing otherwise. The caller commits.
+    """
+    table = BloodInventory.__table__
+    stmt = update(table).where(table.c.id == inventory_id, table.c.units_available + delta >= 0).values(
+        units_available=table.c.units_available + delta, version=table.c.version + 1
+    ).returning(*table.c)
+    if versions is not None:
+        stmt = stmt.where(table.c.version.in_(versions))
+
+    connection = db.session.connection()
+    row = connection.execute(stmt).first()
+    if row is None:
+        current = connection.execute(
+            select(table.c.units_available, table.c.version).where(table.c.id == inventory_id)
+        ).first()
+        if current is None:
+            raise AdjustmentError(404, f'Blood inventory {inventory_id} not found')
+        if versions is not None and current.version not in versions:
+            raise AdjustmentError(412, f'Precondition failed: the row is now at version {current.version}')
+        raise AdjustmentError(409, f'Cannot apply {delta:+d} units: {current.units_available} available')
+
+    values = {name: getattr(row, name) for name in COUNTED_COLUMNS['blood_inventory']}
+    old = {**values, 'units_available': row.units_available - delta}
+    deltas = Counter()
+    add_row_deltas(deltas, 'blood_inventory', old, sign=-1)
+    add_row_deltas(deltas, 'blood_inventory', values)
+    apply_deltas(connection, deltas)
+    write_entries(connection, movements(row.id, old, values))
+    bump_table_versions(connection, ['blood_inventory'])
+    # to_dict only reads attributes, which the RETURNING row provides
+    record = BloodInventory.to_dict(row)
+    publish_update(connection, 'blood_inventory', record)
+    return record
@@ -1,8 +1,29 @@
 import os
+from flask import current_app, has_request_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from sqlalchemy.orm import DeclarativeBase
 
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
\ No newline at end of file
+
+class RoutingSession(Session):
+    """Session that sends the reads of GET requests to a read replica when replicas are configured.
+
+    Flushes and INSERT/UPDATE/DELETE statements always go to the primary, as
+    does everything outside a request (CLI, background threads). Which replica
+    a request reads from, if any, is decided by backend.replicas.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not getattr(clause, 'is_dml', False) and has_request_context():
+            replicas = current_app.extensions.get('replicas')
+            if replicas is not None:
+                engine = replicas.read_engine()
+                if engine is not None:
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(model_class=Base, session_options={'class_': RoutingSession})
@@ -0,0 +1,192 @@
+import re
+from datetime import date, timedelta
+
+import click
+from flask import request
+from flask.cli import with_appcontext
+from flask_restful import Resource
+from sqlalchemy import delete, event, insert, inspect, select
+from sqlalchemy.orm import Session
+
+from backend.allocation import COMPATIBLE_DONORS
+from backend.cache import cached
+from backend.database import db
+from backend.models import Donor, DonorEligibility, Patient, Request
+
+# Minimum days between whole blood donations
+DEFERRAL_DAYS = 56
+# Stored for donors with no recorded donation; always older than any deferral cutoff
+NEVER_DONATED = date(1900, 1, 1)
+
+DEFAULT_CANDIDATES = 50
+MAX_CANDIDATES = 500
+INDEXED_COLUMNS = ('blood_group', 'location', 'last_donation_date')
+
+
+def normalize_location(location):
+    """Matching key for a free-text location: the city part, lower-cased, punctuation folded to spaces."""
+    city = (location or '').split(',')[0]
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', city.lower()).split())
+
+
+def index_row(donor):
+    """donor_eligibility values for a Donor object or a mapping with the same keys."""
+    get = donor.get if isinstance(donor, dict) else lambda name: getattr(donor, name)
+    return {
+        'donor_id': get('id'),
+        'blood_group': get('blood_group'),
+        'location_key': normalize_location(get('location')),
+        'last_donation_date': get('last_donation_date') or NEVER_DONATED,
+    }
+
+
+def insert_eligibility(connection, donors):
+    rows = [index_row(donor) for donor in donors]
+    if rows:
+        connection.execute(insert(DonorEligibility), rows)
+
+
+def _reindex(connection, donor_condition, index_condition):
+    connection.execute(delete(DonorEligibility).where(index_condition))
+    donors = connection.execute(
+        select(Donor.id, Donor.blood_group, Donor.location, Donor.last_donation_date).where(donor_condition)
+    ).mappings().all()
+    insert_eligibility(connection, donors)
+
+
+def refresh_eligibility(connection, donor_ids=(), after_id=None):
+    """Re-index the given donors and every donor with an id above ``after_id``.
+
+    Used by write paths that bypass the ORM (bulk import); donors that no
+    longer exist simply lose their index row.
+    """
+    if after_id is not None:
+        donor_ids = [donor_id for donor_id in donor_ids if donor_id <= after_id]
+        _reindex(connection, Donor.id > after_id, DonorEligibility.donor_id > after_id)
+    donor_ids = list(donor_ids)
+    if donor_ids:
+        _reindex(connection, Donor.id.in_(donor_ids), DonorEligibility.donor_id.in_(donor_ids))
+
+
+def rebuild_eligibility(batch_size=10000):
+    """Recreate the whole index from the donors table; returns the number of donors indexed."""
+    indexed = 0
+    with db.engine.begin() as connection:
+        connection.execute(delete(DonorEligibility))
+        last_id = 0
+        while True:
+            donors = connection.execute(
+                select(Donor.id, Donor.blood_group, Donor.location, Donor.last_donation_date)
+                .where(Donor.id > last_id).order_by(Donor.id).limit(batch_size)
+            ).mappings().all()
+            if not donors:
+                break
+            insert_eligibility(connection, donors)
+            indexed += len(donors)
+            last_id = donors[-1]['id']
+    return indexed
+
+
+@event.listens_for(Session, 'after_flush')
+def _sync_eligibility(session, flush_context):
+    changed = [obj for obj in session.new if isinstance(obj, Donor)]
+    for obj in session.dirty:
+        if isinstance(obj, Donor) and any(inspect(obj).attrs[name].history.has_changes() for name in INDEXED_COLUMNS):
+            changed.append(obj)
+    removed = [obj.id for obj in session.deleted if isinstance(obj, Donor)]
+    if not changed and not removed:
+        return
+    connection = session.connection()
+    connection.execute(delete(DonorEligibility).where(
+        DonorEligibility.donor_id.in_([obj.id for obj in changed] + removed)
+    ))
+    insert_eligibility(connection, changed)
+
+
+def _candidate_ids(groups, location_key, cutoff, limit):
+    """Donor ids in rank order: nearby before elsewhere, then group preference, then most recent donors.
+
+    Each step is one index range scan; scanning stops as soon as ``limit`` candidates are found.
+    """
+    found = []
+    steps = [(group, True) for group in groups] if location_key else []
+    steps += [(group, False) for group in groups]
+    for group, nearby in steps:
+        remaining = limit - len(found)
+        if remaining <= 0:
+            break
+        query = select(DonorEligibility.donor_id).where(
+            DonorEligibility.blood_group == group,
+            DonorEligibility.last_donation_date <= cutoff
+        )
+        if nearby:
+            query = query.where(DonorEligibility.location_key == location_key)
+        elif location_key:
+            query = query.where(DonorEligibility.location_key != location_key)
+        query = query.order_by(DonorEligibility.last_donation_date.desc(), DonorEligibility.donor_id.desc())
+        found.extend((donor_id, group, nearby) for donor_id in db.session.scalars(query.limit(remaining)))
+    return found
+
+
+def eligible_donors(blood_request, location=None, limit=DEFAULT_CANDIDATES, deferral_days=DEFERRAL_DAYS, today=None):
+    """Ranked donors who can give to ``blood_request`` now; ``location`` defaults to the patient's."""
+    today = today or date.today()
+    if location is None:
+        patient = db.session.get(Patient, blood_request.patient_id)
+        location = patient.location if patient else ''
+    location_key = normalize_location(location)
+    cutoff = today - timedelta(days=deferral_days)
+
+    ranked = _candidate_ids(COMPATIBLE_DONORS[blood_request.blood_group], location_key, cutoff, limit)
+    donors = {donor.id: donor for donor in Donor.query.filter(Donor.id.in_([row[0] for row in ranked]))} \
+        if ranked else {}
+
+    candidates = []
+    for rank, (donor_id, group, nearby) in enumerate(ranked, start=1):
+        donor = donors.get(donor_id)
+        if donor is None:
+            continue
+        candidate = donor.to_dict()
+        candidate['rank'] = rank
+        candidate['identical_group'] = group == blood_request.blood_group
+        candidate['nearby'] = nearby
+        candidates.append(candidate)
+    return {
+        'request_id': blood_request.id,
+        'blood_group': blood_request.blood_group,
+        'location': location,
+        'compatible_groups': list(COMPATIBLE_DONORS[blood_request.blood_group]),
+        'last_donation_before': cutoff.isoformat(),
+        'candidates': candidates,
+    }
+
+
+class EligibleDonorsResource(Resource):
+    @cached('donors', 'requests', 'patients')
+    def get(self):
+        args = request.args
+        try:
+            request_id = int(args['request_id'])
+            limit = min(max(int(args.get('limit', DEFAULT_CANDIDATES)), 1), MAX_CANDIDATES)
+            deferral_days = max(int(args.get('deferral_days', DEFERRAL_DAYS)), 0)
+        except KeyError:
+            return {'error': 'request_id is required'}, 400
+        except ValueError:
+            return {'error': 'request_id, limit and deferral_days must be integers'}, 400
+
+        blood_request = Request.query.get_or_404(request_id)
+        return eligible_donors(blood_request, location=args.get('location'), limit=limit,
+                               deferral_days=deferral_days), 200
+
+
+@click.group('eligibility')
+def eligibility_cli():
+    """Donor eligibility index maintenance."""
+
+
+@eligibility_cli.command('rebuild')
+@click.option('--batch-size', default=10000, show_default=True)
+@with_appcontext
+def rebuild_command(batch_size):
+    """Rebuild the donor eligibility index from the donors table."""
+    click.echo(f'Indexed {rebuild_eligibility(batch_size)} donors.')
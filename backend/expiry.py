@@ -0,0 +1,204 @@
+import logging
+import os
+import socket
+import threading
+import uuid
+from datetime import date, datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import insert, or_, update
+from sqlalchemy.exc import IntegrityError
+
+from backend.changefeed import prune_events
+from backend.database import db
+from backend.ledger import DEFAULT_SNAPSHOT_SECONDS, snapshot_if_due
+from backend.models import BloodInventory, SchedulerLease
+from backend.sync import prune_tombstones
+
+logger = logging.getLogger('bbms.expiry')
+
+EXPIRING_SOON_DAYS = 7
+SWEEP_BATCH_SIZE = 500
+SWEEP_LEASE = 'expiry-sweeper'
+
+
+def expiring_soon(days=EXPIRING_SOON_DAYS, today=None):
+    """Usable lots that expire within ``days``, soonest first (one range of the status/expiry index)."""
+    threshold = (today or date.today()) + timedelta(days=days)
+    return BloodInventory.query.filter(
+        BloodInventory.status == 'Available',
+        BloodInventory.expiry_date <= threshold
+    ).order_by(BloodInventory.expiry_date, BloodInventory.id).all()
+
+
+def acquire_lease(name, holder, ttl_seconds, now=None):
+    """Take or renew the named lease for ``ttl_seconds``; returns False while another holder's lease is live.
+
+    A single conditional UPDATE decides between competing instances, so this is
+    safe on any number of processes and hosts sharing the database.
+    """
+    now = now or datetime.utcnow()
+    expires_at = now + timedelta(seconds=ttl_seconds)
+    table = SchedulerLease.__table__
+    with db.engine.begin() as connection:
+        taken = connection.execute(
+            update(table)
+            .where(table.c.name == name, or_(table.c.holder == holder, table.c.expires_at < now))
+            .values(holder=holder, expires_at=expires_at)
+        ).rowcount
+    if taken:
+        return True
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(insert(table).values(name=name, holder=holder, expires_at=expires_at))
+        return True
+    except IntegrityError:
+        return False
+
+
+def release_lease(name, holder):
+    table = SchedulerLease.__table__
+    with db.engine.begin() as connection:
+        connection.execute(
+            update(table).where(table.c.name == name, table.c.holder == holder).values(expires_at=datetime.utcnow())
+        )
+
+
+def sweep_expired(today=None, batch_size=SWEEP_BATCH_SIZE, keep_going=lambda: True):
+    """Mark every lot that expired before ``today`` as Discarded, one committed batch at a time.
+
+    Lots are updated through the ORM so the dashboard counters, cache versions
+    and change feed follow; each batch is a single executemany UPDATE.
+    Returns the number of lots discarded.
+    """
+    today = today or date.today()
+    discarded = 0
+    while True:
+        lots = BloodInventory.query.filter(
+            BloodInventory.status == 'Available',
+            BloodInventory.expiry_date < today
+        ).order_by(BloodInventory.expiry_date, BloodInventory.id).limit(batch_size).with_for_update(
+            skip_locked=True
+        ).all()
+        if not lots:
+            break
+        discarded_at = datetime.utcnow()
+        for lot in lots:
+            lot.status = 'Discarded'
+            lot.discarded_at = discarded_at
+        db.session.commit()
+        discarded += len(lots)
+        if not keep_going():
+            break
+    return discarded
+
+
+class ExpiryScheduler:
+    """Runs the expiry sweep every ``interval`` seconds on whichever instance holds the lease."""
+
+    def __init__(self, app, interval):
+        self.app = app
+        self.interval = interval
+        self.holder = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.stopped = threading.Event()
+        self._thread = None
+
+    @property
+    def lease_seconds(self):
+        # Long enough to cover a sweep; renewed after every batch
+        return max(self.interval * 2, 60)
+
+    def run_once(self):
+        """Sweep if this instance can take the lease; returns lots discarded, or None if another instance holds it.
+
+        The lease holder also takes an inventory ledger snapshot whenever the
+        newest is older than LEDGER_SNAPSHOT_SECONDS, prunes expired change
+        events and delta sync tombstones, and with ARCHIVE_AFTER_MONTHS set archives the months
+        that left the hot window.
+        """
+        with self.app.app_context():
+            try:
+                if not acquire_lease(SWEEP_LEASE, self.holder, self.lease_seconds):
+                    return None
+                discarded = sweep_expired(
+                    keep_going=lambda: acquire_lease(SWEEP_LEASE, self.holder, self.lease_seconds)
+                )
+                snapshot_if_due(self.app.config.get('LEDGER_SNAPSHOT_SECONDS', DEFAULT_SNAPSHOT_SECONDS))
+                prune_events()
+                prune_tombstones()
+                if self.app.config.get('ARCHIVE_AFTER_MONTHS'):
+                    # Imported only when archival is enabled
+                    from backend.archive import archive_due
+                    archive_due(self.app.config['ARCHIVE_AFTER_MONTHS'],
+                                keep_going=lambda: acquire_lease(SWEEP_LEASE, self.holder, self.lease_seconds))
+                return discarded
+            finally:
+                db.session.remove()
+
+    def run_forever(self):
+        while not self.stopped.is_set():
+            try:
+                discarded = self.run_once()
+                if discarded:
+                    logger.info('Discarded %d expired lots', discarded)
+            except Exception:
+                logger.exception('Expiry sweep failed')
+            self.stopped.wait(self.interval)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run_forever, name='expiry-sweeper', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        with self.app.app_context():
+            release_lease(SWEEP_LEASE, self.holder)
+
+
+def configure_expiry(app):
+    """Sweeper settings: EXPIRY_SWEEP_INTERVAL, LEDGER_SNAPSHOT_SECONDS and ARCHIVE_AFTER_MONTHS."""
+    app.config.setdefault('EXPIRY_SWEEP_INTERVAL', int(os.environ.get('EXPIRY_SWEEP_INTERVAL', 0)))
+    app.config.setdefault('LEDGER_SNAPSHOT_SECONDS',
+                          int(os.environ.get('LEDGER_SNAPSHOT_SECONDS', DEFAULT_SNAPSHOT_SECONDS)))
+    app.config.setdefault('ARCHIVE_AFTER_MONTHS', int(os.environ.get('ARCHIVE_AFTER_MONTHS', 0)))
+
+
+def start_expiry_scheduler(app):
+    """Start the in-process sweeper when EXPIRY_SWEEP_INTERVAL (seconds) is set; 0 disables it.
+
+    Only serving processes call this (gunicorn workers after the fork, the
+    development server), so CLI commands, scripts and the preloading master
+    never run the thread.
+    """
+    if app.config['EXPIRY_SWEEP_INTERVAL'] > 0:
+        return ExpiryScheduler(app, app.config['EXPIRY_SWEEP_INTERVAL']).start()
+    return None
+
+
+@click.group('expiry')
+def expiry_cli():
+    """Blood inventory expiry sweeps."""
+
+
+@expiry_cli.command('sweep')
+@click.option('--batch-size', default=SWEEP_BATCH_SIZE, show_default=True)
+@with_appcontext
+def sweep_command(batch_size):
+    """Discard expired lots once (no lease; safe alongside running sweepers)."""
+    click.echo(f'Discarded {sweep_expired(batch_size=batch_size)} expired lots.')
+
+
+@expiry_cli.command('worker')
+@click.option('--interval', default=300, show_default=True, help='Seconds between sweeps.')
+@with_appcontext
+def worker_command(interval):
+    """Run the sweeper in the foreground; any number of workers may run, one sweeps at a time."""
+    scheduler = ExpiryScheduler(current_app._get_current_object(), interval)
+    click.echo(f'Expiry worker {scheduler.holder} sweeping every {interval}s')
+    try:
+        scheduler.run_forever()
+    except KeyboardInterrupt:
+        scheduler.stop()
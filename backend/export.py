@@ -0,0 +1,114 @@
+import csv
+import heapq
+import io
+from itertools import islice
+from operator import itemgetter
+
+import click
+from flask import request, Response, stream_with_context
+from flask.cli import with_appcontext
+from flask_restful import Resource
+from sqlalchemy import select
+
+from backend.archive import archived_rows
+from backend.database import db
+from backend.models import API_MODELS, DATE_FIELDS, api_columns
+from backend.pagination import apply_filters, serialize_value, ListQueryError
+from backend.serialization import dumps
+
+# Rows fetched per server-side cursor batch, and per chunk written to the response
+EXPORT_BATCH_SIZE = 2000
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def export_query(model, filters):
+    """Filtered, id-ordered column select for ``model``; raises ListQueryError on bad filters."""
+    names = api_columns(model)
+    stmt = select(*[model.__table__.c[name] for name in names]).order_by(model.id)
+    stmt = apply_filters(stmt, model, filters, date_field=DATE_FIELDS[model.__tablename__])
+    return names, stmt
+
+
+def _batches(rows, batch_size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def iter_export(model, fmt, filters, batch_size=EXPORT_BATCH_SIZE):
+    """Yield the export of ``model`` as text chunks, one per cursor batch.
+
+    Rows are pulled with ``yield_per`` so only one batch is held in memory,
+    regardless of table size. A date range reaching into archived months
+    merges the archived rows in by id.
+    """
+    names, stmt = export_query(model, filters)
+    result = db.session.execute(stmt.execution_options(yield_per=batch_size))
+    batches = result.partitions()
+    archived = archived_rows(model, names, filters, DATE_FIELDS[model.__tablename__])
+    if archived:
+        hot = (row for rows in batches for row in rows)
+        batches = _batches(heapq.merge(hot, archived, key=itemgetter(0)), batch_size)
+
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(names)
+        for rows in batches:
+            writer.writerows([serialize_value(value) for value in row] for row in rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+        return
+
+    for rows in batches:
+        yield b''.join(dumps(dict(zip(names, row))) + b'\n' for row in rows).decode()
+
+
+class ExportResource(Resource):
+    def get(self, table):
+        model = API_MODELS.get(table)
+        if model is None:
+            return {'error': f"Unknown table '{table}'"}, 404
+        fmt = request.args.get('format', 'ndjson')
+        if fmt not in EXPORT_FORMATS:
+            return {'error': "'format' must be ndjson or csv"}, 400
+        try:
+            # Validate filters up front; errors inside the stream could not change the status code
+            export_query(model, request.args)
+        except ListQueryError as e:
+            return {'error': str(e)}, 400
+
+        filters = request.args.to_dict()
+        return Response(
+            stream_with_context(iter_export(model, fmt, filters)),
+            mimetype=EXPORT_FORMATS[fmt],
+            headers={'Content-Disposition': f'attachment; filename={table}.{fmt}'}
+        )
+
+
+@click.command('export')
+@click.argument('table', type=click.Choice(sorted(API_MODELS)))
+@click.option('--format', 'fmt', type=click.Choice(sorted(EXPORT_FORMATS)), default='ndjson', show_default=True)
+@click.option('--output', type=click.File('w', encoding='utf-8'), default='-', help='Defaults to stdout.')
+@click.option('--date-from', help='Inclusive YYYY-MM-DD lower bound on the table date column.')
+@click.option('--date-to', help='Inclusive YYYY-MM-DD upper bound on the table date column.')
+@click.option('--batch-size', default=EXPORT_BATCH_SIZE, show_default=True)
+@with_appcontext
+def export_command(table, fmt, output, date_from, date_to, batch_size):
+    """Stream a whole table to a file as NDJSON or CSV."""
+    filters = {'date_from': date_from, 'date_to': date_to}
+    try:
+        for chunk in iter_export(API_MODELS[table], fmt, filters, batch_size=batch_size):
+            output.write(chunk)
+    except ListQueryError as e:
+        raise click.BadParameter(str(e))
@@ -0,0 +1,120 @@
+import hashlib
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import request, Response
+from sqlalchemy import delete, event, insert, select, update
+from sqlalchemy.orm import Session
+
+from backend.database import db
+from backend.models import IdempotencyKey
+from backend.serialization import dumps, json_response, loads
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+RETENTION = timedelta(hours=24)
+PRUNE_EVERY_SECONDS = 600
+
+_last_prune = 0.0
+
+
+def _digest(data):
+    return hashlib.sha256(data if isinstance(data, bytes) else data.encode()).hexdigest()
+
+
+@event.listens_for(Session, 'before_commit')
+def _claim_key(session):
+    # Written by the commit that creates the rows, so a key and its effects persist together or not at all
+    if session.in_nested_transaction():
+        return
+    claim = session.info.pop('idempotency_claim', None)
+    if claim is not None:
+        session.connection().execute(insert(IdempotencyKey), claim)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_claim(session):
+    session.info.pop('idempotency_claim', None)
+
+
+def _replay(key, fingerprint):
+    """The response to send for an already used key, or None if the request should run."""
+    table = IdempotencyKey.__table__
+    row = db.session.execute(
+        select(table.c.fingerprint, table.c.status, table.c.response, table.c.headers, table.c.created_at)
+        .where(table.c.key == key)
+    ).first()
+    if row is None:
+        return None
+    if row.created_at < datetime.utcnow() - RETENTION:
+        db.session.execute(delete(table).where(table.c.key == key))
+        db.session.commit()
+        return None
+    if row.fingerprint != fingerprint:
+        return {'error': f'{IDEMPOTENCY_HEADER} was already used with a different request body'}, 422
+    if row.status is None:
+        return {'error': f'A request with this {IDEMPOTENCY_HEADER} is in progress or its outcome was lost'}, 409
+    # The stored bytes and headers of the first response, unchanged; rows from before headers were kept get JSON
+    headers = loads(row.headers) if row.headers else [('Content-Type', 'application/json')]
+    response = Response(row.response, status=row.status, headers=headers)
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _as_response(result):
+    """A handler's (body, status[, headers]) as the encoded Response it would have become."""
+    if isinstance(result, Response):
+        return result
+    body, status, *headers = result
+    return json_response(body, status, headers[0] if headers else None)
+
+
+def _store(key, response):
+    global _last_prune
+    table = IdempotencyKey.__table__
+    headers = [(name, value) for name, value in response.headers.items() if name != 'Content-Length']
+    db.session.execute(update(table).where(table.c.key == key).values(
+        status=response.status_code, response=response.get_data(as_text=True), headers=dumps(headers).decode()))
+    if time.monotonic() - _last_prune > PRUNE_EVERY_SECONDS:
+        _last_prune = time.monotonic()
+        db.session.execute(delete(table).where(table.c.created_at < datetime.utcnow() - RETENTION))
+    db.session.commit()
+
+
+def idempotent(method):
+    """Make a create handler safe to retry: requests repeating an ``Idempotency-Key`` get the first response.
+
+    The key is recorded by the same commit that creates the rows, so of two
+    concurrent requests with one key only one can commit; the other rolls back
+    and is answered from the winner's stored response. Reusing a key with a
+    different body is a 422. Failed requests are not recorded and may be
+    retried with the same key. Keys are kept for 24 hours.
+    """
+    @wraps(method)
+    def wrapper(resource, *args, **kwargs):
+        client_key = request.headers.get(IDEMPOTENCY_HEADER)
+        if client_key is None:
+            return method(resource, *args, **kwargs)
+        if not client_key.strip() or len(client_key) > MAX_KEY_LENGTH:
+            return {'error': f'{IDEMPOTENCY_HEADER} must be 1 to {MAX_KEY_LENGTH} characters'}, 400
+
+        key = _digest(f'{request.method} {request.path}\n{client_key}')
+        fingerprint = _digest(request.get_data())
+        replay = _replay(key, fingerprint)
+        if replay is not None:
+            return replay
+
+        db.session.info['idempotency_claim'] = {'key': key, 'fingerprint': fingerprint,
+                                                'created_at': datetime.utcnow()}
+        try:
+            result = method(resource, *args, **kwargs)
+        finally:
+            db.session.info.pop('idempotency_claim', None)
+        response = _as_response(result)
+        if response.status_code >= 300:
+            # A concurrent request with the same key may have committed first
+            return _replay(key, fingerprint) or result
+        _store(key, response)
+        return response
+    return wrapper
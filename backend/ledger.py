@@ -0,0 +1,271 @@
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+import click
+from flask import request
+from flask.cli import with_appcontext
+from flask_restful import Resource
+from sqlalchemy import DateTime, event, func, insert, inspect, literal, null, or_, select
+from sqlalchemy.orm import Session
+
+from backend.cache import cached
+from backend.database import db
+from backend.models import Allocation, BloodInventory, InventoryLedger, InventorySnapshot
+from backend.pagination import list_response
+from backend.stats import BLOOD_GROUP_UNITS, COUNTED_COLUMNS, current_values, old_values, row_contributions
+
+RECEIPT = 'receipt'
+ISSUE = 'issue'
+DISCARD = 'discard'
+ADJUSTMENT = 'adjustment'
+OPENING = 'opening'
+
+BLOOD_GROUPS = tuple(BloodInventory.__table__.c.blood_group.type.enums)
+# The lot columns that decide how much stock a lot holds, and of which group
+LOT_COLUMNS = COUNTED_COLUMNS['blood_inventory']
+# Snapshots stop this far behind the clock, so transactions still in flight when one is taken are not missed
+SNAPSHOT_GRACE = timedelta(seconds=60)
+DEFAULT_SNAPSHOT_SECONDS = 3600
+
+
+def _stock(values):
+    """{blood group: units} of usable stock a lot with these column values holds."""
+    if values is None:
+        return {}
+    return {key: units for (scope, key), units in row_contributions('blood_inventory', values).items()
+            if scope == BLOOD_GROUP_UNITS and units}
+
+
+def _kind(old, new):
+    if old is None:
+        return RECEIPT
+    if new is not None and new.get('status') == 'Discarded' and old.get('status') != 'Discarded':
+        return DISCARD
+    return ADJUSTMENT
+
+
+def _entry(recorded_at, lot_id, blood_group, kind, units, request_id=None):
+    return {'recorded_at': recorded_at, 'lot_id': lot_id, 'blood_group': blood_group, 'kind': kind,
+            'units': units, 'request_id': request_id}
+
+
+def movements(lot_id, old, new, issues=(), recorded_at=None):
+    """Ledger rows for a lot going from ``old`` to ``new`` column values (None: no such lot).
+
+    ``issues`` are (request id, units) taken from the lot by allocations in the
+    same write and are recorded one row each; whatever else changed is a
+    receipt, discard or adjustment.
+    """
+    recorded_at = recorded_at or datetime.utcnow()
+    before, after = _stock(old), _stock(new)
+    rows = []
+    group = new['blood_group'] if new is not None else None
+    for request_id, units in issues:
+        if group in before:
+            rows.append(_entry(recorded_at, lot_id, group, ISSUE, -units, request_id))
+            before[group] -= units
+    kind = _kind(old, new)
+    for blood_group in sorted(set(before) | set(after)):
+        units = after.get(blood_group, 0) - before.get(blood_group, 0)
+        if units:
+            rows.append(_entry(recorded_at, lot_id, blood_group, kind, units))
+    return rows
+
+
+def write_entries(connection, rows):
+    """Append ``rows`` to the ledger with one executemany INSERT."""
+    if rows:
+        connection.execute(insert(InventoryLedger), rows)
+
+
+def record_receipts(connection, ids=(), after_id=None, kind=RECEIPT):
+    """Record the stock of lots written by bulk statements: ``ids`` and every lot above ``after_id``.
+
+    One INSERT ... SELECT, so the lots never pass through Python.
+    """
+    lots = BloodInventory.__table__
+    conditions = []
+    if ids:
+        conditions.append(lots.c.id.in_(list(ids)))
+    if after_id is not None:
+        conditions.append(lots.c.id > after_id)
+    if not conditions:
+        return
+    connection.execute(insert(InventoryLedger).from_select(
+        ['recorded_at', 'lot_id', 'blood_group', 'kind', 'units', 'request_id'],
+        select(literal(datetime.utcnow(), DateTime), lots.c.id, lots.c.blood_group, literal(kind),
+               lots.c.units_available, null())
+        .where(lots.c.status == 'Available', lots.c.units_available != 0, or_(*conditions))
+    ))
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_lot_changes(session, flush_context, instances):
+    issues = defaultdict(list)
+    for obj in session.new:
+        if isinstance(obj, Allocation):
+            issues[obj.inventory_id].append((obj.request_id, obj.units))
+    rows = session.info.setdefault('ledger_rows', [])
+    for obj in session.dirty:
+        if not isinstance(obj, BloodInventory) or not session.is_modified(obj):
+            continue
+        state = inspect(obj)
+        if any(state.attrs[name].history.has_changes() for name in LOT_COLUMNS):
+            rows.extend(movements(obj.id, old_values(session, obj, LOT_COLUMNS), current_values(obj, LOT_COLUMNS),
+                                  issues.get(obj.id, ())))
+
+
+@event.listens_for(Session, 'after_flush')
+def _write_ledger(session, flush_context):
+    rows = session.info.pop('ledger_rows', None) or []
+    for obj in session.new:
+        if isinstance(obj, BloodInventory):
+            rows.extend(movements(obj.id, None, current_values(obj, LOT_COLUMNS)))
+    for obj in session.deleted:
+        if isinstance(obj, BloodInventory):
+            rows.extend(movements(obj.id, current_values(obj, LOT_COLUMNS), None))
+    write_entries(session.connection(), rows)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_ledger_rows(session):
+    session.info.pop('ledger_rows', None)
+
+
+def stock_as_of(at, blood_group=None):
+    """Usable stock per blood group at ``at`` (naive UTC).
+
+    Reads the newest snapshot at or before ``at`` plus the ledger rows
+    recorded after it, so the cost is bounded by the snapshot interval rather
+    than by the length of the history.
+    """
+    snapshots = InventorySnapshot.__table__
+    ledger = InventoryLedger.__table__
+    connection = db.session.connection()
+
+    snapshot_at = connection.execute(select(func.max(snapshots.c.as_of)).where(snapshots.c.as_of <= at)).scalar()
+    balances = dict.fromkeys((blood_group,) if blood_group else BLOOD_GROUPS, 0)
+    if snapshot_at is not None:
+        query = select(snapshots.c.blood_group, snapshots.c.units).where(snapshots.c.as_of == snapshot_at)
+        if blood_group:
+            query = query.where(snapshots.c.blood_group == blood_group)
+        for group, units in connection.execute(query):
+            balances[group] = units
+
+    tail = select(ledger.c.blood_group, func.sum(ledger.c.units), func.count()).where(ledger.c.recorded_at <= at)
+    if snapshot_at is not None:
+        tail = tail.where(ledger.c.recorded_at > snapshot_at)
+    if blood_group:
+        tail = tail.where(ledger.c.blood_group == blood_group)
+    rows_read = 0
+    for group, units, count in connection.execute(tail.group_by(ledger.c.blood_group)):
+        balances[group] = balances.get(group, 0) + units
+        rows_read += count
+
+    return {
+        'at': at.isoformat(),
+        'snapshot_at': snapshot_at.isoformat() if snapshot_at is not None else None,
+        'ledger_rows': rows_read,
+        'blood_groups': balances,
+        'total_units': sum(balances.values()),
+    }
+
+
+def take_snapshot(as_of=None):
+    """Store the stock per blood group as of ``as_of`` (default: SNAPSHOT_GRACE ago); returns the balances."""
+    as_of = as_of or datetime.utcnow() - SNAPSHOT_GRACE
+    balances = stock_as_of(as_of)['blood_groups']
+    table = InventorySnapshot.__table__
+    db.session.execute(table.delete().where(table.c.as_of == as_of))
+    db.session.execute(insert(table), [{'as_of': as_of, 'blood_group': group, 'units': units}
+                                       for group, units in balances.items()])
+    db.session.commit()
+    return balances
+
+
+def latest_snapshot():
+    return db.session.query(func.max(InventorySnapshot.as_of)).scalar()
+
+
+def snapshot_if_due(interval_seconds=DEFAULT_SNAPSHOT_SECONDS):
+    """Take a snapshot when the newest one is more than ``interval_seconds`` old; returns its time, or None."""
+    as_of = datetime.utcnow() - SNAPSHOT_GRACE
+    latest = latest_snapshot()
+    if latest is not None and as_of - latest < timedelta(seconds=interval_seconds):
+        return None
+    take_snapshot(as_of)
+    return as_of
+
+
+def current_stock():
+    """Usable stock per blood group from the lots themselves."""
+    stock = dict.fromkeys(BLOOD_GROUPS, 0)
+    rows = db.session.query(BloodInventory.blood_group, func.sum(BloodInventory.units_available)).filter(
+        BloodInventory.status == 'Available').group_by(BloodInventory.blood_group)
+    for group, units in rows:
+        stock[group] = units or 0
+    return stock
+
+
+def ledger_drift():
+    """{blood group: (ledger balance, stock in lots)} for every group where the two disagree."""
+    balances = stock_as_of(datetime.utcnow() + timedelta(seconds=1))['blood_groups']
+    stock = current_stock()
+    return {group: (balances.get(group, 0), stock.get(group, 0)) for group in set(balances) | set(stock)
+            if balances.get(group, 0) != stock.get(group, 0)}
+
+
+def parse_timestamp(value):
+    """ISO 8601 date or time; offsets are converted to naive UTC, as the ledger stores it."""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+class InventoryLedgerResource(Resource):
+    @cached('blood_inventory')
+    def get(self):
+        return list_response(InventoryLedger, 'entries', date_field='recorded_at')
+
+
+class StockAsOfResource(Resource):
+    @cached('blood_inventory')
+    def get(self):
+        blood_group = request.args.get('blood_group')
+        if blood_group and blood_group not in BLOOD_GROUPS:
+            return {'error': f"'blood_group' must be one of {', '.join(BLOOD_GROUPS)}"}, 400
+        at = request.args.get('at')
+        try:
+            at = parse_timestamp(at) if at else datetime.utcnow()
+        except ValueError:
+            return {'error': "'at' must be an ISO 8601 timestamp, e.g. 2024-03-10T03:00:00Z"}, 400
+        return stock_as_of(at, blood_group), 200
+
+
+@click.group('ledger')
+def ledger_cli():
+    """Inventory ledger snapshots and checks."""
+
+
+@ledger_cli.command('snapshot')
+@click.option('--at', 'as_of', help='Snapshot time (ISO 8601, default: now minus the grace period).')
+@with_appcontext
+def snapshot_command(as_of):
+    """Store the stock per blood group as of now (or --at)."""
+    as_of = parse_timestamp(as_of) if as_of else None
+    balances = take_snapshot(as_of)
+    click.echo(f'Snapshot of {sum(balances.values())} units in {len(balances)} blood groups.')
+
+
+@ledger_cli.command('verify')
+@with_appcontext
+def verify_command():
+    """Compare the ledger balance of every blood group with the stock in the lots."""
+    drift = ledger_drift()
+    if not drift:
+        click.echo('Ledger balances match the inventory.')
+        return
+    for group, (balance, stock) in sorted(drift.items()):
+        click.echo(f'{group}: ledger={balance} lots={stock}')
+    raise SystemExit(1)
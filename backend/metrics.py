@@ -0,0 +1,227 @@
+import cProfile
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+
+from flask import g, has_request_context, request, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('bbms.metrics')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 500)
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+ADMISSION_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.total += 1
+        self.sum += value
+
+
+class MetricsRegistry:
+    """Per-process request and SQL metrics, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+            self.statements_per_request = defaultdict(lambda: Histogram(STATEMENT_BUCKETS))
+            self.requests = Counter()
+            self.sql_statements = Counter()
+            self.sql_seconds = Counter()
+            self.slow_queries = Counter()
+            self.n_plus_one = Counter()
+            self.pool_wait = Histogram(POOL_WAIT_BUCKETS)
+            self.pool_timeouts = Counter()
+            self.admission_wait = defaultdict(lambda: Histogram(ADMISSION_WAIT_BUCKETS))
+            self.admission_requests = Counter()
+            self.gauges = {}
+
+    def observe_request(self, endpoint, method, status, seconds, statements, sql_seconds):
+        with self._lock:
+            self.latency[(endpoint, method)].observe(seconds)
+            self.statements_per_request[(endpoint, method)].observe(statements)
+            self.requests[(endpoint, method, str(status))] += 1
+            self.sql_statements[(endpoint, method)] += statements
+            self.sql_seconds[(endpoint, method)] += sql_seconds
+
+    def observe_pool_wait(self, seconds):
+        with self._lock:
+            self.pool_wait.observe(seconds)
+
+    def observe_admission(self, admission_class, seconds, refused=None):
+        with self._lock:
+            if refused is None:
+                self.admission_wait[(admission_class,)].observe(seconds)
+            self.admission_requests[(admission_class, refused or 'admitted')] += 1
+
+    def count(self, counter, labels, amount=1):
+        with self._lock:
+            getattr(self, counter)[labels] += amount
+
+    def register_gauges(self, name, collect):
+        """Add ``collect()`` -> {metric name: value} to every scrape (e.g. cache counters)."""
+        self.gauges[name] = collect
+
+    def render(self):
+        lines = []
+
+        def histogram(name, help_text, series, label_names=('endpoint', 'method')):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for key, hist in sorted(series.items()):
+                labels = ','.join(f'{label}="{value}"' for label, value in zip(label_names, key))
+                bucket_labels = f'{labels},' if labels else ''
+                for bound, count in zip(hist.buckets, hist.counts):
+                    lines.append(f'{name}_bucket{{{bucket_labels}le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{{bucket_labels}le="+Inf"}} {hist.total}')
+                lines.append(f'{name}_sum{{{labels}}} {hist.sum:.6f}')
+                lines.append(f'{name}_count{{{labels}}} {hist.total}')
+
+        def counter(name, help_text, series, label_names):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for labels, value in sorted(series.items()):
+                label_text = ','.join(f'{key}="{val}"' for key, val in zip(label_names, labels))
+                lines.append(f'{name}{{{label_text}}} {value:g}' if isinstance(value, float)
+                             else f'{name}{{{label_text}}} {value}')
+
+        with self._lock:
+            histogram('bbms_http_request_duration_seconds', 'Request latency by endpoint.', self.latency)
+            histogram('bbms_sql_statements_per_request', 'SQL statements executed per request.',
+                      self.statements_per_request)
+            counter('bbms_http_requests_total', 'Requests by endpoint and status.', self.requests,
+                    ('endpoint', 'method', 'status'))
+            counter('bbms_sql_statements_total', 'SQL statements executed.', self.sql_statements,
+                    ('endpoint', 'method'))
+            counter('bbms_sql_duration_seconds_total', 'Time spent in SQL statements.', self.sql_seconds,
+                    ('endpoint', 'method'))
+            counter('bbms_sql_slow_queries_total', 'Statements slower than the slow query threshold.',
+                    self.slow_queries, ('endpoint', 'method'))
+            counter('bbms_sql_n_plus_one_total', 'Requests that repeated one statement many times.',
+                    self.n_plus_one, ('endpoint', 'method'))
+            histogram('bbms_db_pool_checkout_wait_seconds', 'Time spent waiting for a pooled connection.',
+                      {(): self.pool_wait})
+            counter('bbms_db_pool_timeouts_total', 'Checkouts that gave up after DB_POOL_TIMEOUT.',
+                    self.pool_timeouts, ())
+            histogram('bbms_admission_wait_seconds', 'Time admitted requests waited for a slot, by class.',
+                      self.admission_wait, ('class',))
+            counter('bbms_admission_requests_total', 'Requests by admission class and outcome.',
+                    self.admission_requests, ('class', 'outcome'))
+            gauges = list(self.gauges.items())
+
+        for prefix, collect in gauges:
+            for name, value in collect().items():
+                metric = f'bbms_{prefix}_{name}'
+                lines.append(f'# TYPE {metric} gauge')
+                lines.append(f'{metric} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
+
+
+def _endpoint_label():
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context, not the connection: a statement that raises never reaches
+    # after_cursor_execute, so nothing is left behind on the pooled connection
+    if context is not None:
+        context.bbms_query_start = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, 'bbms_query_start', None)
+    if started is None or not has_request_context() or 'sql_statements' not in g:
+        return
+    elapsed = time.perf_counter() - started
+    g.sql_time += elapsed
+    g.sql_statements[statement] += 1
+    if elapsed * 1000 >= g.slow_query_ms:
+        metrics.count('slow_queries', (_endpoint_label(), request.method))
+        logger.warning('Slow query (%.1f ms) on %s %s: %s', elapsed * 1000, request.method, request.path,
+                       ' '.join(statement.split())[:500])
+
+
+def init_metrics(app):
+    """Install request timing, SQL instrumentation, optional profiling and the /metrics endpoint.
+
+    Config: SLOW_QUERY_MS (default 200), N_PLUS_ONE_THRESHOLD (default 10),
+    PROFILING_ENABLED (default False) and PROFILE_DIR. With profiling enabled a
+    request carrying ``X-Profile: 1`` or ``?_profile=1`` is run under cProfile
+    and its stats are written to PROFILE_DIR.
+    """
+    app.config.setdefault('SLOW_QUERY_MS', float(os.environ.get('SLOW_QUERY_MS', 200)))
+    app.config.setdefault('N_PLUS_ONE_THRESHOLD', int(os.environ.get('N_PLUS_ONE_THRESHOLD', 10)))
+    app.config.setdefault('PROFILING_ENABLED', os.environ.get('PROFILING_ENABLED', '').lower() == 'true')
+    app.config.setdefault('PROFILE_DIR', os.environ.get('PROFILE_DIR', '/tmp/bbms-profiles'))
+
+    @app.before_request
+    def _start_request_metrics():
+        g.request_started = time.perf_counter()
+        g.sql_statements = Counter()
+        g.sql_time = 0.0
+        g.slow_query_ms = app.config['SLOW_QUERY_MS']
+        if app.config['PROFILING_ENABLED'] and (
+                request.headers.get('X-Profile') == '1' or request.args.get('_profile') == '1'):
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    @app.after_request
+    def _record_request_metrics(response):
+        if 'request_started' not in g:
+            return response
+        elapsed = time.perf_counter() - g.request_started
+        endpoint, method = _endpoint_label(), request.method
+        statement_count = sum(g.sql_statements.values())
+        metrics.observe_request(endpoint, method, response.status_code, elapsed, statement_count, g.sql_time)
+
+        repeated = [(statement, count) for statement, count in g.sql_statements.items()
+                    if count >= app.config['N_PLUS_ONE_THRESHOLD']]
+        if repeated:
+            metrics.count('n_plus_one', (endpoint, method))
+            for statement, count in repeated:
+                logger.warning('Possible N+1 on %s %s: %d executions of %s', method, request.path, count,
+                               ' '.join(statement.split())[:500])
+
+        response.headers['Server-Timing'] = (
+            f'app;dur={elapsed * 1000:.1f}, db;dur={g.sql_time * 1000:.1f};desc="{statement_count} queries"'
+        )
+        if g.get('admission_wait') is not None:
+            response.headers['Server-Timing'] += f', queue;dur={g.admission_wait * 1000:.1f}'
+
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            os.makedirs(app.config['PROFILE_DIR'], exist_ok=True)
+            name = f"{method}-{endpoint.strip('/').replace('/', '_').replace('<', '').replace('>', '')}"
+            path = os.path.join(app.config['PROFILE_DIR'], f'{name}-{int(time.time() * 1000)}.prof')
+            profiler.dump_stats(path)
+            response.headers['X-Profile-File'] = path
+        return response
+
+    @app.route('/metrics')
+    def prometheus_metrics():
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
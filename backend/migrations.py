@@ -0,0 +1,362 @@
+from datetime import date, datetime, timedelta
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import inspect, text
+
+from backend.database import db
+
+# Indexes added by migration 1, frozen here so later model changes do not rewrite history
+HOT_PATH_INDEXES = (
+    ('ix_donors_blood_group', 'donors', ('blood_group',)),
+    ('ix_requests_status', 'requests', ('status',)),
+    ('ix_requests_priority', 'requests', ('priority',)),
+    ('ix_requests_date', 'requests', ('date',)),
+    ('ix_requests_patient_id', 'requests', ('patient_id',)),
+    ('ix_blood_inventory_expiry_date', 'blood_inventory', ('expiry_date',)),
+    ('ix_blood_inventory_units_available', 'blood_inventory', ('units_available',)),
+    ('ix_blood_inventory_blood_group_expiry_date', 'blood_inventory', ('blood_group', 'expiry_date')),
+    ('ix_donation_records_date_of_donation', 'donation_records', ('date_of_donation',)),
+    ('ix_donation_records_donor_id', 'donation_records', ('donor_id',)),
+    ('ix_allocations_request_id', 'allocations', ('request_id',)),
+    ('ix_allocations_inventory_id', 'allocations', ('inventory_id',)),
+)
+
+# (constraint, table, column, referenced table, ON DELETE action)
+FOREIGN_KEYS = (
+    ('fk_donation_records_donor_id', 'donation_records', 'donor_id', 'donors', 'RESTRICT'),
+    ('fk_requests_patient_id', 'requests', 'patient_id', 'patients', 'RESTRICT'),
+    ('fk_allocations_request_id', 'allocations', 'request_id', 'requests', 'CASCADE'),
+    ('fk_allocations_inventory_id', 'allocations', 'inventory_id', 'blood_inventory', 'CASCADE'),
+)
+
+
+class MigrationError(Exception):
+    pass
+
+
+def create_index(name, table, columns):
+    """Create an index without blocking writes where the database allows it.
+
+    On PostgreSQL this runs CREATE INDEX CONCURRENTLY on an autocommit connection;
+    an invalid index left behind by an interrupted build is dropped and rebuilt.
+    """
+    column_list = ', '.join(columns)
+    if db.engine.dialect.name == 'postgresql':
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            invalid = connection.execute(text(
+                "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE c.relname = :name AND NOT i.indisvalid"
+            ), {'name': name}).first()
+            if invalid:
+                connection.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS {name}'))
+            connection.execute(text(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({column_list})'))
+    else:
+        with db.engine.begin() as connection:
+            connection.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({column_list})'))
+
+
+def orphan_rows(table, column, referenced, sample=10):
+    """(count, first ids) of ``table`` rows whose ``column`` points at no ``referenced`` row."""
+    condition = (f'FROM {table} t WHERE t.{column} IS NOT NULL '
+                 f'AND NOT EXISTS (SELECT 1 FROM {referenced} r WHERE r.id = t.{column})')
+    with db.engine.connect() as connection:
+        count = connection.execute(text(f'SELECT COUNT(*) {condition}')).scalar()
+        ids = connection.execute(text(f'SELECT t.id {condition} ORDER BY t.id LIMIT {sample}')).scalars().all()
+    return count, ids
+
+
+def add_foreign_key(name, table, column, referenced, ondelete=None):
+    """Add a foreign key without a long exclusive lock (PostgreSQL: NOT VALID, then VALIDATE).
+
+    A constraint left NOT VALID by an earlier failed run is validated again.
+    Rows that reference a missing parent raise MigrationError naming them.
+    SQLite cannot add constraints to an existing table; new SQLite databases get
+    them from the model definitions instead.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return
+    with db.engine.connect() as connection:
+        validated = connection.execute(text(
+            'SELECT convalidated FROM pg_constraint WHERE conname = :name AND conrelid = CAST(:table AS regclass)'
+        ), {'name': name, 'table': table}).scalar()
+    if validated:
+        return
+    # Deleting a donor or patient used to leave their records behind, which VALIDATE would reject
+    count, ids = orphan_rows(table, column, referenced)
+    if count:
+        raise MigrationError(
+            f"Cannot add {name}: {count} {table} row(s) have a {column} with no {referenced} row "
+            f"(ids {', '.join(map(str, ids))}{', ...' if count > len(ids) else ''}). "
+            f"Delete or correct them, then run 'flask --app main db upgrade' again."
+        )
+    if validated is None:
+        on_delete = f' ON DELETE {ondelete}' if ondelete else ''
+        with db.engine.begin() as connection:
+            connection.execute(text(
+                f'ALTER TABLE {table} ADD CONSTRAINT {name} FOREIGN KEY ({column}) '
+                f'REFERENCES {referenced} (id){on_delete} NOT VALID'
+            ))
+    with db.engine.begin() as connection:
+        connection.execute(text(f'ALTER TABLE {table} VALIDATE CONSTRAINT {name}'))
+
+
+def add_column(table, column, ddl):
+    """Add a column if it is missing (ADD COLUMN with a constant default is instant on PostgreSQL 11+)."""
+    if column in {existing['name'] for existing in inspect(db.engine).get_columns(table)}:
+        return
+    with db.engine.begin() as connection:
+        connection.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+
+
+def _hot_path_indexes():
+    for name, table, columns in HOT_PATH_INDEXES:
+        create_index(name, table, columns)
+
+
+def _foreign_keys():
+    for name, table, column, referenced, ondelete in FOREIGN_KEYS:
+        add_foreign_key(name, table, column, referenced, ondelete)
+
+
+def _donor_eligibility():
+    # The table itself is created by upgrade(); index every existing donor
+    from backend.eligibility import rebuild_eligibility
+    rebuild_eligibility()
+
+
+def _inventory_status():
+    status_type = 'VARCHAR(9)'
+    if db.engine.dialect.name == 'postgresql':
+        with db.engine.begin() as connection:
+            connection.execute(text(
+                "DO $$ BEGIN CREATE TYPE inventory_status_enum AS ENUM ('Available', 'Discarded'); "
+                "EXCEPTION WHEN duplicate_object THEN NULL; END $$"
+            ))
+        status_type = 'inventory_status_enum'
+    add_column('blood_inventory', 'status', f"{status_type} NOT NULL DEFAULT 'Available'")
+    add_column('blood_inventory', 'discarded_at', 'TIMESTAMP')
+    create_index('ix_blood_inventory_status_expiry_date', 'blood_inventory', ('status', 'expiry_date'))
+
+
+def _analytics_indexes():
+    create_index('ix_donation_records_analytics', 'donation_records',
+                 ('date_of_donation', 'blood_group', 'units_donated', 'donor_id'))
+    create_index('ix_requests_analytics', 'requests',
+                 ('date', 'blood_group', 'priority', 'status', 'units_requested', 'patient_id'))
+
+
+def _row_versions():
+    # The idempotency_keys table itself is created by upgrade()
+    for table in ('donors', 'patients', 'blood_inventory', 'requests', 'donation_records'):
+        add_column(table, 'version', 'INTEGER NOT NULL DEFAULT 1')
+
+
+def _search_index():
+    # The tables themselves are created by upgrade(); index every existing donor and patient
+    from backend.search import rebuild_search_index
+    rebuild_search_index()
+
+
+def _inventory_ledger():
+    # The tables themselves are created by upgrade(); open the ledger with the stock every lot holds now
+    from backend.ledger import OPENING, record_receipts
+    with db.engine.begin() as connection:
+        record_receipts(connection, after_id=0, kind=OPENING)
+
+
+def _delta_sync():
+    # The tombstones table itself is created by upgrade(); existing rows keep the epoch until they next change
+    from backend.models import SYNC_EPOCH
+    for table in ('donors', 'patients', 'blood_inventory', 'requests', 'donation_records'):
+        add_column(table, 'updated_at', f"TIMESTAMP NOT NULL DEFAULT '{SYNC_EPOCH}'")
+        create_index(f'ix_{table}_updated_at', table, ('updated_at', 'id'))
+
+
+def _idempotency_headers():
+    add_column('idempotency_keys', 'headers', 'TEXT')
+
+
+# Ordered schema migrations: (version, description, function). Append only.
+MIGRATIONS = [
+    (1, 'hot path indexes', _hot_path_indexes),
+    (2, 'foreign keys on donor_id, patient_id and allocations', _foreign_keys),
+    (3, 'donor eligibility index', _donor_eligibility),
+    (4, 'inventory lot status and expiry sweep index', _inventory_status),
+    (5, 'covering indexes for analytics trends', _analytics_indexes),
+    (6, 'row versions for optimistic concurrency', _row_versions),
+    (7, 'donor and patient search index', _search_index),
+    (8, 'inventory ledger and stock snapshots', _inventory_ledger),
+    (9, 'updated_at and tombstones for delta sync', _delta_sync),
+    (10, 'response headers of idempotency keys', _idempotency_headers),
+]
+
+
+def _ensure_version_table():
+    with db.engine.begin() as connection:
+        connection.execute(text(
+            'CREATE TABLE IF NOT EXISTS schema_migrations ('
+            'version INTEGER PRIMARY KEY, name VARCHAR(200) NOT NULL, applied_at TIMESTAMP NOT NULL)'
+        ))
+
+
+def applied_versions():
+    _ensure_version_table()
+    with db.engine.connect() as connection:
+        return {row[0] for row in connection.execute(text('SELECT version FROM schema_migrations'))}
+
+
+def _record(version, name):
+    with db.engine.begin() as connection:
+        connection.execute(
+            text('INSERT INTO schema_migrations (version, name, applied_at) VALUES (:version, :name, :applied_at)'),
+            {'version': version, 'name': name, 'applied_at': datetime.utcnow()}
+        )
+
+
+def upgrade(echo=lambda message: None):
+    """Bring the database schema up to date.
+
+    A fresh database gets the full current schema from the models and every
+    migration is recorded as applied. An existing database gets any new tables,
+    then each pending migration in order; migrations are idempotent so a run
+    interrupted part-way can simply be repeated.
+    """
+    import backend.models  # noqa: F401
+
+    existing_tables = set(inspect(db.engine).get_table_names())
+    fresh = not (existing_tables - {'schema_migrations'})
+    applied = applied_versions()
+
+    # Creates missing tables only; existing tables are altered by migrations
+    db.create_all()
+
+    for version, name, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        if not fresh:
+            echo(f'Applying migration {version}: {name}')
+            migrate()
+        _record(version, name)
+    return [version for version, _, _ in MIGRATIONS if version not in applied]
+
+
+# Representative dashboard and list queries that must be served from an index
+PLAN_CHECKS = (
+    ('dashboard low stock alerts', 'SELECT id FROM blood_inventory WHERE units_available < :units', {'units': 10}),
+    ('dashboard expiry alerts', "SELECT id FROM blood_inventory WHERE status = 'Available' AND expiry_date <= :day",
+     {'day': date.today()}),
+    ('expiry sweep', "SELECT id FROM blood_inventory WHERE status = 'Available' AND expiry_date < :day "
+     'ORDER BY expiry_date, id LIMIT 500', {'day': date.today()}),
+    ('donors by blood group', 'SELECT id FROM donors WHERE blood_group = :group', {'group': 'O+'}),
+    ('requests by status', 'SELECT id FROM requests WHERE status = :status', {'status': 'Pending'}),
+    ('requests by priority', 'SELECT id FROM requests WHERE priority = :priority', {'priority': 'Critical'}),
+    ('requests by patient', 'SELECT id FROM requests WHERE patient_id = :id', {'id': 1}),
+    ('donations by date range',
+     'SELECT id FROM donation_records WHERE date_of_donation >= :start AND date_of_donation <= :end',
+     {'start': date(2000, 1, 1), 'end': date.today()}),
+    ('donations by donor', 'SELECT id FROM donation_records WHERE donor_id = :id', {'id': 1}),
+    ('keyset page', 'SELECT id FROM donation_records WHERE id > :after ORDER BY id LIMIT 101', {'after': 0}),
+    ('eligible donors nearby',
+     'SELECT donor_id FROM donor_eligibility WHERE blood_group = :group AND location_key = :location '
+     'AND last_donation_date <= :cutoff ORDER BY last_donation_date DESC LIMIT 50',
+     {'group': 'O-', 'location': 'new york', 'cutoff': date.today()}),
+    ('analytics donation trend',
+     'SELECT date_of_donation, blood_group, COUNT(id), SUM(units_donated) FROM donation_records '
+     'WHERE date_of_donation >= :start AND date_of_donation <= :end GROUP BY date_of_donation, blood_group',
+     {'start': date(2000, 1, 1), 'end': date.today()}),
+    ('analytics request trend',
+     'SELECT date, priority, COUNT(id), SUM(units_requested) FROM requests '
+     'WHERE date >= :start AND date <= :end GROUP BY date, priority',
+     {'start': date(2000, 1, 1), 'end': date.today()}),
+    ('search term postings', 'SELECT row_id FROM search_postings WHERE term = :term AND entity = :entity',
+     {'term': 'smith', 'entity': 'donors'}),
+    ('search row postings', 'SELECT term FROM search_postings WHERE entity = :entity AND row_id = :id',
+     {'entity': 'donors', 'id': 1}),
+    ('search trigram candidates', 'SELECT term FROM search_grams WHERE gram = :gram', {'gram': 'smi'}),
+    ('stock snapshot lookup', 'SELECT MAX(as_of) FROM inventory_snapshots WHERE as_of <= :at',
+     {'at': datetime.utcnow()}),
+    ('stock ledger tail',
+     'SELECT blood_group, SUM(units) FROM inventory_ledger WHERE recorded_at > :since AND recorded_at <= :at '
+     'GROUP BY blood_group', {'since': datetime.utcnow() - timedelta(hours=1), 'at': datetime.utcnow()}),
+    ('lot ledger', 'SELECT id FROM inventory_ledger WHERE lot_id = :id ORDER BY id', {'id': 1}),
+    ('archived partitions in range',
+     'SELECT id FROM archive_partitions WHERE table_name = :table AND month >= :start AND month <= :end',
+     {'table': 'donation_records', 'start': date(2000, 1, 1), 'end': date.today()}),
+    ('oldest archivable request', "SELECT MIN(date) FROM requests WHERE date < :cutoff "
+     "AND status IN ('Fulfilled', 'Rejected')", {'cutoff': date.today()}),
+    ('delta sync page', 'SELECT id FROM donation_records WHERE updated_at >= :at AND (updated_at > :at OR id > :id) '
+     'ORDER BY updated_at, id LIMIT 1001', {'at': datetime.utcnow(), 'id': 0}),
+    ('delta sync tombstones',
+     'SELECT row_id FROM tombstones WHERE deleted_at >= :at AND (deleted_at > :at OR id > :id) '
+     'ORDER BY deleted_at, id LIMIT 1001', {'at': datetime.utcnow(), 'id': 0}),
+    ('FEFO lots', 'SELECT id FROM blood_inventory WHERE blood_group = :group AND expiry_date >= :day',
+     {'group': 'O-', 'day': date.today()}),
+)
+
+
+def _is_sequential_scan(dialect, plan_lines):
+    if dialect == 'postgresql':
+        return any('Seq Scan' in line for line in plan_lines)
+    # SQLite reports "SEARCH ... USING INDEX" for index lookups and "SCAN <table>" for full scans,
+    # including "SCAN <table> USING COVERING INDEX", which reads a whole index in place of the table
+    return any(line.startswith('SCAN ') and line != 'SCAN CONSTANT ROW' for line in plan_lines)
+
+
+def check_query_plans():
+    """Return {check name: plan lines} for every PLAN_CHECKS query that falls back to a sequential scan.
+
+    PostgreSQL runs with enable_seqscan off so small tables do not mask a missing index.
+    """
+    dialect = db.engine.dialect.name
+    failures = {}
+    with db.engine.begin() as connection:
+        if dialect == 'postgresql':
+            connection.execute(text('SET LOCAL enable_seqscan = off'))
+        prefix = 'EXPLAIN ' if dialect == 'postgresql' else 'EXPLAIN QUERY PLAN '
+        for name, sql, params in PLAN_CHECKS:
+            rows = connection.execute(text(prefix + sql), params).all()
+            plan = [str(row[0]) if dialect == 'postgresql' else str(row[-1]) for row in rows]
+            if _is_sequential_scan(dialect, plan):
+                failures[name] = plan
+    return failures
+
+
+@click.group('db')
+def db_cli():
+    """Schema migrations and query plan checks."""
+
+
+@db_cli.command('upgrade')
+@with_appcontext
+def upgrade_command():
+    """Apply pending schema migrations."""
+    try:
+        applied = upgrade(echo=click.echo)
+    except MigrationError as e:
+        raise click.ClickException(str(e))
+    click.echo(f'Applied {len(applied)} migration(s).' if applied else 'Schema is up to date.')
+
+
+@db_cli.command('status')
+@with_appcontext
+def status_command():
+    """List migrations and whether they have been applied."""
+    applied = applied_versions()
+    for version, name, _ in MIGRATIONS:
+        click.echo(f"{'x' if version in applied else ' '} {version:>3}  {name}")
+
+
+@db_cli.command('check-plans')
+@with_appcontext
+def check_plans_command():
+    """Fail if a dashboard or list query would use a sequential scan."""
+    failures = check_query_plans()
+    if not failures:
+        click.echo(f'All {len(PLAN_CHECKS)} query plans use an index.')
+        return
+    for name, plan in failures.items():
+        click.echo(f'{name}:')
+        for line in plan:
+            click.echo(f'    {line}')
+    raise SystemExit(1)
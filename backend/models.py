@@ -1,20 +1,34 @@
 from datetime import datetime
-from sqlalchemy import Integer, String, Date, DateTime, Text, Enum
+from sqlalchemy import Integer, String, Date, DateTime, Text, Enum, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column
 from backend.database import db
 
+# updated_at of rows last written before delta sync existed (SQLAlchemy's SQLite DateTime format)
+SYNC_EPOCH = '1970-01-01 00:00:00.000000'
+
 class Donor(db.Model):
     __tablename__ = 'donors'
+    __table_args__ = (
+        # Delta sync: rows changed since a cursor, in (updated_at, id) order
+        Index('ix_donors_updated_at', 'updated_at', 'id'),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     name: Mapped[str] = mapped_column(String(100), nullable=False)
     age: Mapped[int] = mapped_column(Integer, nullable=False)
     gender: Mapped[str] = mapped_column(Enum('Male', 'Female', 'Other', name='gender_enum'), nullable=False)
-    blood_group: Mapped[str] = mapped_column(Enum('A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-', name='blood_group_enum'), nullable=False)
+    blood_group: Mapped[str] = mapped_column(Enum('A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-', name='blood_group_enum'), nullable=False, index=True)
     contact: Mapped[str] = mapped_column(String(15), nullable=False)
     location: Mapped[str] = mapped_column(String(200), nullable=False)
     last_donation_date: Mapped[datetime] = mapped_column(Date, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # Delta sync: stamped on every insert and update, including Core and bulk statements
+    updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow,
+                                                 onupdate=datetime.utcnow, server_default=SYNC_EPOCH)
+    # Optimistic concurrency: every ORM UPDATE/DELETE checks and bumps it (If-Match on the API)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=1, server_default='1')
+    
+    __mapper_args__ = {'version_id_col': version}
     
     def to_dict(self):
         return {
@@ -26,11 +40,15 @@ class Donor(db.Model):
             'contact': self.contact,
             'location': self.location,
             'last_donation_date': self.last_donation_date.isoformat() if self.last_donation_date else None,
-            'created_at': self.created_at.isoformat()
+            'created_at': self.created_at.isoformat(),
+            'version': self.version
         }
 
 class Patient(db.Model):
     __tablename__ = 'patients'
+    __table_args__ = (
+        Index('ix_patients_updated_at', 'updated_at', 'id'),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     name: Mapped[str] = mapped_column(String(100), nullable=False)
@@ -40,6 +58,11 @@ class Patient(db.Model):
     location: Mapped[str] = mapped_column(String(200), nullable=False)
     units_needed: Mapped[int] = mapped_column(Integer, nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow,
+                                                 onupdate=datetime.utcnow, server_default=SYNC_EPOCH)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=1, server_default='1')
+    
+    __mapper_args__ = {'version_id_col': version}
     
     def to_dict(self):
         return {
@@ -50,17 +73,38 @@ class Patient(db.Model):
             'contact': self.contact,
             'location': self.location,
             'units_needed': self.units_needed,
-            'created_at': self.created_at.isoformat()
+            'created_at': self.created_at.isoformat(),
+            'version': self.version
         }
 
 class BloodInventory(db.Model):
     __tablename__ = 'blood_inventory'
+    __table_args__ = (
+        # FEFO allocation: usable lots of a group by expiry
+        Index('ix_blood_inventory_blood_group_expiry_date', 'blood_group', 'expiry_date'),
+        # Expiry sweep and expiring-soon alerts: live lots by expiry
+        Index('ix_blood_inventory_status_expiry_date', 'status', 'expiry_date'),
+        Index('ix_blood_inventory_updated_at', 'updated_at', 'id'),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     blood_group: Mapped[str] = mapped_column(Enum('A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-', name='inventory_blood_group_enum'), nullable=False)
-    units_available: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
-    expiry_date: Mapped[datetime] = mapped_column(Date, nullable=False)
+    units_available: Mapped[int] = mapped_column(Integer, nullable=False, default=0, index=True)
+    expiry_date: Mapped[datetime] = mapped_column(Date, nullable=False, index=True)
+    status: Mapped[str] = mapped_column(Enum('Available', 'Discarded', name='inventory_status_enum'), nullable=False, default='Available', server_default='Available')
+    discarded_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow,
+                                                 onupdate=datetime.utcnow, server_default=SYNC_EPOCH)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=1, server_default='1')
+    
+    __mapper_args__ = {'version_id_col': version}
+
+    def set_status(self, status):
+        """Change the lot status, stamping discarded_at as the expiry sweep does."""
+        if status != self.status:
+            self.status = status
+            self.discarded_at = datetime.utcnow() if status == 'Discarded' else None
     
     def to_dict(self):
         return {
@@ -68,19 +112,32 @@ class BloodInventory(db.Model):
             'blood_group': self.blood_group,
             'units_available': self.units_available,
             'expiry_date': self.expiry_date.isoformat(),
-            'created_at': self.created_at.isoformat()
+            'status': self.status,
+            'discarded_at': self.discarded_at.isoformat() if self.discarded_at else None,
+            'created_at': self.created_at.isoformat(),
+            'version': self.version
         }
 
 class DonationRecord(db.Model):
     __tablename__ = 'donation_records'
+    __table_args__ = (
+        # Analytics trends: covers the date range, dimensions and measures so GROUP BY reads only the index
+        Index('ix_donation_records_analytics', 'date_of_donation', 'blood_group', 'units_donated', 'donor_id'),
+        Index('ix_donation_records_updated_at', 'updated_at', 'id'),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    donor_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    donor_id: Mapped[int] = mapped_column(Integer, ForeignKey('donors.id', ondelete='RESTRICT'), nullable=False, index=True)
     donor_name: Mapped[str] = mapped_column(String(100), nullable=False)
     blood_group: Mapped[str] = mapped_column(Enum('A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-', name='donation_blood_group_enum'), nullable=False)
-    date_of_donation: Mapped[datetime] = mapped_column(Date, nullable=False, default=datetime.utcnow)
+    date_of_donation: Mapped[datetime] = mapped_column(Date, nullable=False, default=datetime.utcnow, index=True)
     units_donated: Mapped[int] = mapped_column(Integer, nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow,
+                                                 onupdate=datetime.utcnow, server_default=SYNC_EPOCH)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=1, server_default='1')
+    
+    __mapper_args__ = {'version_id_col': version}
     
     def to_dict(self):
         return {
@@ -90,21 +147,32 @@ class DonationRecord(db.Model):
             'blood_group': self.blood_group,
             'date_of_donation': self.date_of_donation.isoformat(),
             'units_donated': self.units_donated,
-            'created_at': self.created_at.isoformat()
+            'created_at': self.created_at.isoformat(),
+            'version': self.version
         }
 
 class Request(db.Model):
     __tablename__ = 'requests'
+    __table_args__ = (
+        # Analytics trends (see ix_donation_records_analytics)
+        Index('ix_requests_analytics', 'date', 'blood_group', 'priority', 'status', 'units_requested', 'patient_id'),
+        Index('ix_requests_updated_at', 'updated_at', 'id'),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    patient_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    patient_id: Mapped[int] = mapped_column(Integer, ForeignKey('patients.id', ondelete='RESTRICT'), nullable=False, index=True)
     patient_name: Mapped[str] = mapped_column(String(100), nullable=False)
     blood_group: Mapped[str] = mapped_column(Enum('A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-', name='request_blood_group_enum'), nullable=False)
     units_requested: Mapped[int] = mapped_column(Integer, nullable=False)
-    date: Mapped[datetime] = mapped_column(Date, nullable=False, default=datetime.utcnow)
-    status: Mapped[str] = mapped_column(Enum('Pending', 'Approved', 'Fulfilled', 'Rejected', name='request_status_enum'), nullable=False, default='Pending')
-    priority: Mapped[str] = mapped_column(Enum('Low', 'Medium', 'High', 'Critical', name='priority_enum'), nullable=False, default='Medium')
+    date: Mapped[datetime] = mapped_column(Date, nullable=False, default=datetime.utcnow, index=True)
+    status: Mapped[str] = mapped_column(Enum('Pending', 'Approved', 'Fulfilled', 'Rejected', name='request_status_enum'), nullable=False, default='Pending', index=True)
+    priority: Mapped[str] = mapped_column(Enum('Low', 'Medium', 'High', 'Critical', name='priority_enum'), nullable=False, default='Medium', index=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow,
+                                                 onupdate=datetime.utcnow, server_default=SYNC_EPOCH)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=1, server_default='1')
+    
+    __mapper_args__ = {'version_id_col': version}
     
     def to_dict(self):
         return {
@@ -116,5 +184,219 @@ class Request(db.Model):
             'date': self.date.isoformat(),
             'status': self.status,
             'priority': self.priority,
+            'created_at': self.created_at.isoformat(),
+            'version': self.version
+        }
+
+class StatCounter(db.Model):
+    __tablename__ = 'stat_counters'
+    
+    scope: Mapped[str] = mapped_column(String(32), primary_key=True)
+    key: Mapped[str] = mapped_column(String(32), primary_key=True)
+    value: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+class Allocation(db.Model):
+    __tablename__ = 'allocations'
+    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    request_id: Mapped[int] = mapped_column(Integer, ForeignKey('requests.id', ondelete='CASCADE'), nullable=False, index=True)
+    inventory_id: Mapped[int] = mapped_column(Integer, ForeignKey('blood_inventory.id', ondelete='CASCADE'), nullable=False, index=True)
+    blood_group: Mapped[str] = mapped_column(Enum('A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-', name='allocation_blood_group_enum'), nullable=False)
+    units: Mapped[int] = mapped_column(Integer, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'request_id': self.request_id,
+            'inventory_id': self.inventory_id,
+            'blood_group': self.blood_group,
+            'units': self.units,
             'created_at': self.created_at.isoformat()
-        }
\ No newline at end of file
+        }
+
+class DonorEligibility(db.Model):
+    __tablename__ = 'donor_eligibility'
+    __table_args__ = (
+        # Candidate lookups: compatible group near the patient, or anywhere, most recently eligible first
+        Index('ix_donor_eligibility_group_location_last', 'blood_group', 'location_key', 'last_donation_date', 'donor_id'),
+        Index('ix_donor_eligibility_group_last', 'blood_group', 'last_donation_date', 'donor_id'),
+    )
+    
+    donor_id: Mapped[int] = mapped_column(Integer, ForeignKey('donors.id', ondelete='CASCADE'), primary_key=True)
+    blood_group: Mapped[str] = mapped_column(String(3), nullable=False)
+    location_key: Mapped[str] = mapped_column(String(200), nullable=False)
+    # Donors who never donated carry a sentinel date so every row is range-searchable
+    last_donation_date: Mapped[datetime] = mapped_column(Date, nullable=False)
+
+
+class ChangeEvent(db.Model):
+    __tablename__ = 'change_events'
+    # Never reuse ids on SQLite, even after old events are pruned
+    __table_args__ = {'sqlite_autoincrement': True}
+    
+    # Event ids are the stream's resume cursor (SSE Last-Event-ID)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    table_name: Mapped[str] = mapped_column(String(32), nullable=False)
+    op: Mapped[str] = mapped_column(String(8), nullable=False)
+    row_id: Mapped[int] = mapped_column(Integer, nullable=True)
+    data: Mapped[str] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+class SchedulerLease(db.Model):
+    __tablename__ = 'scheduler_leases'
+    
+    # One row per periodic job; whoever holds an unexpired lease runs it
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    holder: Mapped[str] = mapped_column(String(200), nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_keys'
+
+    # sha256 of the route and the client's Idempotency-Key, so keys are scoped per endpoint and fixed-size
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    # sha256 of the request body; reusing a key with a different body is an error
+    fingerprint: Mapped[str] = mapped_column(String(64), nullable=False)
+    # NULL until the first response is stored
+    status: Mapped[int] = mapped_column(Integer, nullable=True)
+    response: Mapped[str] = mapped_column(Text, nullable=True)
+    # JSON list of the first response's headers, replayed with its body
+    headers: Mapped[str] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+class SearchTerm(db.Model):
+    __tablename__ = 'search_terms'
+    
+    term: Mapped[str] = mapped_column(String(64), primary_key=True)
+    # Postings per term; terms whose rows are all gone keep a zero count until the index is rebuilt
+    doc_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+class SearchGram(db.Model):
+    __tablename__ = 'search_grams'
+    
+    # Padded trigrams of each word term ('  jon ' -> '  j', ' jo', 'jon', 'on '), for typo-tolerant lookup
+    gram: Mapped[str] = mapped_column(String(3), primary_key=True)
+    term: Mapped[str] = mapped_column(String(64), primary_key=True)
+
+class SearchPosting(db.Model):
+    __tablename__ = 'search_postings'
+    __table_args__ = (
+        # Intersecting query words and re-indexing a row probe by row
+        Index('ix_search_postings_row', 'entity', 'row_id', 'term'),
+    )
+    
+    term: Mapped[str] = mapped_column(String(64), primary_key=True)
+    # Source table name ('donors' or 'patients')
+    entity: Mapped[str] = mapped_column(String(16), primary_key=True)
+    row_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+class InventoryLedger(db.Model):
+    __tablename__ = 'inventory_ledger'
+    __table_args__ = (
+        # One lot's history in order
+        Index('ix_inventory_ledger_lot', 'lot_id', 'id'),
+    )
+    
+    # Append-only: one row per stock movement, never updated or deleted
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    recorded_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+    # No foreign key: a deleted lot keeps its history
+    lot_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    blood_group: Mapped[str] = mapped_column(String(3), nullable=False)
+    # receipt, issue, discard, adjustment or opening
+    kind: Mapped[str] = mapped_column(String(16), nullable=False)
+    # Signed change in the lot's usable stock (units of Available lots, as on the dashboard)
+    units: Mapped[int] = mapped_column(Integer, nullable=False)
+    # The request an issue was allocated to
+    request_id: Mapped[int] = mapped_column(Integer, nullable=True)
+
+class InventorySnapshot(db.Model):
+    __tablename__ = 'inventory_snapshots'
+    
+    # Stock per blood group from every ledger row recorded at or before as_of
+    as_of: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    blood_group: Mapped[str] = mapped_column(String(3), primary_key=True)
+    units: Mapped[int] = mapped_column(Integer, nullable=False)
+
+class ArchivePartition(db.Model):
+    __tablename__ = 'archive_partitions'
+    __table_args__ = (
+        # Partitions of a table by month; a month gains another part when rows left hot close later
+        UniqueConstraint('table_name', 'month', 'part', name='uq_archive_partitions_table_month_part'),
+    )
+    
+    # One compressed file of rows moved out of a hot table
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    table_name: Mapped[str] = mapped_column(String(32), nullable=False)
+    # First day of the month the rows' dates fall in
+    month: Mapped[datetime] = mapped_column(Date, nullable=False)
+    part: Mapped[int] = mapped_column(Integer, nullable=False)
+    # Relative to ARCHIVE_DIR
+    path: Mapped[str] = mapped_column(String(255), nullable=False)
+    rows: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    min_id: Mapped[int] = mapped_column(Integer, nullable=True)
+    max_id: Mapped[int] = mapped_column(Integer, nullable=True)
+    bytes: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    sha256: Mapped[str] = mapped_column(String(64), nullable=False, default='')
+    # Dashboard counter contributions of the archived rows, as JSON [[scope, key, value], ...]
+    counters: Mapped[str] = mapped_column(Text, nullable=False, default='[]')
+    archived_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class Tombstone(db.Model):
+    __tablename__ = 'tombstones'
+    __table_args__ = (
+        # Delta sync: deletes since a cursor, in (deleted_at, id) order
+        Index('ix_tombstones_deleted_at', 'deleted_at', 'id'),
+    )
+    
+    # One row per deleted donor, patient, lot, donation or request; pruned after SYNC_TOMBSTONE_DAYS
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    table_name: Mapped[str] = mapped_column(String(32), nullable=False)
+    row_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    deleted_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+
+# API path segment -> model, shared by the bulk import and export endpoints
+API_MODELS = {
+    'donors': Donor,
+    'patients': Patient,
+    'inventory': BloodInventory,
+    'requests': Request,
+    'donation-records': DonationRecord,
+}
+
+
+def api_columns(model):
+    """Column names of the row shape served by the API (to_dict, list pages, exports).
+
+    updated_at only orders delta sync, so it stays out like it does of to_dict.
+    """
+    return [name for name in model.__table__.columns.keys() if name != 'updated_at']
+
+# Column used for date_from/date_to range filters on each table
+DATE_FIELDS = {
+    'donors': 'last_donation_date',
+    'patients': 'created_at',
+    'blood_inventory': 'expiry_date',
+    'requests': 'date',
+    'donation_records': 'date_of_donation',
+}
+
+
+# History that keeps a donor or patient from being deleted: (model, column, what to call the rows)
+RESTRICTED_DELETES = {
+    Donor: (DonationRecord, 'donor_id', 'donation record(s)'),
+    Patient: (Request, 'patient_id', 'blood request(s)'),
+}
+
+
+def delete_conflict(obj):
+    """Why ``obj`` cannot be deleted, or None; checked before the flush so SQLite refuses it too."""
+    restricted = RESTRICTED_DELETES.get(type(obj))
+    if restricted is None:
+        return None
+    model, column, label = restricted
+    count = db.session.query(db.func.count(model.id)).filter(getattr(model, column) == obj.id).scalar()
+    if count:
+        return f'{type(obj).__name__} {obj.id} still has {count} {label}; delete or archive them first'
+    return None
@@ -0,0 +1,140 @@
+import heapq
+from datetime import datetime, date, timedelta
+from itertools import islice
+from operator import itemgetter
+from flask import request
+from sqlalchemy import DateTime, Enum, String, cast, or_, select
+from backend.database import db
+from backend.models import api_columns
+from backend.serialization import json_response, LIST_FORMATS, shape_rows
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+# Query args that map straight onto an equality filter when the model has the column
+EQUALITY_FILTERS = ('blood_group', 'status', 'priority', 'gender', 'donor_id', 'patient_id', 'lot_id', 'kind')
+
+
+class ListQueryError(ValueError):
+    pass
+
+
+def _parse_date(name, value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ListQueryError(f"'{name}' must be a date in YYYY-MM-DD format")
+
+
+def _parse_int(name, value, minimum=0):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ListQueryError(f"'{name}' must be an integer")
+    if number < minimum:
+        raise ListQueryError(f"'{name}' must be >= {minimum}")
+    return number
+
+
+def serialize_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def parse_fields(model, value):
+    """Resolve a comma-separated ``fields=`` argument to model columns ('id' is always included)."""
+    if not value:
+        return None
+    columns = api_columns(model)
+    names = ['id']
+    for name in value.split(','):
+        name = name.strip()
+        if not name or name in names:
+            continue
+        if name not in columns:
+            raise ListQueryError(f"Unknown field '{name}'")
+        names.append(name)
+    return names
+
+
+def _searchable(column):
+    # PostgreSQL has no ILIKE for enum types; compare their text instead
+    return cast(column, String) if isinstance(column.type, Enum) else column
+
+
+def apply_filters(query, model, args, date_field=None, search_fields=()):
+    columns = model.__table__.columns
+
+    for name in EQUALITY_FILTERS:
+        value = args.get(name)
+        if value and name in columns:
+            # PostgreSQL rejects a value outside a native enum type with an error, not an empty result
+            enums = getattr(columns[name].type, 'enums', None)
+            if enums and value not in enums:
+                raise ListQueryError(f"'{name}' must be one of {', '.join(enums)}")
+            query = query.filter(getattr(model, name) == value)
+
+    if args.get('location') and 'location' in columns:
+        query = query.filter(model.location.ilike(f"%{args['location']}%"))
+
+    search = args.get('q', '').strip()
+    if search and search_fields:
+        pattern = f'%{search}%'
+        query = query.filter(or_(*[_searchable(getattr(model, field)).ilike(pattern) for field in search_fields]))
+
+    if date_field:
+        column = getattr(model, date_field)
+        if args.get('date_from'):
+            query = query.filter(column >= _parse_date('date_from', args['date_from']))
+        if args.get('date_to'):
+            end = _parse_date('date_to', args['date_to'])
+            if isinstance(column.type, DateTime):
+                # A timestamp column includes the whole of the last day
+                query = query.filter(column < end + timedelta(days=1))
+            else:
+                query = query.filter(column <= end)
+
+    return query
+
+
+def list_response(model, key, date_field=None, search_fields=(), extra_rows=None):
+    """Keyset-paginated, filtered and optionally projected list of ``model`` rows.
+
+    Rows are ordered by id; pass the returned ``next_after_id`` back as ``after_id``
+    to fetch the following page. ``format=columns`` returns one array per field
+    instead of one object per row. ``extra_rows(model, names, args, date_field,
+    search_fields, after_id, limit)`` supplies id-ordered rows kept outside the
+    table (archived partitions), which are merged into the page.
+    """
+    args = request.args
+    try:
+        limit = min(_parse_int('limit', args.get('limit', DEFAULT_LIMIT), minimum=1), MAX_LIMIT)
+        after_id = _parse_int('after_id', args['after_id']) if args.get('after_id') else None
+        names = parse_fields(model, args.get('fields')) or api_columns(model)
+        fmt = args.get('format', 'records')
+        if fmt not in LIST_FORMATS:
+            raise ListQueryError(f"'format' must be one of {', '.join(LIST_FORMATS)}")
+
+        # Plain column tuples from a Core select: no ORM objects, identity map or to_dict() per row
+        query = select(*[model.__table__.c[name] for name in names])
+        query = apply_filters(query, model, args, date_field=date_field, search_fields=search_fields)
+    except ListQueryError as e:
+        return {'error': str(e)}, 400
+
+    if after_id is not None:
+        query = query.filter(model.id > after_id)
+
+    # Fetch one extra row to know whether another page exists without a COUNT
+    rows = db.session.connection().execute(query.order_by(model.id).limit(limit + 1)).all()
+    if extra_rows is not None:
+        extra = extra_rows(model, names, args, date_field, search_fields, after_id, limit + 1)
+        if extra:
+            rows = list(islice(heapq.merge(rows, extra, key=itemgetter(0)), limit + 1))
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    return json_response({
+        key: shape_rows(names, rows, fmt),
+        'next_after_id': rows[-1][0] if has_more else None
+    })
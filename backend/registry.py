@@ -0,0 +1,113 @@
+import importlib
+import threading
+
+from flask.cli import AppGroup
+
+# Imported when the app is created: their session listeners keep the counters, cache versions,
+# eligibility and search indexes, inventory ledger, change feed and sync tombstones in step with every write
+LISTENER_MODULES = ('backend.models', 'backend.stats', 'backend.cache', 'backend.changefeed', 'backend.eligibility',
+                    'backend.search', 'backend.ledger', 'backend.sync')
+
+# (URL rule, 'module:Resource', methods). Resource modules are imported on the
+# first request to one of their routes, not when the app is created.
+RESOURCES = (
+    ('/api/donors', 'backend.resources:DonorListResource', ('GET', 'POST')),
+    ('/api/donors/<int:donor_id>', 'backend.resources:DonorResource', ('GET', 'PUT', 'DELETE')),
+    ('/api/donors/eligible', 'backend.eligibility:EligibleDonorsResource', ('GET',)),
+    ('/api/patients', 'backend.resources:PatientListResource', ('GET', 'POST')),
+    ('/api/patients/<int:patient_id>', 'backend.resources:PatientResource', ('GET', 'PUT', 'DELETE')),
+    ('/api/inventory', 'backend.resources:InventoryListResource', ('GET', 'POST')),
+    ('/api/inventory/<int:inventory_id>', 'backend.resources:InventoryResource', ('GET', 'PUT', 'DELETE')),
+    ('/api/inventory/ledger', 'backend.ledger:InventoryLedgerResource', ('GET',)),
+    ('/api/inventory/stock', 'backend.ledger:StockAsOfResource', ('GET',)),
+    ('/api/requests', 'backend.resources:RequestListResource', ('GET', 'POST')),
+    ('/api/requests/<int:request_id>', 'backend.resources:RequestResource', ('GET', 'PUT', 'DELETE')),
+    ('/api/requests/<int:request_id>/allocations', 'backend.allocation:RequestAllocationsResource', ('GET',)),
+    ('/api/allocations/run', 'backend.allocation:AllocationRunResource', ('POST',)),
+    ('/api/donation-records', 'backend.resources:DonationRecordListResource', ('GET', 'POST')),
+    ('/api/donation-records/<int:record_id>', 'backend.resources:DonationRecordResource', ('GET', 'PUT', 'DELETE')),
+    ('/api/dashboard-stats', 'backend.resources:DashboardStatsResource', ('GET',)),
+    ('/api/search', 'backend.search:SearchResource', ('GET',)),
+    ('/api/analytics', 'backend.analytics:AnalyticsResource', ('GET',)),
+    ('/api/cache-stats', 'backend.resources:CacheStatsResource', ('GET',)),
+    ('/api/bulk/<string:table>', 'backend.bulk:BulkImportResource', ('POST',)),
+    ('/api/export/<string:table>', 'backend.export:ExportResource', ('GET',)),
+    ('/api/batch', 'backend.batch:BatchResource', ('POST',)),
+    ('/api/stream', 'backend.changefeed:ChangeStreamResource', ('GET',)),
+    ('/api/sync', 'backend.sync:SyncResource', ('GET',)),
+)
+
+# CLI: flask --app main stats rebuild|verify, bulk import <table> <file>, export <table>, allocate,
+#      db upgrade|status|check-plans, eligibility rebuild, search rebuild, ledger snapshot|verify,
+#      replicas status|sync, archive run|status|verify|restore, expiry sweep|worker, changes prune,
+#      sync prune, generate-data
+COMMANDS = {
+    'stats': 'backend.stats:stats_cli',
+    'bulk': 'backend.bulk:bulk_cli',
+    'export': 'backend.export:export_command',
+    'allocate': 'backend.allocation:allocate_command',
+    'db': 'backend.migrations:db_cli',
+    'eligibility': 'backend.eligibility:eligibility_cli',
+    'search': 'backend.search:search_cli',
+    'ledger': 'backend.ledger:ledger_cli',
+    'replicas': 'backend.replicas:replicas_cli',
+    'archive': 'backend.archive:archive_cli',
+    'expiry': 'backend.expiry:expiry_cli',
+    'changes': 'backend.changefeed:changes_cli',
+    'sync': 'backend.sync:sync_cli',
+    'generate-data': 'backend.synthetic:generate_command',
+}
+
+
+def load_modules(names):
+    for name in names:
+        importlib.import_module(name)
+
+
+def load(target):
+    module_name, name = target.split(':')
+    return getattr(importlib.import_module(module_name), name)
+
+
+def _lazy_view(api, endpoint, target):
+    """A view that imports ``target`` and builds its Flask-RESTful view on first use."""
+    resolved = []
+    lock = threading.Lock()
+
+    def view(*args, **kwargs):
+        if not resolved:
+            with lock:
+                if not resolved:
+                    resource = load(target)
+                    # What Api.add_resource sets up, deferred to the first request
+                    resource.mediatypes = api.mediatypes_method()
+                    resource.endpoint = endpoint
+                    resolved.append(api.output(resource.as_view(endpoint)))
+        return resolved[0](*args, **kwargs)
+
+    view.__name__ = endpoint
+    return view
+
+
+def register_resources(api, app, resources=RESOURCES):
+    """Add every route in ``resources`` to ``app`` without importing the resource modules."""
+    for rule, target, methods in resources:
+        endpoint = target.split(':')[1].lower()
+        api.endpoints.add(endpoint)
+        app.add_url_rule(rule, endpoint=endpoint, view_func=_lazy_view(api, endpoint, target), methods=methods)
+
+
+class LazyAppGroup(AppGroup):
+    """The app's CLI group; command modules are imported only when a command is looked up."""
+
+    def __init__(self, commands=COMMANDS, **kwargs):
+        super().__init__(**kwargs)
+        self.lazy_commands = dict(commands)
+
+    def list_commands(self, ctx):
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_commands))
+
+    def get_command(self, ctx, name):
+        if name not in self.commands and name in self.lazy_commands:
+            self.add_command(load(self.lazy_commands[name]), name)
+        return super().get_command(ctx, name)
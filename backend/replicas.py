@@ -0,0 +1,317 @@
+import itertools
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+import click
+from flask import current_app, g, request
+from flask.cli import with_appcontext
+from sqlalchemy import event, exc, select, text
+
+from backend.database import db
+from backend.models import StatCounter
+
+logger = logging.getLogger('bbms.replicas')
+
+READ_METHODS = ('GET', 'HEAD')
+PIN_COOKIE = 'bbms_primary_until'
+BIND_PREFIX = 'replica_'
+
+# Seconds the standby's last replayed transaction is behind; 0 once it has replayed all it received
+LAG_SQL = text(
+    'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+    'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END'
+)
+CAUGHT_UP_SQL = text('SELECT COALESCE(pg_last_wal_replay_lsn() >= CAST(:lsn AS pg_lsn), false)')
+PRIMARY_LSN_SQL = text('SELECT CAST(pg_current_wal_lsn() AS text)')
+
+
+def _replica_urls(value):
+    if isinstance(value, str):
+        value = value.split(',')
+    return [url.strip() for url in value or () if url.strip()]
+
+
+class Replica:
+    def __init__(self, name, engine):
+        self.name = name
+        self.engine = engine
+        self.lock = threading.Lock()
+        self.checked_at = float('-inf')
+        self.ejected_until = 0.0
+        self.lag = None
+        self.error = None
+        self.ejections = 0
+
+    @property
+    def url(self):
+        return self.engine.url.render_as_string(hide_password=True)
+
+    def up(self, now=None):
+        return (now or time.monotonic()) >= self.ejected_until
+
+    def eject(self, seconds, reason):
+        now = time.monotonic()
+        if self.up(now):
+            self.ejections += 1
+            logger.warning('Ejecting read replica %s (%s) for %ss: %s', self.name, self.url, seconds, reason)
+        self.ejected_until = now + seconds
+        self.error = reason
+
+
+class ReplicaSet:
+    """The configured read replicas of one process and the routing decision for each GET request.
+
+    A replica takes reads while it answers its health check and, on
+    PostgreSQL, replays within REPLICA_MAX_LAG_SECONDS of the primary. Checks
+    run inline, at most every REPLICA_CHECK_SECONDS per replica, when a request
+    is routed; a replica that fails a check or raises a connection error is
+    ejected for REPLICA_RETRY_SECONDS. A client that wrote within
+    REPLICA_PIN_SECONDS reads from the primary, or on PostgreSQL from a replica
+    that has replayed the client's last write.
+    """
+
+    def __init__(self, engines, pin_seconds, check_interval, retry_seconds, max_lag):
+        self.replicas = [Replica(name, engine) for name, engine in engines]
+        self.pin_seconds = pin_seconds
+        self.check_interval = check_interval
+        self.retry_seconds = retry_seconds
+        self.max_lag = max_lag
+        self.routed = Counter()
+        self._rotation = itertools.count()
+        self._lock = threading.Lock()
+        for replica in self.replicas:
+            event.listen(replica.engine, 'handle_error', self._error_handler(replica))
+
+    def _error_handler(self, replica):
+        def handle_error(context):
+            if context.is_disconnect or isinstance(context.sqlalchemy_exception, exc.OperationalError):
+                replica.eject(self.retry_seconds, str(context.original_exception).strip().splitlines()[0])
+        return handle_error
+
+    def check(self, replica):
+        """Probe ``replica``: it must answer with the schema in place and, on PostgreSQL, not lag too far."""
+        try:
+            with replica.engine.connect() as connection:
+                connection.execute(select(StatCounter.key).limit(1)).all()
+                lag = None
+                if connection.dialect.name == 'postgresql':
+                    lag = float(connection.execute(LAG_SQL).scalar() or 0)
+        except exc.DBAPIError as error:
+            replica.checked_at = time.monotonic()
+            replica.eject(self.retry_seconds, str(error.orig).strip().splitlines()[0])
+            return False
+        replica.checked_at = time.monotonic()
+        replica.lag = lag
+        if lag is not None and lag > self.max_lag:
+            replica.eject(self.check_interval, f'{lag:.1f}s behind the primary')
+            return False
+        replica.ejected_until = 0.0
+        replica.error = None
+        return True
+
+    def available(self, replica):
+        now = time.monotonic()
+        if not replica.up(now):
+            return False
+        # One thread re-checks a replica that is due; the others route on its last result meanwhile
+        if now - replica.checked_at >= self.check_interval and replica.lock.acquire(blocking=False):
+            try:
+                return self.check(replica)
+            finally:
+                replica.lock.release()
+        return True
+
+    def caught_up(self, replica, lsn):
+        try:
+            with replica.engine.connect() as connection:
+                return bool(connection.execute(CAUGHT_UP_SQL, {'lsn': lsn}).scalar())
+        except exc.DBAPIError:
+            return False
+
+    def _count(self, target):
+        with self._lock:
+            self.routed[target] += 1
+
+    def read_pin(self):
+        """(until, lsn) from the request's pin cookie while it is live, else None."""
+        value = request.cookies.get(PIN_COOKIE)
+        if not value:
+            return None
+        until, _, lsn = value.partition(':')
+        try:
+            until = float(until)
+        except ValueError:
+            return None
+        now = time.time()
+        # A forged cookie cannot pin a client for longer than one window
+        if not now < until <= now + self.pin_seconds:
+            return None
+        return until, lsn or None
+
+    def route(self):
+        """The engine this GET request reads from, or None for the primary."""
+        pin = self.read_pin()
+        if pin is not None and pin[1] is None:
+            self._count('primary_pinned')
+            return None
+        start = next(self._rotation) % len(self.replicas)
+        for replica in self.replicas[start:] + self.replicas[:start]:
+            if not self.available(replica):
+                continue
+            if pin is not None and not self.caught_up(replica, pin[1]):
+                continue
+            self._count(replica.name)
+            return replica.engine
+        self._count('primary_pinned' if pin is not None else 'primary_fallback')
+        return None
+
+    def read_engine(self):
+        """Called by RoutingSession.get_bind for every read; routes once per request."""
+        if request.method not in READ_METHODS:
+            return None
+        if 'read_engine' not in g:
+            g.read_engine = self.route()
+        return g.read_engine
+
+    def pin(self, response):
+        """Pin the client of a successful write to the primary for the next REPLICA_PIN_SECONDS."""
+        value = f'{time.time() + self.pin_seconds:.3f}'
+        if db.engine.dialect.name == 'postgresql':
+            try:
+                with db.engine.connect() as connection:
+                    value += ':' + connection.execute(PRIMARY_LSN_SQL).scalar()
+            except exc.DBAPIError:
+                logger.warning('Could not read the primary WAL position; pinning for the whole window')
+        response.set_cookie(PIN_COOKIE, value, max_age=int(self.pin_seconds) + 1, httponly=True, samesite='Lax')
+        return response
+
+    def stats(self):
+        """Gauges for /metrics: replicas up, per-replica lag and ejections, and where reads went."""
+        now = time.monotonic()
+        with self._lock:
+            routed = dict(self.routed)
+        stats = {
+            'configured': len(self.replicas),
+            'up': sum(replica.up(now) for replica in self.replicas),
+            'reads_primary_pinned': routed.get('primary_pinned', 0),
+            'reads_primary_fallback': routed.get('primary_fallback', 0),
+            'reads_primary_retry': routed.get('primary_retry', 0),
+        }
+        for replica in self.replicas:
+            stats[f'{replica.name}_up'] = int(replica.up(now))
+            stats[f'{replica.name}_reads'] = routed.get(replica.name, 0)
+            stats[f'{replica.name}_ejections'] = replica.ejections
+            if replica.lag is not None:
+                stats[f'{replica.name}_lag_seconds'] = round(replica.lag, 3)
+        return stats
+
+
+def configure_replicas(app):
+    """Add a SQLAlchemy bind per read replica; call before ``db.init_app``.
+
+    Config: DATABASE_REPLICA_URLS (comma-separated; none by default, and then
+    every query goes to DATABASE_URL), REPLICA_PIN_SECONDS (default 10),
+    REPLICA_CHECK_SECONDS (default 2), REPLICA_RETRY_SECONDS (default 30) and
+    REPLICA_MAX_LAG_SECONDS (default 5). Replica engines share the primary's
+    pool options.
+    """
+    app.config.setdefault('DATABASE_REPLICA_URLS', os.environ.get('DATABASE_REPLICA_URLS', ''))
+    app.config.setdefault('REPLICA_PIN_SECONDS', float(os.environ.get('REPLICA_PIN_SECONDS', 10)))
+    app.config.setdefault('REPLICA_CHECK_SECONDS', float(os.environ.get('REPLICA_CHECK_SECONDS', 2)))
+    app.config.setdefault('REPLICA_RETRY_SECONDS', float(os.environ.get('REPLICA_RETRY_SECONDS', 30)))
+    app.config.setdefault('REPLICA_MAX_LAG_SECONDS', float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 5)))
+    binds = {f'{BIND_PREFIX}{index}': url
+             for index, url in enumerate(_replica_urls(app.config['DATABASE_REPLICA_URLS']))}
+    app.config['SQLALCHEMY_BINDS'] = {**binds, **app.config.get('SQLALCHEMY_BINDS', {})}
+
+
+def init_replicas(app):
+    """Route GET reads to the configured replicas and pin writing clients; returns the ReplicaSet or None."""
+    with app.app_context():
+        engines = [(key, engine) for key, engine in db.engines.items()
+                   if key is not None and key.startswith(BIND_PREFIX)]
+    if not engines:
+        return None
+    replicas = ReplicaSet(sorted(engines), app.config['REPLICA_PIN_SECONDS'], app.config['REPLICA_CHECK_SECONDS'],
+                          app.config['REPLICA_RETRY_SECONDS'], app.config['REPLICA_MAX_LAG_SECONDS'])
+    app.extensions['replicas'] = replicas
+
+    @app.before_request
+    def _reset_read_route():
+        # g outlives the request when an app context is shared (tests, CLI)
+        g.pop('read_engine', None)
+
+    dispatch_request = app.dispatch_request
+
+    def _dispatch_request():
+        try:
+            return dispatch_request()
+        except exc.DBAPIError:
+            if request.method not in READ_METHODS or g.get('read_engine') is None:
+                raise
+            # The replica failed mid-request (and was ejected if it is down): run the read again on the primary
+            logger.warning('Read from a replica failed; retrying %s %s on the primary', request.method, request.path)
+            db.session.rollback()
+            g.read_engine = None
+            replicas._count('primary_retry')
+            return dispatch_request()
+
+    app.dispatch_request = _dispatch_request
+
+    @app.after_request
+    def _pin_writer(response):
+        if request.method not in READ_METHODS + ('OPTIONS',) and response.status_code < 400:
+            replicas.pin(response)
+        return response
+
+    return replicas
+
+
+@click.group('replicas')
+def replicas_cli():
+    """Read replica status and local replica files."""
+
+
+def _configured_replicas():
+    replicas = current_app.extensions.get('replicas')
+    if replicas is None:
+        raise click.ClickException('No read replicas configured; set DATABASE_REPLICA_URLS.')
+    return replicas
+
+
+@replicas_cli.command('status')
+@with_appcontext
+def status_command():
+    """Check every replica now and print its state and lag."""
+    replicas = _configured_replicas()
+    for replica in replicas.replicas:
+        healthy = replicas.check(replica)
+        lag = f', {replica.lag:.1f}s behind' if replica.lag is not None else ''
+        state = 'up' if healthy else f'ejected: {replica.error}'
+        click.echo(f'{replica.name} {replica.url}: {state}{lag}')
+
+
+@replicas_cli.command('sync')
+@with_appcontext
+def sync_command():
+    """Copy a SQLite primary into every SQLite replica file (a stand-in for replication in local testing)."""
+    replicas = _configured_replicas()
+    if db.engine.dialect.name != 'sqlite':
+        raise click.ClickException('sync copies SQLite files; PostgreSQL replicas follow the primary by streaming.')
+    source = sqlite3.connect(db.engine.url.database)
+    try:
+        for replica in replicas.replicas:
+            if replica.engine.dialect.name != 'sqlite':
+                continue
+            target = sqlite3.connect(replica.engine.url.database)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+            click.echo(f'Copied {db.engine.url.database} to {replica.engine.url.database}')
+    finally:
+        source.close()
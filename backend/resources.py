@@ -1,15 +1,29 @@
 from flask import request
 from flask_restful import Resource
-from sqlalchemy import func
-from datetime import datetime, date, timedelta
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+from datetime import datetime, date
 from backend.database import db
-from backend.models import Donor, Patient, BloodInventory, DonationRecord, Request
+from backend.models import Donor, Patient, BloodInventory, DonationRecord, Request, delete_conflict
+from backend.allocation import allocate_request, AllocationError
+from backend.archive import archived_rows
+from backend.cache import cached, response_cache, row_etag
+from backend.concurrency import adjust_units, AdjustmentError, expected_versions, precondition_failure, stale_write_response
+from backend.expiry import expiring_soon
+from backend.idempotency import idempotent
+from backend.pagination import list_response
+from backend.stats import (
+    read_dashboard_counters, month_starts, TRACKED_TABLES,
+    SUMMARY, BLOOD_GROUP_UNITS, REQUEST_STATUS, REQUEST_PRIORITY, DONATION_MONTH, DONATION_DAY
+)
 
 class DonorListResource(Resource):
+    @cached('donors')
     def get(self):
-        donors = Donor.query.all()
-        return {'donors': [donor.to_dict() for donor in donors]}, 200
+        return list_response(Donor, 'donors', date_field='last_donation_date',
+                             search_fields=('name', 'contact', 'location'))
     
+    @idempotent
     def post(self):
         data = request.get_json()
         try:
@@ -34,12 +48,16 @@ class DonorListResource(Resource):
             return {'error': str(e)}, 400
 
 class DonorResource(Resource):
+    @cached('donors', row='donor')
     def get(self, donor_id):
         donor = Donor.query.get_or_404(donor_id)
         return {'donor': donor.to_dict()}, 200
     
     def put(self, donor_id):
         donor = Donor.query.get_or_404(donor_id)
+        failed = precondition_failure(donor)
+        if failed:
+            return failed
         data = request.get_json()
         try:
             donor.name = data.get('name', donor.name)
@@ -53,26 +71,44 @@ class DonorResource(Resource):
                 donor.last_donation_date = datetime.strptime(data['last_donation_date'], '%Y-%m-%d').date()
             
             db.session.commit()
-            return {'message': 'Donor updated successfully', 'donor': donor.to_dict()}, 200
+            return {'message': 'Donor updated successfully', 'donor': donor.to_dict()}, 200, {'ETag': row_etag(donor.version)}
+        except StaleDataError:
+            db.session.rollback()
+            return stale_write_response()
         except Exception as e:
             db.session.rollback()
             return {'error': str(e)}, 400
     
     def delete(self, donor_id):
         donor = Donor.query.get_or_404(donor_id)
+        failed = precondition_failure(donor)
+        if failed:
+            return failed
+        conflict = delete_conflict(donor)
+        if conflict:
+            return {'error': conflict}, 409
         try:
             db.session.delete(donor)
             db.session.commit()
             return {'message': 'Donor deleted successfully'}, 200
+        except StaleDataError:
+            db.session.rollback()
+            return stale_write_response()
+        except IntegrityError:
+            # History was added after the check; the foreign key refused the delete
+            db.session.rollback()
+            return {'error': delete_conflict(donor) or 'Donor still has history; delete or archive it first'}, 409
         except Exception as e:
             db.session.rollback()
             return {'error': str(e)}, 400
 
 class InventoryListResource(Resource):
+    @cached('blood_inventory')
     def get(self):
-        inventory = BloodInventory.query.all()
-        return {'inventory': [item.to_dict() for item in inventory]}, 200
+        return list_response(BloodInventory, 'inventory', date_field='expiry_date',
+                             search_fields=('blood_group',))
     
+    @idempotent
     def post(self):
         data = request.get_json()
         try:
@@ -90,13 +126,19 @@ class InventoryListResource(Resource):
             return {'error': str(e)}, 400
 
 class InventoryResource(Resource):
+    @cached('blood_inventory', row='inventory')
     def get(self, inventory_id):
         inventory_item = BloodInventory.query.get_or_404(inventory_id)
         return {'inventory': inventory_item.to_dict()}, 200
     
     def put(self, inventory_id):
-        inventory_item = BloodInventory.query.get_or_404(inventory_id)
         data = request.get_json()
+        if data and 'units_delta' in data:
+            return self.adjust(inventory_id, data)
+        inventory_item = BloodInventory.query.get_or_404(inventory_id)
+        failed = precondition_failure(inventory_item)
+        if failed:
+            return failed
         try:
             inventory_item.blood_group = data.get('blood_group', inventory_item.blood_group)
             inventory_item.units_available = data.get('units_available', inventory_item.units_available)
@@ -104,27 +146,54 @@ class InventoryResource(Resource):
             if data.get('expiry_date'):
                 inventory_item.expiry_date = datetime.strptime(data['expiry_date'], '%Y-%m-%d').date()
             
+            if data.get('status'):
+                inventory_item.set_status(data['status'])
+            
             db.session.commit()
-            return {'message': 'Blood inventory updated successfully', 'inventory': inventory_item.to_dict()}, 200
+            return {'message': 'Blood inventory updated successfully', 'inventory': inventory_item.to_dict()}, 200, {'ETag': row_etag(inventory_item.version)}
+        except StaleDataError:
+            db.session.rollback()
+            return stale_write_response()
         except Exception as e:
             db.session.rollback()
             return {'error': str(e)}, 400
     
+    def adjust(self, inventory_id, data):
+        # {"units_delta": -2}: a relative change applied in SQL, so concurrent adjustments never overwrite each other
+        delta = data['units_delta']
+        if len(data) != 1 or not isinstance(delta, int) or isinstance(delta, bool):
+            return {'error': "'units_delta' must be an integer and cannot be combined with other fields"}, 400
+        try:
+            inventory = adjust_units(inventory_id, delta, expected_versions())
+            db.session.commit()
+            return {'message': 'Blood inventory updated successfully', 'inventory': inventory}, 200, {'ETag': row_etag(inventory['version'])}
+        except AdjustmentError as e:
+            db.session.rollback()
+            return {'error': str(e)}, e.status
+    
     def delete(self, inventory_id):
         inventory_item = BloodInventory.query.get_or_404(inventory_id)
+        failed = precondition_failure(inventory_item)
+        if failed:
+            return failed
         try:
             db.session.delete(inventory_item)
             db.session.commit()
             return {'message': 'Blood inventory deleted successfully'}, 200
+        except StaleDataError:
+            db.session.rollback()
+            return stale_write_response()
         except Exception as e:
             db.session.rollback()
             return {'error': str(e)}, 400
 
 class RequestListResource(Resource):
+    @cached('requests')
     def get(self):
-        requests = Request.query.all()
-        return {'requests': [req.to_dict() for req in requests]}, 200
+        return list_response(Request, 'requests', date_field='date',
+                             search_fields=('patient_name', 'blood_group'), extra_rows=archived_rows)
     
+    @idempotent
     def post(self):
         data = request.get_json()
         try:
@@ -141,21 +210,35 @@ class RequestListResource(Resource):
             blood_request.status = data.get('status', 'Pending')
             blood_request.priority = data.get('priority', 'Medium')
             db.session.add(blood_request)
+            
+            # Requests created as fulfilled draw their stock immediately
+            if blood_request.status == 'Fulfilled':
+                db.session.flush()
+                allocate_request(blood_request)
+            
             db.session.commit()
             return {'message': 'Blood request created successfully', 'request': blood_request.to_dict()}, 201
+        except AllocationError as e:
+            db.session.rollback()
+            return {'error': str(e)}, 409
         except Exception as e:
             db.session.rollback()
             return {'error': str(e)}, 400
 
 class RequestResource(Resource):
+    @cached('requests', row='request')
     def get(self, request_id):
         blood_request = Request.query.get_or_404(request_id)
         return {'request': blood_request.to_dict()}, 200
     
     def put(self, request_id):
         blood_request = Request.query.get_or_404(request_id)
+        failed = precondition_failure(blood_request)
+        if failed:
+            return failed
         data = request.get_json()
         try:
+            was_fulfilled = blood_request.status == 'Fulfilled'
             blood_request.patient_id = data.get('patient_id', blood_request.patient_id)
             blood_request.patient_name = data.get('patient_name', blood_request.patient_name)
             blood_request.blood_group = data.get('blood_group', blood_request.blood_group)
@@ -166,89 +249,78 @@ class RequestResource(Resource):
             if data.get('date'):
                 blood_request.date = datetime.strptime(data['date'], '%Y-%m-%d').date()
             
+            # Moving to Fulfilled decrements compatible inventory in the same transaction
+            if blood_request.status == 'Fulfilled' and not was_fulfilled:
+                allocate_request(blood_request)
+            
             db.session.commit()
-            return {'message': 'Blood request updated successfully', 'request': blood_request.to_dict()}, 200
+            return {'message': 'Blood request updated successfully', 'request': blood_request.to_dict()}, 200, {'ETag': row_etag(blood_request.version)}
+        except AllocationError as e:
+            db.session.rollback()
+            return {'error': str(e)}, 409
+        except StaleDataError:
+            db.session.rollback()
+            return stale_write_response()
         except Exception as e:
             db.session.rollback()
             return {'error': str(e)}, 400
     
     def delete(self, request_id):
         blood_request = Request.query.get_or_404(request_id)
+        failed = precondition_failure(blood_request)
+        if failed:
+            return failed
         try:
             db.session.delete(blood_request)
             db.session.commit()
             return {'message': 'Blood request deleted successfully'}, 200
+        except StaleDataError:
+            db.session.rollback()
+            return stale_write_response()
         except Exception as e:
             db.session.rollback()
             return {'error': str(e)}, 400
 
 class DashboardStatsResource(Resource):
+    @cached(*TRACKED_TABLES)
     def get(self):
         try:
-            # Get total counts
-            total_donors = Donor.query.count()
-            total_patients = Patient.query.count()
-            total_requests = Request.query.count()
-            pending_requests = Request.query.filter_by(status='Pending').count()
-            critical_requests = Request.query.filter_by(priority='Critical').count()
-            
-            # Get total blood units in inventory
-            total_units = db.session.query(func.sum(BloodInventory.units_available)).scalar() or 0
-            
-            # Get blood group distribution
-            blood_group_distribution = db.session.query(
-                BloodInventory.blood_group,
-                func.sum(BloodInventory.units_available).label('total_units')
-            ).group_by(BloodInventory.blood_group).all()
-            
-            blood_groups_data = {group: units for group, units in blood_group_distribution}
+            # Summary counters, distributions and donation buckets are maintained
+            # incrementally by backend.stats and read back in a single query
+            counters = read_dashboard_counters(months=6, recent_days=30)
+            summary = counters.get(SUMMARY, {})
             
             # Get low stock alerts (less than 10 units)
-            low_stock_items = BloodInventory.query.filter(BloodInventory.units_available < 10).all()
+            low_stock_items = BloodInventory.query.filter(
+                BloodInventory.units_available < 10, BloodInventory.status == 'Available'
+            ).all()
             
-            # Get expiry alerts (expiring in next 7 days)
-            expiry_date_threshold = date.today() + timedelta(days=7)
-            expiry_alerts = BloodInventory.query.filter(BloodInventory.expiry_date <= expiry_date_threshold).all()
+            # Get expiry alerts (expiring in next 7 days); the sweeper discards expired
+            # lots, so this is a short range of the (status, expiry_date) index
+            expiry_alerts = expiring_soon()
             
-            # Recent donations (last 30 days)
-            thirty_days_ago = date.today() - timedelta(days=30)
-            recent_donations = DonationRecord.query.filter(DonationRecord.date_of_donation >= thirty_days_ago).count()
-            
-            # Monthly donation trends (last 6 months)
-            monthly_donations = []
-            for i in range(6):
-                month_start = date.today().replace(day=1) - timedelta(days=30*i)
-                next_month = (month_start.replace(day=28) + timedelta(days=4)).replace(day=1)
-                count = DonationRecord.query.filter(
-                    DonationRecord.date_of_donation >= month_start,
-                    DonationRecord.date_of_donation < next_month
-                ).count()
-                monthly_donations.append({
-                    'month': month_start.strftime('%B %Y'),
-                    'donations': count
-                })
-            
-            # Request status distribution
-            status_distribution = db.session.query(
-                Request.status,
-                func.count(Request.id).label('count')
-            ).group_by(Request.status).all()
-            
-            status_data = {status: count for status, count in status_distribution}
+            # Monthly donation trends (last 6 calendar months)
+            donation_months = counters.get(DONATION_MONTH, {})
+            monthly_donations = [{
+                'month': month_start.strftime('%B %Y'),
+                'donations': donation_months.get(month_start.strftime('%Y-%m'), 0)
+            } for month_start in month_starts(6)]
             
             return {
                 'summary_cards': {
-                    'total_donors': total_donors,
-                    'total_patients': total_patients,
-                    'total_blood_units': total_units,
-                    'pending_requests': pending_requests,
-                    'critical_requests': critical_requests,
-                    'recent_donations': recent_donations
+                    'total_donors': summary.get('donors', 0),
+                    'total_patients': summary.get('patients', 0),
+                    'total_blood_units': summary.get('blood_units', 0),
+                    'pending_requests': counters.get(REQUEST_STATUS, {}).get('Pending', 0),
+                    'critical_requests': counters.get(REQUEST_PRIORITY, {}).get('Critical', 0),
+                    'recent_donations': sum(counters.get(DONATION_DAY, {}).values())
                 },
                 'charts': {
-                    'blood_group_distribution': blood_groups_data,
+                    'blood_group_distribution': counters.get(BLOOD_GROUP_UNITS, {}),
                     'monthly_donations': monthly_donations,
-                    'request_status_distribution': status_data
+                    'request_status_distribution': {
+                        status: count for status, count in counters.get(REQUEST_STATUS, {}).items() if count
+                    }
                 },
                 'alerts': {
                     'low_stock': [item.to_dict() for item in low_stock_items],
@@ -259,10 +331,12 @@ class DashboardStatsResource(Resource):
             return {'error': str(e)}, 500
 
 class PatientListResource(Resource):
+    @cached('patients')
     def get(self):
-        patients = Patient.query.all()
-        return {'patients': [patient.to_dict() for patient in patients]}, 200
+        return list_response(Patient, 'patients', date_field='created_at',
+                             search_fields=('name', 'contact', 'location'))
     
+    @idempotent
     def post(self):
         data = request.get_json()
         try:
@@ -282,12 +356,16 @@ class PatientListResource(Resource):
             return {'error': str(e)}, 400
 
 class PatientResource(Resource):
+    @cached('patients', row='patient')
     def get(self, patient_id):
         patient = Patient.query.get_or_404(patient_id)
         return {'patient': patient.to_dict()}, 200
     
     def put(self, patient_id):
         patient = Patient.query.get_or_404(patient_id)
+        failed = precondition_failure(patient)
+        if failed:
+            return failed
         data = request.get_json()
         try:
             patient.name = data.get('name', patient.name)
@@ -298,26 +376,44 @@ class PatientResource(Resource):
             patient.units_needed = data.get('units_needed', patient.units_needed)
             
             db.session.commit()
-            return {'message': 'Patient updated successfully', 'patient': patient.to_dict()}, 200
+            return {'message': 'Patient updated successfully', 'patient': patient.to_dict()}, 200, {'ETag': row_etag(patient.version)}
+        except StaleDataError:
+            db.session.rollback()
+            return stale_write_response()
         except Exception as e:
             db.session.rollback()
             return {'error': str(e)}, 400
     
     def delete(self, patient_id):
         patient = Patient.query.get_or_404(patient_id)
+        failed = precondition_failure(patient)
+        if failed:
+            return failed
+        conflict = delete_conflict(patient)
+        if conflict:
+            return {'error': conflict}, 409
         try:
             db.session.delete(patient)
             db.session.commit()
             return {'message': 'Patient deleted successfully'}, 200
+        except StaleDataError:
+            db.session.rollback()
+            return stale_write_response()
+        except IntegrityError:
+            # History was added after the check; the foreign key refused the delete
+            db.session.rollback()
+            return {'error': delete_conflict(patient) or 'Patient still has history; delete or archive it first'}, 409
         except Exception as e:
             db.session.rollback()
             return {'error': str(e)}, 400
 
 class DonationRecordListResource(Resource):
+    @cached('donation_records')
     def get(self):
-        records = DonationRecord.query.all()
-        return {'donation_records': [record.to_dict() for record in records]}, 200
+        return list_response(DonationRecord, 'donation_records', date_field='date_of_donation',
+                             search_fields=('donor_name', 'blood_group'), extra_rows=archived_rows)
     
+    @idempotent
     def post(self):
         data = request.get_json()
         try:
@@ -332,6 +428,11 @@ class DonationRecordListResource(Resource):
             record.date_of_donation = donation_date
             record.units_donated = data['units_donated']
             
+            # Keep the donor's deferral date current so the eligibility index follows
+            donor = db.session.get(Donor, record.donor_id)
+            if donor and (donor.last_donation_date is None or donor.last_donation_date < donation_date):
+                donor.last_donation_date = donation_date
+            
             db.session.add(record)
             db.session.commit()
             return {'message': 'Donation record created successfully', 'record': record.to_dict()}, 201
@@ -340,12 +441,16 @@ class DonationRecordListResource(Resource):
             return {'error': str(e)}, 400
 
 class DonationRecordResource(Resource):
+    @cached('donation_records', row='record')
     def get(self, record_id):
         record = DonationRecord.query.get_or_404(record_id)
         return {'record': record.to_dict()}, 200
     
     def put(self, record_id):
         record = DonationRecord.query.get_or_404(record_id)
+        failed = precondition_failure(record)
+        if failed:
+            return failed
         data = request.get_json()
         try:
             record.donor_id = data.get('donor_id', record.donor_id)
@@ -357,17 +462,30 @@ class DonationRecordResource(Resource):
                 record.date_of_donation = datetime.strptime(data['date_of_donation'], '%Y-%m-%d').date()
             
             db.session.commit()
-            return {'message': 'Donation record updated successfully', 'record': record.to_dict()}, 200
+            return {'message': 'Donation record updated successfully', 'record': record.to_dict()}, 200, {'ETag': row_etag(record.version)}
+        except StaleDataError:
+            db.session.rollback()
+            return stale_write_response()
         except Exception as e:
             db.session.rollback()
             return {'error': str(e)}, 400
     
     def delete(self, record_id):
         record = DonationRecord.query.get_or_404(record_id)
+        failed = precondition_failure(record)
+        if failed:
+            return failed
         try:
             db.session.delete(record)
             db.session.commit()
             return {'message': 'Donation record deleted successfully'}, 200
+        except StaleDataError:
+            db.session.rollback()
+            return stale_write_response()
         except Exception as e:
             db.session.rollback()
-            return {'error': str(e)}, 400
\ No newline at end of file
+            return {'error': str(e)}, 400
+
+class CacheStatsResource(Resource):
+    def get(self):
+        return {'cache': response_cache.stats()}, 200
@@ -43,6 +43,9 @@ def populate_sample_data():
                 setattr(patient, key, value)
             db.session.add(patient)
         
+        # Donation records and requests reference these rows by foreign key
+        db.session.flush()
+        
         # Sample Blood Inventory
         blood_groups = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
         inventory_data = []
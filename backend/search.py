@@ -0,0 +1,448 @@
+import itertools
+import re
+import unicodedata
+from collections import Counter, defaultdict
+
+import click
+from flask import request
+from flask.cli import with_appcontext
+from flask_restful import Resource
+from sqlalchemy import and_, delete, event, func, insert, inspect, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from backend.cache import cached
+from backend.database import db
+from backend.models import Donor, Patient, SearchGram, SearchPosting, SearchTerm
+
+# Searchable tables; postings record the table name as their entity
+SEARCH_TABLES = {'donors': Donor, 'patients': Patient}
+INDEXED_COLUMNS = ('name', 'location', 'contact')
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+MAX_QUERY_WORDS = 5
+MAX_TERM_LENGTH = 64
+# Terms sharing enough trigrams with a query word that are checked for edit distance
+MAX_GRAM_CANDIDATES = 200
+# Matching terms kept per query word, best first
+MAX_TERMS_PER_WORD = 64
+# Matching rows fetched and scored together when the best combination of word scores falls short
+MAX_CANDIDATES = 1000
+# Otherwise, (score level per word) combinations tried best first before giving up on filling the page
+MAX_COMBINATIONS = 32
+# A completion of the word being typed ranks below an equally close whole word
+PREFIX_WEIGHT = 0.9
+
+_WORD = re.compile(r'[^\W_]+')
+# Phone numbers are typed with separators ('(415) 555-0123'); such a run is one query word
+_QUERY_WORD = re.compile(r'\d[\d\s().+-]*\d|[^\W_]+')
+
+
+def fold(text):
+    """Lower-case ``text`` and strip accents: 'José' -> 'jose'."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+
+def phone_terms(contact):
+    """Normalized forms a contact number is found by: all its digits, without a country code, and the
+    local and line number, so '+1 (415) 555-0123' matches '4155550123', '5550123' and '0123'."""
+    digits = re.sub(r'\D', '', contact or '')
+    if len(digits) < 3:
+        return set()
+    return {digits[-length:] for length in (10, 7, 4) if len(digits) > length} | {digits}
+
+
+def row_terms(row):
+    """Index terms for a Donor/Patient object or a mapping with the same keys."""
+    get = row.get if isinstance(row, dict) else lambda name: getattr(row, name)
+    terms = set(_WORD.findall(fold(get('name')))) | set(_WORD.findall(fold(get('location'))))
+    city = _WORD.findall(fold((get('location') or '').split(',')[0]))
+    if len(city) > 1:
+        # Initials stand in for abbreviations: 'New York' -> 'ny', 'San Jose' -> 'sj'
+        terms.add(''.join(word[0] for word in city))
+    terms |= phone_terms(get('contact'))
+    return {term[:MAX_TERM_LENGTH] for term in terms}
+
+
+def grams(term, prefix=False):
+    """Padded trigrams of ``term``; a prefix leaves the end open so 'smi' shares all its grams with 'smith'."""
+    padded = f'  {term}' + ('' if prefix else ' ')
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+
+def _has_letter(term):
+    return not term.isdigit()
+
+
+def _upsert_statement(connection, table):
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(table)
+    if dialect == 'sqlite':
+        return sqlite.insert(table)
+    return None
+
+
+def _add_term_counts(connection, counts):
+    """Add ``counts`` ({term: postings added or removed}) to search_terms, indexing the trigrams of new terms."""
+    terms_table = SearchTerm.__table__
+    counts = {term: amount for term, amount in counts.items() if amount}
+    names = sorted(counts)
+    known = set()
+    for start in range(0, len(names), 500):
+        known.update(connection.execute(
+            select(terms_table.c.term).where(terms_table.c.term.in_(names[start:start + 500]))
+        ).scalars())
+    # Rows go out in sorted order so concurrent saves sharing terms lock them in the same order
+    gram_rows = [{'gram': gram, 'term': term} for term in names if term not in known and _has_letter(term)
+                 for gram in sorted(grams(term))]
+    rows = [{'term': term, 'doc_count': counts[term]} for term in names]
+
+    upsert = _upsert_statement(connection, SearchGram.__table__)
+    if gram_rows:
+        # Another transaction may be adding the same new term
+        connection.execute(upsert.on_conflict_do_nothing() if upsert is not None
+                           else insert(SearchGram), gram_rows)
+    upsert = _upsert_statement(connection, terms_table)
+    if upsert is not None:
+        connection.execute(upsert.on_conflict_do_update(
+            index_elements=[terms_table.c.term],
+            set_={'doc_count': terms_table.c.doc_count + upsert.excluded.doc_count}
+        ), rows)
+        return
+    for row in rows:
+        result = connection.execute(update(terms_table).where(terms_table.c.term == row['term'])
+                                    .values(doc_count=terms_table.c.doc_count + row['doc_count']))
+        if result.rowcount == 0:
+            connection.execute(insert(terms_table).values(**row))
+
+
+def index_rows(connection, table, rows):
+    """Add search postings for ``rows`` of ``table`` (objects or mappings with id, name, location, contact)."""
+    postings = [{'term': term, 'entity': table, 'row_id': row['id'] if isinstance(row, dict) else row.id}
+                for row in rows for term in row_terms(row)]
+    if not postings:
+        return
+    connection.execute(insert(SearchPosting), postings)
+    _add_term_counts(connection, Counter(posting['term'] for posting in postings))
+
+
+def _unindex(connection, table, condition):
+    postings = SearchPosting.__table__
+    where = and_(postings.c.entity == table, condition)
+    terms = connection.execute(select(postings.c.term).where(where)).scalars().all()
+    if not terms:
+        return
+    connection.execute(delete(postings).where(where))
+    _add_term_counts(connection, {term: -count for term, count in Counter(terms).items()})
+
+
+def _reindex(connection, table, id_condition, row_id_condition):
+    model = SEARCH_TABLES[table]
+    _unindex(connection, table, row_id_condition)
+    rows = connection.execute(
+        select(model.id, model.name, model.location, model.contact).where(id_condition)
+    ).mappings().all()
+    index_rows(connection, table, rows)
+
+
+def refresh_search(connection, table, row_ids=(), after_id=None):
+    """Re-index the given rows and every row with an id above ``after_id``.
+
+    Used by write paths that bypass the ORM (bulk import); rows that no longer
+    exist simply lose their postings.
+    """
+    model = SEARCH_TABLES[table]
+    row_id = SearchPosting.__table__.c.row_id
+    if after_id is not None:
+        row_ids = [value for value in row_ids if value <= after_id]
+        _reindex(connection, table, model.id > after_id, row_id > after_id)
+    row_ids = list(row_ids)
+    for start in range(0, len(row_ids), 500):
+        chunk = row_ids[start:start + 500]
+        _reindex(connection, table, model.id.in_(chunk), row_id.in_(chunk))
+
+
+def rebuild_search_index(batch_size=10000):
+    """Recreate the search index from the donors and patients tables; returns the number of rows indexed."""
+    indexed = 0
+    with db.engine.begin() as connection:
+        for model in (SearchPosting, SearchGram, SearchTerm):
+            connection.execute(delete(model))
+        for table, model in SEARCH_TABLES.items():
+            last_id = 0
+            while True:
+                rows = connection.execute(
+                    select(model.id, model.name, model.location, model.contact)
+                    .where(model.id > last_id).order_by(model.id).limit(batch_size)
+                ).mappings().all()
+                if not rows:
+                    break
+                index_rows(connection, table, rows)
+                indexed += len(rows)
+                last_id = rows[-1]['id']
+    return indexed
+
+
+@event.listens_for(Session, 'after_flush')
+def _sync_search_index(session, flush_context):
+    added = defaultdict(list)
+    removed = defaultdict(list)
+    for obj in session.new:
+        table = getattr(obj, '__tablename__', None)
+        if table in SEARCH_TABLES:
+            added[table].append(obj)
+    for obj in session.dirty:
+        table = getattr(obj, '__tablename__', None)
+        if table in SEARCH_TABLES and any(inspect(obj).attrs[name].history.has_changes()
+                                          for name in INDEXED_COLUMNS):
+            removed[table].append(obj.id)
+            added[table].append(obj)
+    for obj in session.deleted:
+        table = getattr(obj, '__tablename__', None)
+        if table in SEARCH_TABLES:
+            removed[table].append(obj.id)
+    if not added and not removed:
+        return
+    connection = session.connection()
+    for table, row_ids in removed.items():
+        _unindex(connection, table, SearchPosting.__table__.c.row_id.in_(row_ids))
+    for table, rows in added.items():
+        index_rows(connection, table, rows)
+
+
+def parse_query(text):
+    """Query words as (word, prefix) pairs; the last word is matched as a prefix unless the query ends in a space."""
+    words = []
+    for match in _QUERY_WORD.finditer(fold(text)):
+        word = match.group()
+        if word[0].isdigit() and not word.isalnum():
+            word = re.sub(r'\D', '', word)
+        words.append(word[:MAX_TERM_LENGTH])
+    words = words[:MAX_QUERY_WORDS]
+    open_end = bool(words) and not text[-1:].isspace()
+    return [(word, open_end and index == len(words) - 1) for index, word in enumerate(words)]
+
+
+def allowed_edits(word):
+    return 0 if len(word) <= 2 else 1 if len(word) <= 5 else 2
+
+
+def _distances(word, term, limit):
+    """Optimal string alignment distances from ``word`` to every prefix of ``term`` (index = prefix length).
+
+    Returns None as soon as every prefix is more than ``limit`` edits away.
+    """
+    previous2 = None
+    previous = list(range(len(term) + 1))
+    for i in range(1, len(word) + 1):
+        current = [i] + [0] * len(term)
+        for j in range(1, len(term) + 1):
+            cost = word[i - 1] != term[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and word[i - 1] == term[j - 2] and word[i - 2] == term[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return None
+        previous2, previous = previous, current
+    return previous
+
+
+def match_score(word, term, prefix):
+    """Score in (0, 1] for ``term`` as a match of the query ``word``, or None if it is too many edits away."""
+    if term == word:
+        return 1.0
+    if prefix and term.startswith(word):
+        return PREFIX_WEIGHT
+    limit = allowed_edits(word)
+    if not limit or (not prefix and abs(len(term) - len(word)) > limit):
+        return None
+    distances = _distances(word, term if not prefix else term[:len(word) + limit], limit)
+    if distances is None:
+        return None
+    scores = []
+    if len(term) <= len(word) + limit and distances[len(term)] <= limit:
+        scores.append(1 - distances[len(term)] / (len(word) + 1))
+    if prefix and min(distances) <= limit:
+        scores.append((1 - min(distances) / (len(word) + 1)) * PREFIX_WEIGHT)
+    return max(scores) if scores else None
+
+
+def _candidate_terms(connection, word, prefix):
+    """(term, doc_count) pairs that may match ``word``: a trigram lookup, or a range scan for numbers."""
+    terms = SearchTerm.__table__
+    if word.isdigit():
+        # Numbers match exactly or, while typed, by prefix: terms from 'word' up to 'word:' (':' follows '9')
+        condition = and_(terms.c.term >= word, terms.c.term < word + ':') if prefix else terms.c.term == word
+        return connection.execute(
+            select(terms.c.term, terms.c.doc_count).where(condition, terms.c.doc_count > 0)
+            .order_by(terms.c.term).limit(MAX_TERMS_PER_WORD)
+        ).all()
+    query_grams = grams(word, prefix)
+    # Each edit changes at most three trigrams
+    needed = max(len(query_grams) - 3 * allowed_edits(word), 1)
+    gram_table = SearchGram.__table__
+    shared = func.count()
+    return connection.execute(
+        select(gram_table.c.term, terms.c.doc_count)
+        .join(terms, terms.c.term == gram_table.c.term)
+        .where(gram_table.c.gram.in_(query_grams), terms.c.doc_count > 0)
+        .group_by(gram_table.c.term, terms.c.doc_count)
+        .having(shared >= needed)
+        .order_by(shared.desc(), terms.c.doc_count.desc())
+        .limit(MAX_GRAM_CANDIDATES)
+    ).all()
+
+
+def word_levels(connection, word, prefix):
+    """Matching terms for one query word grouped by score: [(score, [terms], postings)], best first."""
+    matches = []
+    for term, doc_count in _candidate_terms(connection, word, prefix):
+        score = match_score(word, term, prefix)
+        if score is not None:
+            matches.append((score, doc_count, term))
+    matches.sort(key=lambda match: (-match[0], -match[1]))
+    levels = {}
+    for score, doc_count, term in matches[:MAX_TERMS_PER_WORD]:
+        terms, postings = levels.get(score, ([], 0))
+        terms.append(term)
+        levels[score] = (terms, postings + doc_count)
+    return [(score, terms, postings) for score, (terms, postings) in levels.items()]
+
+
+def _matching_ids(connection, table, levels, blood_group, limit):
+    """Ids of ``table`` rows with a posting in every one of ``levels``, up to ``limit``."""
+    # The rarest level drives the join; the others are index probes on (entity, row_id, term)
+    levels = sorted(levels, key=lambda level: level[2])
+    postings = [SearchPosting.__table__.alias(f'p{index}') for index in range(len(levels))]
+    first = postings[0]
+    query = select(first.c.row_id).select_from(first)
+    for alias, (_, terms, _) in zip(postings[1:], levels[1:]):
+        query = query.join(alias, and_(alias.c.entity == first.c.entity, alias.c.row_id == first.c.row_id,
+                                       alias.c.term.in_(terms)))
+    if blood_group:
+        model = SEARCH_TABLES[table]
+        query = query.join(model.__table__, model.__table__.c.id == first.c.row_id).where(
+            model.__table__.c.blood_group == blood_group)
+    query = query.where(first.c.entity == table, first.c.term.in_(levels[0][1]))
+    return connection.execute(query.distinct().limit(limit)).scalars().all()
+
+
+def _score_rows(connection, table, row_ids, per_word):
+    """{row id: mean over query words of the best score among the row's terms}."""
+    term_scores = [{term: score for score, terms, _ in levels for term in terms} for levels in per_word]
+    all_terms = set().union(*term_scores)
+    postings = SearchPosting.__table__
+    best = defaultdict(lambda: [0.0] * len(per_word))
+    for start in range(0, len(row_ids), 500):
+        for row_id, term in connection.execute(
+            select(postings.c.row_id, postings.c.term).where(
+                postings.c.entity == table, postings.c.row_id.in_(row_ids[start:start + 500]),
+                postings.c.term.in_(all_terms))
+        ):
+            scores = best[row_id]
+            for index, word_scores in enumerate(term_scores):
+                scores[index] = max(scores[index], word_scores.get(term, 0.0))
+    return {row_id: round(sum(scores) / len(scores), 3) for row_id, scores in best.items()}
+
+
+def search(text, tables=tuple(SEARCH_TABLES), blood_group=None, limit=DEFAULT_LIMIT):
+    """Ranked donors and patients matching every word of ``text``, allowing typos and a partly typed last word.
+
+    Each query word resolves to index terms grouped into score levels, and a
+    row's score is the mean of its words' best levels. The best combination of
+    levels is intersected first and usually fills the page. Otherwise, if all
+    matching rows number fewer than MAX_CANDIDATES, they are fetched and
+    scored at once; failing that, the remaining combinations are intersected
+    best first. Ties keep index order.
+    """
+    connection = db.session.connection()
+    words = parse_query(text)
+    per_word = [word_levels(connection, word, prefix) for word, prefix in words]
+    if not per_word or not all(per_word):
+        return []
+
+    found = []
+    seen = set()
+
+    def add(table, row_ids, score):
+        for row_id in row_ids:
+            if (table, row_id) not in seen and len(found) < limit:
+                seen.add((table, row_id))
+                found.append((table, row_id, score))
+
+    def intersect(levels):
+        score = round(sum(level[0] for level in levels) / len(levels), 3)
+        for table in tables:
+            if len(found) >= limit:
+                break
+            # Rows already found through a better combination come back too; fetch enough to skip them
+            known = sum(1 for entity, _ in seen if entity == table)
+            add(table, _matching_ids(connection, table, levels, blood_group, limit - len(found) + known), score)
+
+    combinations = sorted(itertools.product(*per_word), key=lambda levels: -sum(level[0] for level in levels))
+    intersect(combinations[0])
+    if len(found) < limit and len(combinations) > 1:
+        merged = [(None, [term for _, terms, _ in levels for term in terms], sum(level[2] for level in levels))
+                  for levels in per_word]
+        candidates = {table: _matching_ids(connection, table, merged, blood_group, MAX_CANDIDATES)
+                      for table in tables}
+        if all(len(row_ids) < MAX_CANDIDATES for row_ids in candidates.values()):
+            scored = []
+            for table, row_ids in candidates.items():
+                row_ids = [row_id for row_id in row_ids if (table, row_id) not in seen]
+                scored += [(score, table, row_id)
+                           for row_id, score in _score_rows(connection, table, row_ids, per_word).items()]
+            for score, table, row_id in sorted(scored, key=lambda match: -match[0]):
+                add(table, [row_id], score)
+        else:
+            for levels in combinations[1:MAX_COMBINATIONS]:
+                if len(found) >= limit:
+                    break
+                intersect(levels)
+
+    records = {}
+    for table, model in SEARCH_TABLES.items():
+        ids = [row_id for entity, row_id, _ in found if entity == table]
+        if ids:
+            records.update(((table, row.id), row.to_dict()) for row in model.query.filter(model.id.in_(ids)))
+    return [{'table': table, 'id': row_id, 'score': score, 'record': records[(table, row_id)]}
+            for table, row_id, score in found if (table, row_id) in records]
+
+
+class SearchResource(Resource):
+    @cached('donors', 'patients')
+    def get(self):
+        args = request.args
+        text = args.get('q', '')
+        table = args.get('table')
+        if table and table not in SEARCH_TABLES:
+            return {'error': f"'table' must be one of {', '.join(SEARCH_TABLES)}"}, 400
+        blood_groups = Donor.__table__.c.blood_group.type.enums
+        if args.get('blood_group') and args['blood_group'] not in blood_groups:
+            return {'error': f"'blood_group' must be one of {', '.join(blood_groups)}"}, 400
+        try:
+            limit = min(max(int(args.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+        except ValueError:
+            return {'error': 'limit must be an integer'}, 400
+        if not parse_query(text):
+            return {'error': 'q must contain at least one letter or digit'}, 400
+
+        results = search(text, tables=(table,) if table else tuple(SEARCH_TABLES),
+                         blood_group=args.get('blood_group') or None, limit=limit)
+        return {'query': text, 'results': results, 'count': len(results)}, 200
+
+
+@click.group('search')
+def search_cli():
+    """Search index maintenance."""
+
+
+@search_cli.command('rebuild')
+@click.option('--batch-size', default=10000, show_default=True)
+@with_appcontext
+def rebuild_command(batch_size):
+    """Rebuild the donor and patient search index."""
+    click.echo(f'Indexed {rebuild_search_index(batch_size)} rows.')
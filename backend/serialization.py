@@ -0,0 +1,52 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import Response
+
+# orjson is optional: without it the stdlib encoder produces the same JSON, only slower
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Shapes for list endpoints: one object per row, or one array per column
+LIST_FORMATS = ('records', 'columns')
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+_encoder = json.JSONEncoder(separators=(',', ':'), default=_default)
+
+
+def dumps(obj):
+    """Encode ``obj`` as compact JSON bytes; dates and datetimes become ISO 8601 strings."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default)
+    return _encoder.encode(obj).encode()
+
+
+def loads(data):
+    """Decode JSON bytes or text."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_response(body, status=200, headers=None):
+    """An already encoded JSON response; Flask-RESTful passes Response objects through untouched."""
+    return Response(dumps(body) + b'\n', status=status, headers=headers, mimetype='application/json')
+
+
+def shape_rows(names, rows, fmt='records'):
+    """Plain column tuples as a list of {name: value} objects, or as {name: [values]} columns."""
+    if fmt == 'columns':
+        values = list(zip(*rows)) if rows else [()] * len(names)
+        return {name: list(column) for name, column in zip(names, values)}
+    return [dict(zip(names, row)) for row in rows]
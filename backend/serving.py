@@ -0,0 +1,123 @@
+import logging
+import os
+import time
+
+from sqlalchemy import exc, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+from backend.database import db
+from backend.metrics import metrics
+
+logger = logging.getLogger('bbms.serving')
+
+# The frontend and hot read endpoints, requested once per process before it takes traffic
+WARM_UP_PATHS = (
+    '/',
+    '/api/dashboard-stats',
+    '/api/donors',
+    '/api/patients',
+    '/api/inventory',
+    '/api/requests',
+    '/api/donation-records',
+)
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long every checkout waited for a connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            metrics.count('pool_timeouts', ())
+            raise
+        finally:
+            metrics.observe_pool_wait(time.perf_counter() - started)
+
+
+def _env_flag(name, default):
+    return os.environ.get(name, str(default)).lower() == 'true'
+
+
+def require_secret_key(app):
+    """Refuse to serve without SESSION_SECRET; checked by the server entry points, not at app creation."""
+    if not app.config.get('SECRET_KEY'):
+        raise ValueError("SESSION_SECRET environment variable is required for production deployment. "
+                         "Set a secure random string.")
+
+
+def configure_pool(app):
+    """Set SQLALCHEMY_ENGINE_OPTIONS from the pool config.
+
+    Config: WEB_THREADS (request threads per worker process, default 4),
+    DB_POOL_SIZE (default WEB_THREADS + 2, leaving room for the change feed and
+    expiry threads), DB_MAX_OVERFLOW (default 2), DB_POOL_TIMEOUT (seconds,
+    default 10), DB_POOL_RECYCLE (seconds, default 300) and DB_POOL_PRE_PING
+    (default False; recycling already retires idle connections, and a ping
+    costs a round trip on every checkout).
+    """
+    app.config.setdefault('WEB_THREADS', int(os.environ.get('WEB_THREADS', 4)))
+    app.config.setdefault('DB_POOL_SIZE', int(os.environ.get('DB_POOL_SIZE', app.config['WEB_THREADS'] + 2)))
+    app.config.setdefault('DB_MAX_OVERFLOW', int(os.environ.get('DB_MAX_OVERFLOW', 2)))
+    app.config.setdefault('DB_POOL_TIMEOUT', float(os.environ.get('DB_POOL_TIMEOUT', 10)))
+    app.config.setdefault('DB_POOL_RECYCLE', int(os.environ.get('DB_POOL_RECYCLE', 300)))
+    app.config.setdefault('DB_POOL_PRE_PING', _env_flag('DB_POOL_PRE_PING', False))
+
+    options = {
+        'pool_recycle': app.config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': app.config['DB_POOL_PRE_PING'],
+    }
+    url = app.config.get('SQLALCHEMY_DATABASE_URI')
+    if url and make_url(url).database not in (None, '', ':memory:'):
+        # In-memory SQLite keeps its single-connection pool
+        options.update(
+            poolclass=TimedQueuePool,
+            pool_size=app.config['DB_POOL_SIZE'],
+            max_overflow=app.config['DB_MAX_OVERFLOW'],
+            pool_timeout=app.config['DB_POOL_TIMEOUT'],
+        )
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {**options, **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})}
+
+
+def pool_stats():
+    """Gauges for /metrics: pool size and current checkouts of this process."""
+    pool = db.engine.pool
+    if not isinstance(pool, QueuePool):
+        return {}
+    return {
+        'size': pool.size(),
+        'checked_out': pool.checkedout(),
+        'idle': pool.checkedin(),
+        'overflow': max(pool.overflow(), 0),
+    }
+
+
+def warm_up(app, paths=WARM_UP_PATHS):
+    """Open the pool's connections and request the hot endpoints once.
+
+    Run in every worker process before it serves traffic, so the first real
+    requests do not pay for connecting, mapper configuration, statement
+    compilation or an empty response cache. Returns what was warmed.
+    """
+    started = time.perf_counter()
+    with app.app_context():
+        pool = db.engine.pool
+        size = pool.size() if isinstance(pool, QueuePool) else 1
+        connections = []
+        try:
+            for _ in range(size):
+                connection = db.engine.connect()
+                connections.append(connection)
+                connection.execute(text('SELECT 1'))
+        finally:
+            for connection in connections:
+                connection.close()
+
+    client = app.test_client()
+    failed = [path for path in paths if client.get(path).status_code >= 400]
+    if failed:
+        logger.warning('Warm-up requests failed: %s', ', '.join(failed))
+    return {'connections': size, 'endpoints': len(paths) - len(failed),
+            'ms': round((time.perf_counter() - started) * 1000)}
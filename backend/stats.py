@@ -0,0 +1,286 @@
+import json
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event, func, inspect, or_, and_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from backend.database import db
+from backend.models import ArchivePartition, Donor, Patient, BloodInventory, DonationRecord, Request, StatCounter
+
+# Counter scopes kept in the stat_counters table
+SUMMARY = 'summary'
+BLOOD_GROUP_UNITS = 'blood_group_units'
+REQUEST_STATUS = 'request_status'
+REQUEST_PRIORITY = 'request_priority'
+DONATION_MONTH = 'donation_month'
+DONATION_DAY = 'donation_day'
+STATS_SCOPES = (SUMMARY, BLOOD_GROUP_UNITS, REQUEST_STATUS, REQUEST_PRIORITY, DONATION_MONTH, DONATION_DAY)
+
+TRACKED_MODELS = (Donor, Patient, BloodInventory, DonationRecord, Request)
+TRACKED_TABLES = {model.__tablename__ for model in TRACKED_MODELS}
+
+# Columns whose values feed a counter; changes to any other column never touch the stats
+COUNTED_COLUMNS = {
+    'donors': (),
+    'patients': (),
+    'requests': ('status', 'priority'),
+    'blood_inventory': ('blood_group', 'units_available', 'status'),
+    'donation_records': ('date_of_donation',),
+}
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def row_contributions(table, values):
+    """Counter increments contributed by a single row of ``table`` with the given column values."""
+    contributions = Counter()
+    if table == 'donors':
+        contributions[(SUMMARY, 'donors')] += 1
+    elif table == 'patients':
+        contributions[(SUMMARY, 'patients')] += 1
+    elif table == 'requests':
+        contributions[(SUMMARY, 'requests')] += 1
+        contributions[(REQUEST_STATUS, values['status'])] += 1
+        contributions[(REQUEST_PRIORITY, values['priority'])] += 1
+    elif table == 'blood_inventory':
+        # Discarded lots stay on record but no longer count as stock
+        units = (values.get('units_available') or 0) if values.get('status', 'Available') == 'Available' else 0
+        contributions[(SUMMARY, 'blood_units')] += units
+        contributions[(BLOOD_GROUP_UNITS, values['blood_group'])] += units
+    elif table == 'donation_records':
+        donated_on = _as_date(values['date_of_donation'])
+        contributions[(DONATION_MONTH, donated_on.strftime('%Y-%m'))] += 1
+        contributions[(DONATION_DAY, donated_on.isoformat())] += 1
+    return contributions
+
+
+def add_row_deltas(deltas, table, values, sign=1):
+    for counter, amount in row_contributions(table, values).items():
+        deltas[counter] += sign * amount
+
+
+def apply_deltas(connection, deltas):
+    """Add ``deltas`` ({(scope, key): amount}) to the stored counters on ``connection``."""
+    table = StatCounter.__table__
+    dialect = connection.dialect.name
+    # Every writer locks counter rows in the same (scope, key) order, so overlapping writes cannot deadlock
+    rows = [{'scope': scope, 'key': key, 'value': amount} for (scope, key), amount in sorted(deltas.items())
+            if amount]
+    if not rows:
+        return
+    if dialect in ('postgresql', 'sqlite'):
+        # One executemany upsert for every touched counter
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.scope, table.c.key],
+            set_={'value': table.c.value + stmt.excluded.value}
+        )
+        connection.execute(stmt, rows)
+        return
+    for row in rows:
+        result = connection.execute(
+            update(table)
+            .where(table.c.scope == row['scope'], table.c.key == row['key'])
+            .values(value=table.c.value + row['value'])
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(**row))
+
+
+def old_values(session, obj, columns):
+    """``columns`` of ``obj`` as stored before the pending changes."""
+    state = inspect(obj)
+    values = {}
+    missing = []
+    for name in columns:
+        history = state.attrs[name].history
+        if history.deleted:
+            values[name] = history.deleted[0]
+        elif history.unchanged:
+            values[name] = history.unchanged[0]
+        else:
+            missing.append(name)
+    if missing:
+        # The attribute was expired before being overwritten; read the stored value
+        model = type(obj)
+        row = session.connection().execute(
+            select(*[getattr(model, name) for name in missing]).where(model.id == obj.id)
+        ).one()
+        values.update(zip(missing, row))
+    return values
+
+
+def current_values(obj, columns):
+    return {name: getattr(obj, name) for name in columns}
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_dirty_deltas(session, flush_context, instances):
+    deltas = session.info.setdefault('stats_deltas', Counter())
+    for obj in session.dirty:
+        table = getattr(obj, '__tablename__', None)
+        if table not in TRACKED_TABLES or not session.is_modified(obj):
+            continue
+        columns = COUNTED_COLUMNS[table]
+        if not columns:
+            continue
+        state = inspect(obj)
+        if not any(state.attrs[name].history.has_changes() for name in columns):
+            continue
+        add_row_deltas(deltas, table, old_values(session, obj, columns), sign=-1)
+        add_row_deltas(deltas, table, current_values(obj, columns))
+
+
+@event.listens_for(Session, 'after_flush')
+def _apply_flush_deltas(session, flush_context):
+    deltas = session.info.pop('stats_deltas', None) or Counter()
+    for obj in session.new:
+        table = getattr(obj, '__tablename__', None)
+        if table in TRACKED_TABLES:
+            add_row_deltas(deltas, table, current_values(obj, COUNTED_COLUMNS[table]))
+    for obj in session.deleted:
+        table = getattr(obj, '__tablename__', None)
+        if table in TRACKED_TABLES:
+            add_row_deltas(deltas, table, current_values(obj, COUNTED_COLUMNS[table]), sign=-1)
+    if deltas:
+        apply_deltas(session.connection(), deltas)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_deltas(session):
+    session.info.pop('stats_deltas', None)
+
+
+def month_starts(count, today=None):
+    """First day of the current month and the ``count - 1`` calendar months before it, newest first."""
+    month_start = (today or date.today()).replace(day=1)
+    starts = []
+    for _ in range(count):
+        starts.append(month_start)
+        month_start = (month_start - timedelta(days=1)).replace(day=1)
+    return starts
+
+
+def read_dashboard_counters(months=6, recent_days=30):
+    """Load every counter the dashboard needs with a single primary-key range query."""
+    today = date.today()
+    first_month = month_starts(months, today)[-1]
+    recent_start = today - timedelta(days=recent_days)
+
+    rows = db.session.query(StatCounter.scope, StatCounter.key, StatCounter.value).filter(or_(
+        StatCounter.scope.in_([SUMMARY, BLOOD_GROUP_UNITS, REQUEST_STATUS, REQUEST_PRIORITY]),
+        and_(StatCounter.scope == DONATION_MONTH, StatCounter.key >= first_month.strftime('%Y-%m')),
+        and_(StatCounter.scope == DONATION_DAY, StatCounter.key >= recent_start.isoformat())
+    )).all()
+
+    counters = {}
+    for scope, key, value in rows:
+        counters.setdefault(scope, {})[key] = value
+    return counters
+
+
+def compute_counters():
+    """Recompute every counter from the base tables (used by rebuild/verify)."""
+    counters = Counter()
+    counters[(SUMMARY, 'donors')] = db.session.query(func.count(Donor.id)).scalar()
+    counters[(SUMMARY, 'patients')] = db.session.query(func.count(Patient.id)).scalar()
+    counters[(SUMMARY, 'requests')] = db.session.query(func.count(Request.id)).scalar()
+
+    for status, count in db.session.query(Request.status, func.count(Request.id)).group_by(Request.status):
+        counters[(REQUEST_STATUS, status)] = count
+    for priority, count in db.session.query(Request.priority, func.count(Request.id)).group_by(Request.priority):
+        counters[(REQUEST_PRIORITY, priority)] = count
+
+    units_by_group = db.session.query(
+        BloodInventory.blood_group, func.sum(BloodInventory.units_available)
+    ).filter(BloodInventory.status == 'Available').group_by(BloodInventory.blood_group)
+    for blood_group, units in units_by_group:
+        counters[(BLOOD_GROUP_UNITS, blood_group)] = units or 0
+        counters[(SUMMARY, 'blood_units')] += units or 0
+
+    donations_by_day = db.session.query(
+        DonationRecord.date_of_donation, func.count(DonationRecord.id)
+    ).group_by(DonationRecord.date_of_donation)
+    for donated_on, count in donations_by_day:
+        donated_on = _as_date(donated_on)
+        counters[(DONATION_DAY, donated_on.isoformat())] += count
+        counters[(DONATION_MONTH, donated_on.strftime('%Y-%m'))] += count
+
+    # Archived rows left the base tables but still count; each partition carries their contributions
+    for (archived,) in db.session.query(ArchivePartition.counters):
+        for scope, key, value in json.loads(archived):
+            counters[(scope, key)] += value
+
+    return +counters
+
+
+def stored_counters():
+    rows = db.session.query(StatCounter.scope, StatCounter.key, StatCounter.value).filter(
+        StatCounter.scope.in_(STATS_SCOPES))
+    return +Counter({(scope, key): value for scope, key, value in rows})
+
+
+def rebuild_counters():
+    expected = compute_counters()
+    db.session.query(StatCounter).filter(StatCounter.scope.in_(STATS_SCOPES)).delete()
+    if expected:
+        db.session.execute(StatCounter.__table__.insert(), [
+            {'scope': scope, 'key': key, 'value': value} for (scope, key), value in expected.items()
+        ])
+    db.session.commit()
+    return expected
+
+
+def counter_drift():
+    """Return {(scope, key): (stored, expected)} for every counter that disagrees with the base tables."""
+    expected = compute_counters()
+    stored = stored_counters()
+    return {counter: (stored.get(counter, 0), expected.get(counter, 0))
+            for counter in set(expected) | set(stored)
+            if stored.get(counter, 0) != expected.get(counter, 0)}
+
+
+def ensure_counters():
+    """Populate the counters on first boot of a database that predates them."""
+    if db.session.query(StatCounter.scope).filter(StatCounter.scope.in_(STATS_SCOPES)).first() is None and db.session.query(Donor.id).first() is not None:
+        rebuild_counters()
+
+
+@click.group('stats')
+def stats_cli():
+    """Maintain the materialized dashboard counters."""
+
+
+@stats_cli.command('rebuild')
+@with_appcontext
+def rebuild_command():
+    """Recompute all dashboard counters from the base tables."""
+    counters = rebuild_counters()
+    click.echo(f'Rebuilt {len(counters)} counters.')
+
+
+@stats_cli.command('verify')
+@click.option('--fix', is_flag=True, help='Rebuild the counters if any drift is found.')
+@with_appcontext
+def verify_command(fix):
+    """Compare stored dashboard counters with the base tables."""
+    drift = counter_drift()
+    if not drift:
+        click.echo('Dashboard counters are consistent.')
+        return
+    for (scope, key), (stored, expected) in sorted(drift.items()):
+        click.echo(f'{scope}/{key}: stored={stored} expected={expected}')
+    if fix:
+        rebuild_counters()
+        click.echo('Counters rebuilt.')
+    else:
+        raise SystemExit(1)
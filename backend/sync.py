@@ -0,0 +1,211 @@
+import os
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app, request
+from flask.cli import with_appcontext
+from flask_restful import Resource
+from sqlalchemy import and_, delete, event, insert, or_, select, true
+from sqlalchemy.orm import Session
+
+from backend.database import db
+from backend.models import BloodInventory, DonationRecord, Donor, Patient, Request, Tombstone, api_columns
+from backend.serialization import json_response
+
+# Fixed order of the cursors in a sync token; tombstones come last
+SYNCED_MODELS = (Donor, Patient, BloodInventory, DonationRecord, Request)
+SYNCED_TABLES = {model.__tablename__: model for model in SYNCED_MODELS}
+# Sent once per table, then one array per row; updated_at only orders the sync
+COLUMNS = {table: api_columns(model) for table, model in SYNCED_TABLES.items()}
+
+DEFAULT_LIMIT = 1000
+MAX_LIMIT = 5000
+# Rows stamped this recently are sent again on the next sync, so a transaction that
+# stamped its rows before a sync and commits after it is never skipped
+DEFAULT_GRACE_SECONDS = 10
+DEFAULT_TOMBSTONE_DAYS = 30
+EPOCH = datetime(1970, 1, 1)
+# Cursor of a table that has not been synced yet: before every row
+START = (EPOCH, 0)
+
+
+class SyncTokenError(ValueError):
+    pass
+
+
+def _setting(name, default):
+    return float(current_app.config.get(name, os.environ.get(name, default)))
+
+
+@event.listens_for(Session, 'after_flush')
+def _record_tombstones(session, flush_context):
+    rows = [{'table_name': obj.__tablename__, 'row_id': obj.id, 'deleted_at': datetime.utcnow()}
+            for obj in session.deleted if getattr(obj, '__tablename__', None) in SYNCED_TABLES]
+    if rows:
+        session.connection().execute(insert(Tombstone), rows)
+
+
+def record_tombstones(connection, table, ids, deleted_at=None):
+    """Tombstones for rows of ``table`` deleted by a statement that bypasses the ORM flush."""
+    deleted_at = deleted_at or datetime.utcnow()
+    rows = [{'table_name': table, 'row_id': row_id, 'deleted_at': deleted_at} for row_id in ids]
+    if rows:
+        connection.execute(insert(Tombstone), rows)
+
+
+def _encode_cursor(cursor):
+    stamp, row_id = cursor
+    return f'{(stamp - EPOCH) // timedelta(microseconds=1)}:{row_id}'
+
+
+def _decode_cursor(value):
+    stamp, _, row_id = value.partition(':')
+    return EPOCH + timedelta(microseconds=int(stamp)), int(row_id)
+
+
+def encode_token(cursors, tombstones):
+    """'<microseconds>:<id>' per synced table and for the tombstones, joined by dots."""
+    return '.'.join(_encode_cursor(cursor) for cursor in [*cursors, tombstones])
+
+
+def decode_token(token):
+    """(table cursors in SYNCED_MODELS order, tombstone cursor); raises SyncTokenError."""
+    parts = token.split('.')
+    if len(parts) != len(SYNCED_MODELS) + 1:
+        raise SyncTokenError("'since' is not a sync token")
+    try:
+        cursors = [_decode_cursor(part) for part in parts]
+    except (ValueError, OverflowError):
+        raise SyncTokenError("'since' is not a sync token")
+    return cursors[:-1], cursors[-1]
+
+
+def _after(stamp_column, id_column, cursor):
+    """Rows after ``cursor`` in (stamp, id) order; the leading range keeps it one index scan."""
+    if cursor == START:
+        return true()
+    stamp, row_id = cursor
+    return and_(stamp_column >= stamp, or_(stamp_column > stamp, id_column > row_id))
+
+
+def _advance(cursor, rows, limit, upper):
+    """The next cursor and whether more rows are waiting, given a page fetched with ``limit + 1``.
+
+    A cursor never passes ``upper`` unless a full page of older rows carries it there.
+    """
+    if len(rows) > limit and rows[limit - 1][0] <= upper:
+        return (rows[limit - 1][0], rows[limit - 1][1]), True
+    return max(cursor, (upper, 0)), False
+
+
+def changes_since(token=None, limit=DEFAULT_LIMIT, now=None):
+    """Rows changed and deleted since ``token`` (None: everything) in every synced table.
+
+    Each table is read in (updated_at, id) order from its cursor, at most
+    ``limit`` rows per table per call; ``more`` says another call with the
+    returned token has rows waiting. Rows stamped within the grace period are
+    sent again next time, so clients apply changes idempotently (upsert by id).
+    When the client's tombstone cursor predates the tombstone retention, deletes
+    may have been pruned and the response is a full sync with ``reset`` set.
+    """
+    now = now or datetime.utcnow()
+    upper = now - timedelta(seconds=_setting('SYNC_GRACE_SECONDS', DEFAULT_GRACE_SECONDS))
+    since, reset = token, False
+    if token:
+        cursors, tombstone_cursor = decode_token(token)
+        if tombstone_cursor[0] < now - timedelta(days=_setting('SYNC_TOMBSTONE_DAYS', DEFAULT_TOMBSTONE_DAYS)):
+            token, reset = None, True
+    if not token:
+        # Deletes before a full sync are already reflected in the rows it sends
+        cursors, tombstone_cursor = [START] * len(SYNCED_MODELS), (upper, 0)
+
+    connection = db.session.connection()
+    tables = {}
+    next_cursors = []
+    more = False
+    for model, cursor in zip(SYNCED_MODELS, cursors):
+        table = model.__table__
+        columns = COLUMNS[model.__tablename__]
+        rows = connection.execute(
+            select(table.c.updated_at, *[table.c[name] for name in columns])
+            .where(_after(table.c.updated_at, table.c.id, cursor))
+            .order_by(table.c.updated_at, table.c.id).limit(limit + 1)
+        ).all()
+        # (updated_at, id) first, for _advance
+        keyed = [(row[0], row[1]) for row in rows]
+        next_cursor, table_more = _advance(cursor, keyed, limit, upper)
+        next_cursors.append(next_cursor)
+        more = more or table_more
+        if rows:
+            tables[model.__tablename__] = {'columns': columns, 'rows': [list(row[1:]) for row in rows[:limit]],
+                                           'deleted': []}
+
+    graves = Tombstone.__table__
+    deleted = connection.execute(
+        select(graves.c.deleted_at, graves.c.id, graves.c.table_name, graves.c.row_id)
+        .where(_after(graves.c.deleted_at, graves.c.id, tombstone_cursor))
+        .order_by(graves.c.deleted_at, graves.c.id).limit(limit + 1)
+    ).all()
+    tombstone_cursor, tombstones_more = _advance(tombstone_cursor, deleted, limit, upper)
+    by_table = {}
+    for deleted_at, _, table_name, row_id in deleted[:limit]:
+        ids = by_table.setdefault(table_name, {})
+        ids[row_id] = max(deleted_at, ids.get(row_id, EPOCH))
+    for table_name, ids in by_table.items():
+        model = SYNCED_TABLES.get(table_name)
+        if model is None:
+            continue
+        # SQLite may hand a deleted id to a new row; that row is sent as a change instead
+        reused = {row_id for row_id, updated_at in connection.execute(
+            select(model.id, model.updated_at).where(model.id.in_(list(ids)))) if updated_at > ids[row_id]}
+        live = sorted(row_id for row_id in ids if row_id not in reused)
+        if live:
+            tables.setdefault(table_name, {'columns': COLUMNS[table_name], 'rows': [], 'deleted': []})
+            tables[table_name]['deleted'] = live
+
+    return {
+        'since': since,
+        'next': encode_token(next_cursors, tombstone_cursor),
+        'more': more or tombstones_more,
+        'reset': reset,
+        'tables': tables,
+    }
+
+
+def prune_tombstones(days=None, now=None):
+    """Delete tombstones older than SYNC_TOMBSTONE_DAYS; returns how many went."""
+    if days is None:
+        days = _setting('SYNC_TOMBSTONE_DAYS', DEFAULT_TOMBSTONE_DAYS)
+    cutoff = (now or datetime.utcnow()) - timedelta(days=days)
+    with db.engine.begin() as connection:
+        return connection.execute(delete(Tombstone).where(Tombstone.deleted_at < cutoff)).rowcount
+
+
+class SyncResource(Resource):
+    def get(self):
+        args = request.args
+        try:
+            limit = int(args.get('limit', DEFAULT_LIMIT))
+        except ValueError:
+            return {'error': "'limit' must be an integer"}, 400
+        if limit < 1:
+            return {'error': "'limit' must be at least 1"}, 400
+        try:
+            body = changes_since(args.get('since'), min(limit, MAX_LIMIT))
+        except SyncTokenError as e:
+            return {'error': str(e)}, 400
+        # Never cached: the answer depends on the clock as well as the data
+        return json_response(body, headers={'Cache-Control': 'no-store'})
+
+
+@click.group('sync')
+def sync_cli():
+    """Delta sync tombstones."""
+
+
+@sync_cli.command('prune')
+@click.option('--days', type=float, help='Keep tombstones this many days (default: SYNC_TOMBSTONE_DAYS).')
+@with_appcontext
+def prune_command(days):
+    """Delete tombstones older than the retention; clients that synced before it get a full reset."""
+    click.echo(f'Pruned {prune_tombstones(days)} tombstones.')
@@ -0,0 +1,249 @@
+import random
+import time
+from datetime import date, datetime, timedelta
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, insert, text
+
+from backend.cache import bump_table_versions
+from backend.changefeed import publish_reset
+from backend.database import db
+from backend.eligibility import insert_eligibility
+from backend.ledger import record_receipts
+from backend.models import Donor, Patient, BloodInventory, DonationRecord, Request
+from backend.search import index_rows
+from backend.stats import rebuild_counters, TRACKED_TABLES
+
+# Approximate ABO/Rh frequencies of a donor population
+BLOOD_GROUP_WEIGHTS = {
+    'O+': 37.4, 'A+': 35.7, 'B+': 8.5, 'AB+': 3.4,
+    'O-': 6.6, 'A-': 6.3, 'B-': 1.5, 'AB-': 0.6,
+}
+PRIORITY_WEIGHTS = {'Critical': 5, 'High': 20, 'Medium': 50, 'Low': 25}
+STATUS_WEIGHTS = {'Pending': 20, 'Approved': 15, 'Fulfilled': 55, 'Rejected': 10}
+
+# Population-weighted cities so location filters and searches see a realistic skew
+LOCATIONS = {
+    'New York, NY': 20, 'Los Angeles, CA': 14, 'Chicago, IL': 9, 'Houston, TX': 8, 'Phoenix, AZ': 6,
+    'Philadelphia, PA': 5, 'San Antonio, TX': 5, 'San Diego, CA': 5, 'Dallas, TX': 5, 'San Jose, CA': 3,
+    'Austin, TX': 3, 'Boston, MA': 3, 'Seattle, WA': 3, 'Denver, CO': 3, 'Miami, FL': 2, 'Atlanta, GA': 2,
+    'Portland, OR': 2, 'Nashville, TN': 2,
+}
+FIRST_NAMES = ('James', 'Mary', 'John', 'Patricia', 'Robert', 'Jennifer', 'Michael', 'Linda', 'David',
+               'Elizabeth', 'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah',
+               'Carlos', 'Maria', 'Wei', 'Aisha', 'Priya', 'Ahmed', 'Yuki', 'Olga', 'Kwame', 'Sofia')
+LAST_NAMES = ('Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez',
+              'Martinez', 'Hernandez', 'Lopez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Lee',
+              'Chen', 'Patel', 'Khan', 'Nguyen', 'Kim', 'Ivanova', 'Mensah', 'Rossi')
+
+
+class Generator:
+    """Seeded source of synthetic rows; the same seed and scale always produce the same data."""
+
+    def __init__(self, seed=42, history_years=5, today=None):
+        self.random = random.Random(seed)
+        self.today = today or date.today()
+        self.history_days = int(history_years * 365)
+        self._groups, self._group_weights = zip(*BLOOD_GROUP_WEIGHTS.items())
+        self._locations, self._location_weights = zip(*LOCATIONS.items())
+        self._priorities, self._priority_weights = zip(*PRIORITY_WEIGHTS.items())
+        self._statuses, self._status_weights = zip(*STATUS_WEIGHTS.items())
+
+    def blood_group(self):
+        return self.random.choices(self._groups, self._group_weights)[0]
+
+    def location(self):
+        return self.random.choices(self._locations, self._location_weights)[0]
+
+    def name(self):
+        return f'{self.random.choice(FIRST_NAMES)} {self.random.choice(LAST_NAMES)}'
+
+    def contact(self):
+        return f'555-{self.random.randint(0, 9999):04d}'
+
+    def past_date(self, max_days=None):
+        return self.today - timedelta(days=self.random.randint(0, max_days or self.history_days))
+
+    def donor_with_history(self, donor_id, mean_donations):
+        """A donor row plus its donation records; donations are at least 56 days apart."""
+        blood_group = self.blood_group()
+        name = self.name()
+        donations = []
+        count = min(int(self.random.expovariate(1 / mean_donations)), 30) if mean_donations else 0
+        donated_on = self.past_date()
+        for _ in range(count):
+            if donated_on > self.today:
+                break
+            donations.append({
+                'donor_id': donor_id,
+                'donor_name': name,
+                'blood_group': blood_group,
+                'date_of_donation': donated_on,
+                'units_donated': 1 if self.random.random() < 0.9 else 2,
+                'created_at': datetime.combine(donated_on, datetime.min.time()),
+            })
+            donated_on += timedelta(days=self.random.randint(56, 400))
+        donor = {
+            'id': donor_id,
+            'name': name,
+            'age': self.random.randint(18, 65),
+            'gender': self.random.choices(('Male', 'Female', 'Other'), (49, 49, 2))[0],
+            'blood_group': blood_group,
+            'contact': self.contact(),
+            'location': self.location(),
+            'last_donation_date': donations[-1]['date_of_donation'] if donations else None,
+            'created_at': datetime.utcnow(),
+        }
+        return donor, donations
+
+    def patient(self, patient_id):
+        return {
+            'id': patient_id,
+            'name': self.name(),
+            'age': self.random.randint(1, 95),
+            'blood_group': self.blood_group(),
+            'contact': self.contact(),
+            'location': self.location(),
+            'units_needed': self.random.randint(1, 6),
+            'created_at': datetime.utcnow(),
+        }
+
+    def request(self, patient):
+        requested_on = self.past_date()
+        # Old requests are settled; only recent ones are still open
+        status = self.random.choices(self._statuses, self._status_weights)[0]
+        if requested_on < self.today - timedelta(days=30) and status in ('Pending', 'Approved'):
+            status = 'Fulfilled'
+        return {
+            'patient_id': patient['id'],
+            'patient_name': patient['name'],
+            'blood_group': patient['blood_group'],
+            'units_requested': self.random.randint(1, 6),
+            'date': requested_on,
+            'status': status,
+            'priority': self.random.choices(self._priorities, self._priority_weights)[0],
+            'created_at': datetime.combine(requested_on, datetime.min.time()),
+        }
+
+    def inventory_lot(self):
+        return {
+            'blood_group': self.blood_group(),
+            'units_available': self.random.randint(0, 40),
+            # Red cells keep ~42 days; some lots are already expired or about to
+            'expiry_date': self.today + timedelta(days=self.random.randint(-10, 42)),
+            'created_at': datetime.utcnow(),
+        }
+
+
+def _insert_chunks(model, rows, chunk_size, index=None):
+    """Insert ``rows`` in transactions of ``chunk_size``; ``index(connection, chunk)`` runs inside each one."""
+    buffer = []
+    inserted = 0
+    for row in rows:
+        buffer.append(row)
+        if len(buffer) >= chunk_size:
+            inserted += _insert_chunk(model, buffer, index)
+            buffer = []
+    if buffer:
+        inserted += _insert_chunk(model, buffer, index)
+    return inserted
+
+
+def _insert_chunk(model, rows, index):
+    db.session.execute(insert(model), rows)
+    if index is not None:
+        index(db.session.connection(), rows)
+    db.session.commit()
+    return len(rows)
+
+
+def generate(donors=10000, patients=None, requests=None, inventory=None, mean_donations=2.5,
+             seed=42, history_years=5, chunk_size=5000, echo=lambda message: None):
+    """Bulk-insert a synthetic data set sized by ``donors``; returns rows inserted per table.
+
+    Rows are appended after the current maximum ids, so it can be run repeatedly;
+    dashboard counters and cache versions are rebuilt once at the end.
+    """
+    patients = donors // 4 if patients is None else patients
+    requests = donors // 2 if requests is None else requests
+    inventory = max(donors // 20, 8) if inventory is None else inventory
+    generator = Generator(seed=seed, history_years=history_years)
+    counts = {}
+    started = time.perf_counter()
+
+    first_donor_id = (db.session.query(func.max(Donor.id)).scalar() or 0) + 1
+    donation_rows = []
+
+    def donor_rows():
+        for donor_id in range(first_donor_id, first_donor_id + donors):
+            donor, donations = generator.donor_with_history(donor_id, mean_donations)
+            donation_rows.extend(donations)
+            yield donor
+
+    # Donors first, then their buffered donation history in bounded chunks
+    counts['donors'] = 0
+    counts['donation_records'] = 0
+    donor_iter = donor_rows()
+    while True:
+        batch = [row for _, row in zip(range(chunk_size), donor_iter)]
+        if not batch:
+            break
+        db.session.execute(insert(Donor), batch)
+        insert_eligibility(db.session.connection(), batch)
+        index_rows(db.session.connection(), 'donors', batch)
+        db.session.commit()
+        counts['donors'] += len(batch)
+        counts['donation_records'] += _insert_chunks(DonationRecord, donation_rows, chunk_size)
+        donation_rows.clear()
+        echo(f"donors: {counts['donors']}/{donors}")
+
+    first_patient_id = (db.session.query(func.max(Patient.id)).scalar() or 0) + 1
+    patient_list = [generator.patient(patient_id)
+                    for patient_id in range(first_patient_id, first_patient_id + patients)]
+    counts['patients'] = _insert_chunks(Patient, iter(patient_list), chunk_size,
+                                        index=lambda connection, rows: index_rows(connection, 'patients', rows))
+    echo(f"patients: {counts['patients']}")
+
+    if patient_list:
+        counts['requests'] = _insert_chunks(
+            Request, (generator.request(generator.random.choice(patient_list)) for _ in range(requests)), chunk_size)
+    else:
+        counts['requests'] = 0
+    echo(f"requests: {counts['requests']}")
+
+    last_lot_id = db.session.query(func.max(BloodInventory.id)).scalar() or 0
+    counts['blood_inventory'] = _insert_chunks(
+        BloodInventory, (generator.inventory_lot() for _ in range(inventory)), chunk_size)
+    record_receipts(db.session.connection(), after_id=last_lot_id)
+    echo(f"inventory lots: {counts['blood_inventory']}")
+
+    if db.engine.dialect.name == 'postgresql':
+        for table in ('donors', 'patients'):
+            db.session.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT MAX(id) FROM {table}))"))
+    bump_table_versions(db.session.connection(), TRACKED_TABLES)
+    publish_reset(db.session.connection(), TRACKED_TABLES)
+    db.session.commit()
+    rebuild_counters()
+    echo(f'done in {time.perf_counter() - started:.1f}s')
+    return counts
+
+
+@click.command('generate-data')
+@click.option('--donors', default=10000, show_default=True, help='Number of donors; other tables scale from it.')
+@click.option('--patients', type=int, help='Defaults to donors / 4.')
+@click.option('--requests', type=int, help='Defaults to donors / 2.')
+@click.option('--inventory', type=int, help='Defaults to donors / 20.')
+@click.option('--mean-donations', default=2.5, show_default=True, help='Average donation records per donor.')
+@click.option('--history-years', default=5, show_default=True)
+@click.option('--seed', default=42, show_default=True)
+@click.option('--chunk-size', default=5000, show_default=True, help='Rows per bulk insert transaction.')
+@with_appcontext
+def generate_command(donors, patients, requests, inventory, mean_donations, history_years, seed, chunk_size):
+    """Bulk-insert a reproducible synthetic data set."""
+    counts = generate(donors=donors, patients=patients, requests=requests, inventory=inventory,
+                      mean_donations=mean_donations, seed=seed, history_years=history_years,
+                      chunk_size=chunk_size, echo=click.echo)
+    for table, count in counts.items():
+        click.echo(f'{table}: {count}')
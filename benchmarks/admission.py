@@ -0,0 +1,214 @@
+"""Admission control under load: Critical request latency while bulk reads triple.
+
+Serves the app over HTTP from a fixed pool of --threads request threads (as a
+gunicorn gthread worker does) and runs three kinds of clients against it for
+--duration seconds per phase:
+
+- one critical client creating a Critical request every --critical-interval seconds
+- one dashboard client polling /api/dashboard-stats and single-row reads
+- --bulk-clients clients paging through /api/donation-records and running
+  substring scans back to back; on 429 they retry after 100 ms, ignoring
+  Retry-After, so the pressure stays on
+
+Each phase runs with --bulk-clients and then three times as many, first with
+admission control off and then on. Reports p50/p95/p99 per client kind and
+phase, bulk requests shed, and the admission gauges, and exits 1 unless
+Critical p99 with tripled bulk traffic stays within --max-p99-ratio of its
+baseline with admission control on:
+
+    python -m benchmarks.admission --donors 20000 --bulk-clients 4 --duration 20 --output admission.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+from benchmarks.harness import BLOOD_GROUPS, HttpClient, build_app, git_revision, summarize
+
+BULK_RETRY_SECONDS = 0.1
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """Werkzeug's server with connections handled on a fixed pool of threads, like gunicorn's gthread worker."""
+
+    def __init__(self, app, threads):
+        super().__init__('127.0.0.1', 0, app, handler=QuietHandler)
+        self.executor = ThreadPoolExecutor(threads)
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def run_phase(base_url, bulk_clients, duration, critical_interval, max_ids, seed):
+    latencies = defaultdict(list)
+    statuses = defaultdict(lambda: defaultdict(int))
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def record(kind, started, status):
+        with lock:
+            latencies[kind].append(time.perf_counter() - started)
+            statuses[kind][status] += 1
+
+    def critical():
+        client, rng = HttpClient(base_url), random.Random(seed)
+        next_at = time.perf_counter()
+        while next_at < deadline:
+            time.sleep(max(next_at - time.perf_counter(), 0))
+            started = time.perf_counter()
+            record('critical', started, client.request('POST', '/api/requests', {
+                'patient_id': rng.randint(1, max_ids['patients']), 'patient_name': 'Admission Bench',
+                'blood_group': rng.choice(BLOOD_GROUPS), 'units_requested': 2, 'priority': 'Critical',
+                'status': 'Pending'}))
+            next_at += critical_interval
+
+    def dashboard():
+        client, rng = HttpClient(base_url), random.Random(seed + 1)
+        while time.perf_counter() < deadline:
+            path = (f'/api/dashboard-stats?n={rng.random()}' if rng.random() < 0.5
+                    else f'/api/donors/{rng.randint(1, max_ids["donors"])}')
+            started = time.perf_counter()
+            record('dashboard', started, client.request('GET', path, None))
+            time.sleep(0.05)
+
+    def bulk(index):
+        client, rng = HttpClient(base_url), random.Random(seed + 100 + index)
+        while time.perf_counter() < deadline:
+            path = (f'/api/donation-records?limit=1000&q={rng.choice("xyz")}{rng.choice("aeiou")}'
+                    if rng.random() < 0.3 else
+                    f'/api/donation-records?limit=1000&after_id={rng.randint(0, max_ids["donation_records"])}')
+            started = time.perf_counter()
+            status = client.request('GET', path, None)
+            record('bulk', started, status)
+            if status == 429:
+                time.sleep(BULK_RETRY_SECONDS)
+
+    threads = [threading.Thread(target=critical), threading.Thread(target=dashboard)]
+    threads += [threading.Thread(target=bulk, args=(index,)) for index in range(bulk_clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    report = {}
+    for kind, values in latencies.items():
+        errors = sum(count for status, count in statuses[kind].items() if status >= 400 and status != 429)
+        report[kind] = {**summarize(values, errors, elapsed),
+                        'statuses': {str(status): count for status, count in sorted(statuses[kind].items())}}
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Database to use (default: a temporary SQLite file).')
+    parser.add_argument('--donors', type=int, default=20000, help='Synthetic data scale (0 to skip generation).')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--threads', type=int, default=4, help='Request threads of the server.')
+    parser.add_argument('--bulk-clients', type=int, default=4, help='Bulk clients in the baseline phase.')
+    parser.add_argument('--critical-interval', type=float, default=0.1, help='Seconds between Critical requests.')
+    parser.add_argument('--duration', type=float, default=20.0, help='Seconds per phase.')
+    parser.add_argument('--max-p99-ratio', type=float, default=1.5,
+                        help='Allowed growth of Critical p99 when bulk traffic triples, with admission on.')
+    parser.add_argument('--output', help='Write the JSON results to this file.')
+    args = parser.parse_args(argv)
+
+    database_url = args.database_url
+    if not database_url:
+        handle, path = tempfile.mkstemp(suffix='.db', prefix='bbms-admission-')
+        os.close(handle)
+        database_url = f'sqlite:///{path}'
+    os.environ['WEB_THREADS'] = str(args.threads)
+    base_app = build_app(database_url)
+
+    from main import create_app
+    from backend.database import db
+    from backend.metrics import metrics
+    from backend.models import DonationRecord, Donor, Patient
+
+    if args.donors:
+        from backend.synthetic import generate
+        print(f'Generating {args.donors} donors...', file=sys.stderr)
+        with base_app.app_context():
+            generate(donors=args.donors, seed=args.seed, echo=lambda m: print(m, file=sys.stderr))
+    with base_app.app_context():
+        max_ids = {model.__tablename__: db.session.query(db.func.max(model.id)).scalar() or 1
+                   for model in (Donor, Patient, DonationRecord)}
+
+    results = {}
+    for mode, enabled in (('admission_off', False), ('admission_on', True)):
+        app = create_app({'ADMISSION_ENABLED': enabled})
+        server = PooledWSGIServer(app, args.threads)
+        serving = threading.Thread(target=server.serve_forever, daemon=True)
+        serving.start()
+        base_url = f'http://127.0.0.1:{server.server_port}'
+        metrics.reset()
+        results[mode] = {}
+        for phase, clients in (('baseline', args.bulk_clients), ('bulk_tripled', args.bulk_clients * 3)):
+            print(f'{mode}: {phase} with {clients} bulk clients for {args.duration}s...', file=sys.stderr)
+            results[mode][phase] = run_phase(base_url, clients, args.duration, args.critical_interval, max_ids,
+                                             args.seed)
+        admission = app.extensions.get('admission')
+        if admission is not None:
+            results[mode]['limits'] = admission.stats()
+        server.shutdown()
+        server.executor.shutdown()
+
+    def critical_p99(mode, phase):
+        return results[mode][phase]['critical']['p99_ms']
+
+    ratio = round(critical_p99('admission_on', 'bulk_tripled') / critical_p99('admission_on', 'baseline'), 2)
+    critical_failed = sum(results['admission_on'][phase]['critical']['errors'] for phase in ('baseline', 'bulk_tripled'))
+    passed = ratio <= args.max_p99_ratio and critical_failed == 0
+    report = {
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'target': database_url.split('@')[-1],
+        'threads': args.threads,
+        'bulk_clients': {'baseline': args.bulk_clients, 'bulk_tripled': args.bulk_clients * 3},
+        'results': results,
+        'critical_p99_ratio': {
+            'admission_off': round(critical_p99('admission_off', 'bulk_tripled')
+                                   / critical_p99('admission_off', 'baseline'), 2),
+            'admission_on': ratio,
+        },
+        'passed': passed,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(text + '\n')
+    print(text)
+    if not passed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
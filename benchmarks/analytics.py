@@ -0,0 +1,129 @@
+"""Benchmark for /api/analytics.
+
+Times a matrix of metric x bucket x group_by queries over a multi-year window,
+both through run_analytics directly and through the endpoint with the response
+cache cleared before every call, and reports p50/p95/max latency per query as
+JSON:
+
+    python -m benchmarks.analytics --donors 200000 --years 5 --output analytics.json
+
+Reuse an already populated database with --database-url and --donors 0.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from benchmarks.harness import build_app, git_revision, summarize
+
+QUERIES = [
+    ('donations', 'month', None, {}),
+    ('donations', 'week', 'blood_group', {}),
+    ('donations', 'day', None, {}),
+    ('donations', 'month', 'location', {}),
+    ('donations', 'week', None, {'blood_group': 'O-'}),
+    ('requests', 'month', 'status', {}),
+    ('requests', 'day', 'priority', {}),
+    ('requests', 'week', 'blood_group', {'priority': 'Critical'}),
+    ('requests', 'month', 'location', {}),
+]
+
+
+def time_calls(call, repeat):
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        began = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - began)
+    summary = summarize(latencies, 0, time.perf_counter() - started)
+    return {key: summary[key] for key in ('p50_ms', 'p95_ms', 'max_ms')}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Database to query (default: a temporary SQLite file).')
+    parser.add_argument('--donors', type=int, default=100000, help='Synthetic data scale (0 to skip generation).')
+    parser.add_argument('--years', type=int, default=5, help='History to generate and to query over.')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=10, help='Timed runs per query.')
+    parser.add_argument('--output', help='Write the JSON results to this file.')
+    args = parser.parse_args(argv)
+
+    database_url = args.database_url
+    if not database_url:
+        handle, path = tempfile.mkstemp(suffix='.db', prefix='bbms-analytics-')
+        os.close(handle)
+        database_url = f'sqlite:///{path}'
+    app = build_app(database_url)
+    client = app.test_client()
+
+    with app.app_context():
+        from backend.analytics import run_analytics
+        from backend.cache import response_cache
+        from backend.database import db
+        from backend.models import DonationRecord, Request
+        from backend.synthetic import generate
+
+        if args.donors:
+            print(f'Generating {args.years} years of synthetic data for {args.donors} donors...', file=sys.stderr)
+            generate(donors=args.donors, seed=args.seed, history_years=args.years,
+                     echo=lambda m: print(m, file=sys.stderr))
+        rows = {
+            'donation_records': db.session.query(db.func.count(DonationRecord.id)).scalar(),
+            'requests': db.session.query(db.func.count(Request.id)).scalar(),
+        }
+        end = date.today()
+        start = end - timedelta(days=365 * args.years)
+
+        results = []
+        for metric, bucket, group_by, filters in QUERIES:
+            params = {'metric': metric, 'bucket': bucket, 'date_from': start.isoformat(),
+                      'date_to': end.isoformat(), **({'group_by': group_by} if group_by else {}), **filters}
+            print(f'Timing {params}...', file=sys.stderr)
+
+            def direct():
+                run_analytics(metric, bucket, group_by, start, end, filters)
+                db.session.rollback()
+
+            def endpoint():
+                response_cache.clear()
+                response = client.get('/api/analytics', query_string=params)
+                assert response.status_code == 200, response.get_data(as_text=True)
+
+            result = run_analytics(metric, bucket, group_by, start, end, filters)
+            db.session.rollback()
+            results.append({
+                'metric': metric,
+                'bucket': bucket,
+                'group_by': group_by,
+                'filters': filters,
+                'buckets': len(result['buckets']),
+                'series': len(result['series']),
+                'direct': time_calls(direct, args.repeat),
+                'endpoint': time_calls(endpoint, args.repeat),
+            })
+
+    report = {
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'target': database_url.split('@')[-1],
+        'rows': rows,
+        'window': {'date_from': start.isoformat(), 'date_to': end.isoformat()},
+        'queries': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(text + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
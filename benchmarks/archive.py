@@ -0,0 +1,169 @@
+"""Hot-path latency with years of history, before and after cold archival.
+
+Generates --years of donation and request history, times the hot endpoints
+(list pages, substring search, dashboard, recent analytics) and a set of
+cold queries whose date range reaches back into old months, then archives
+everything older than --after-months to compressed files and times both sets
+again. The cold queries must return the same bodies before and after
+archival, and the dashboard counters must still match; exits 1 otherwise:
+
+    python -m benchmarks.archive --donors 100000 --years 5 --after-months 12 --output archive.json
+
+Table sizes are reported as the SQLite file size after VACUUM, or the
+PostgreSQL relation sizes of the two archived tables.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+
+from benchmarks.analytics import time_calls
+from benchmarks.harness import build_app, git_revision
+
+
+def hot_queries(today):
+    recent = (today - timedelta(days=30)).isoformat()
+    year_ago = (today - timedelta(days=365)).isoformat()
+    return {
+        'donations_first_page': '/api/donation-records?limit=100',
+        'donations_last_30_days': f'/api/donation-records?limit=100&date_from={recent}',
+        'donations_substring': '/api/donation-records?limit=100&q=zzz',
+        'requests_first_page': '/api/requests?limit=100',
+        'requests_pending': '/api/requests?limit=100&status=Pending',
+        'requests_substring': '/api/requests?limit=100&q=zzz',
+        'dashboard': '/api/dashboard-stats',
+        'analytics_last_year': f'/api/analytics?metric=donations&date_from={year_ago}&group_by=blood_group',
+    }
+
+
+def cold_queries(today, years):
+    start = date(today.year - years + 1, 3, 1)
+    first_day = today - timedelta(days=365 * years)
+    return {
+        'donations_one_old_month': f'/api/donation-records?limit=100&date_from={start}&date_to={start.replace(day=31)}',
+        'requests_old_year_fulfilled': f'/api/requests?limit=100&status=Fulfilled&date_from={start}'
+                                       f'&date_to={start.replace(year=start.year + 1)}',
+        'analytics_all_years': f'/api/analytics?metric=requests&date_from={first_day}&group_by=priority',
+        'analytics_all_years_by_location': f'/api/analytics?metric=donations&date_from={first_day}'
+                                           '&group_by=location',
+    }
+
+
+def table_bytes(db, database_url):
+    if db.engine.dialect.name == 'sqlite':
+        with db.engine.connect() as connection:
+            connection.exec_driver_sql('VACUUM')
+        return os.path.getsize(db.engine.url.database)
+    return db.session.execute(db.text(
+        "SELECT pg_total_relation_size('donation_records') + pg_total_relation_size('requests')")).scalar()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Database to use (default: a temporary SQLite file).')
+    parser.add_argument('--donors', type=int, default=100000, help='Synthetic data scale (0 to skip generation).')
+    parser.add_argument('--years', type=int, default=5, help='Years of generated history.')
+    parser.add_argument('--after-months', type=int, default=12, help='Full months kept hot.')
+    parser.add_argument('--archive-dir', help='Where partition files go (default: a temporary directory).')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=30, help='Timed runs per query.')
+    parser.add_argument('--output', help='Write the JSON results to this file.')
+    args = parser.parse_args(argv)
+
+    database_url = args.database_url
+    if not database_url:
+        handle, path = tempfile.mkstemp(suffix='.db', prefix='bbms-archive-')
+        os.close(handle)
+        database_url = f'sqlite:///{path}'
+    archive_dir = args.archive_dir or tempfile.mkdtemp(prefix='bbms-archive-')
+    app = build_app(database_url)
+    app.config['ARCHIVE_DIR'] = archive_dir
+    client = app.test_client()
+    today = date.today()
+
+    from backend.archive import archive_due
+    from backend.cache import response_cache
+    from backend.database import db
+    from backend.models import DonationRecord, Request
+    from backend.stats import counter_drift
+
+    def timed(paths):
+        bodies, latency = {}, {}
+        for name, path in paths.items():
+            def call():
+                response_cache.clear()
+                response = client.get(path)
+                assert response.status_code == 200, response.get_data(as_text=True)
+                bodies[name] = response.get_json()
+            latency[name] = time_calls(call, args.repeat)
+        return bodies, latency
+
+    def rows():
+        return {model.__tablename__: db.session.query(db.func.count(model.id)).scalar()
+                for model in (DonationRecord, Request)}
+
+    with app.app_context():
+        if args.donors:
+            print(f'Generating {args.donors} donors with {args.years} years of history...', file=sys.stderr)
+            from backend.synthetic import generate
+            generate(donors=args.donors, history_years=args.years, seed=args.seed,
+                     echo=lambda m: print(m, file=sys.stderr))
+        rows_before = rows()
+        bytes_before = table_bytes(db, database_url)
+
+    print('Timing with all history hot...', file=sys.stderr)
+    _, hot_before = timed(hot_queries(today))
+    cold_bodies_before, cold_before = timed(cold_queries(today, args.years))
+
+    print(f'Archiving months older than {args.after_months} full months...', file=sys.stderr)
+    with app.app_context():
+        started = datetime.utcnow()
+        partitions = archive_due(args.after_months)
+        archive_seconds = round((datetime.utcnow() - started).total_seconds(), 1)
+        archived = {'partitions': len(partitions), 'rows': sum(partition.rows for partition in partitions),
+                    'bytes': sum(partition.bytes for partition in partitions), 'seconds': archive_seconds}
+        rows_after = rows()
+        bytes_after = table_bytes(db, database_url)
+        drift = counter_drift()
+
+    print('Timing with old months archived...', file=sys.stderr)
+    _, hot_after = timed(hot_queries(today))
+    cold_bodies_after, cold_after = timed(cold_queries(today, args.years))
+    mismatches = sorted(name for name in cold_bodies_before if cold_bodies_before[name] != cold_bodies_after[name])
+
+    passed = not mismatches and not drift
+    report = {
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'target': database_url.split('@')[-1],
+        'years': args.years,
+        'after_months': args.after_months,
+        'hot_rows': {'before': rows_before, 'after': rows_after},
+        'database_bytes': {'before': bytes_before, 'after': bytes_after},
+        'archived': archived,
+        'hot_queries': {name: {'all_hot': hot_before[name], 'archived': hot_after[name]} for name in hot_before},
+        'cold_queries': {name: {'all_hot': cold_before[name], 'archived': cold_after[name]} for name in cold_before},
+        'cold_mismatches': mismatches,
+        'counter_drift': len(drift),
+        'passed': passed,
+    }
+    if not args.archive_dir:
+        shutil.rmtree(archive_dir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(text + '\n')
+    print(text)
+    if not passed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
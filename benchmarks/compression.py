@@ -0,0 +1,175 @@
+"""Bytes on the wire and time-to-dashboard, before and after compression and hashed assets.
+
+Replays what a browser fetches to show the dashboard (the page, its script,
+then /api/dashboard-stats) against the in-process app, on a first visit and on
+a repeat visit with a warm browser cache:
+
+- before: uncompressed responses, ``/index.html`` and ``/scripts.js`` served as
+  plain static files (revalidated on every visit)
+- after: negotiated gzip or brotli, the page revalidated and the content-hashed
+  script served from the browser cache without a request
+
+Time-to-dashboard is modelled for a slow link: every request in the chain costs
+one round trip (--rtt-ms) plus its bytes at --bandwidth-kbps, plus the measured
+server time. It also reports the size of each list page (limit=1000) and of a
+full export per encoding:
+
+    python -m benchmarks.compression --donors 10000 --rtt-ms 300 --bandwidth-kbps 256 --output compression.json
+"""
+import argparse
+import gzip
+import json
+import os
+import platform
+import re
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from backend.compression import brotli
+from benchmarks.harness import build_app, git_revision, LIST_ENDPOINTS
+
+SCENARIOS = (
+    ('before', None),
+    ('after, gzip', 'gzip'),
+    ('after, brotli', 'gzip, deflate, br'),
+)
+
+
+def wire_bytes(response):
+    """Body plus status line and headers, as sent over HTTP/1.1."""
+    head = len(f'HTTP/1.1 {response.status}\r\n') + sum(len(f'{name}: {value}\r\n') for name, value in response.headers)
+    return head + 2 + len(response.data)
+
+
+def decoded_body(response):
+    encoding = response.headers.get('Content-Encoding')
+    if encoding == 'gzip':
+        return gzip.decompress(response.data)
+    if encoding == 'br':
+        return brotli.decompress(response.data)
+    return response.data
+
+
+def fetch(client, path, headers):
+    started = time.perf_counter()
+    response = client.get(path, headers=headers)
+    return response, (time.perf_counter() - started) * 1000
+
+
+def page_load(client, accept_encoding, browser_cache, link):
+    """Fetch the dashboard's request chain; ``browser_cache`` maps paths to validators and is updated."""
+    compressed = accept_encoding is not None
+    headers = {'Accept-Encoding': accept_encoding} if compressed else {}
+    requests, total_bytes, total_ms = [], 0, 0.0
+
+    def get(path):
+        nonlocal total_bytes, total_ms
+        request_headers = dict(headers)
+        validator = browser_cache.get(path)
+        if validator and validator.get('immutable'):
+            requests.append({'path': path, 'status': 'browser cache', 'bytes': 0, 'server_ms': 0.0})
+            return validator['body']
+        if validator and validator.get('etag'):
+            request_headers['If-None-Match'] = validator['etag']
+        if validator and validator.get('last_modified'):
+            request_headers['If-Modified-Since'] = validator['last_modified']
+        response, server_ms = fetch(client, path, request_headers)
+        size = wire_bytes(response)
+        requests.append({'path': path, 'status': response.status_code, 'bytes': size,
+                         'server_ms': round(server_ms, 2)})
+        total_bytes += size
+        total_ms += server_ms + link['rtt_ms'] + size * 8 / link['bandwidth_kbps']
+        if response.status_code == 304:
+            return validator['body']
+        body = decoded_body(response)
+        browser_cache[path] = {'etag': response.headers.get('ETag'),
+                               'last_modified': response.headers.get('Last-Modified'),
+                               'immutable': 'immutable' in response.headers.get('Cache-Control', ''), 'body': body}
+        return body
+
+    html = get('/' if compressed else '/index.html').decode()
+    script = re.search(r'<script src="([^"]+)"></script>\s*</body>', html).group(1)
+    get(script if script.startswith('/') else '/' + script)
+    get('/api/dashboard-stats')
+    return {'requests': requests, 'bytes': total_bytes, 'time_to_dashboard_ms': round(total_ms, 1)}
+
+
+def payload_sizes(client, app, response_cache):
+    """Body size and server time of each list page (limit=1000) and a full donor export, per encoding."""
+    paths = [f'{path}?limit=1000' for path in LIST_ENDPOINTS] + ['/api/export/donors', '/api/export/donors?format=csv']
+    rows = []
+    for path in paths:
+        row = {'path': path}
+        for name, accept_encoding in (('identity', None), ('gzip', 'gzip'), ('br', 'br')):
+            app.config['COMPRESSION_ENABLED'] = accept_encoding is not None
+            response_cache.clear()
+            response, server_ms = fetch(client, path, {'Accept-Encoding': accept_encoding} if accept_encoding else {})
+            row[name] = {'bytes': len(response.data), 'server_ms': round(server_ms, 1)}
+        row['gzip_ratio'] = round(row['identity']['bytes'] / row['gzip']['bytes'], 1)
+        row['br_ratio'] = round(row['identity']['bytes'] / row['br']['bytes'], 1)
+        rows.append(row)
+    app.config['COMPRESSION_ENABLED'] = True
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Database to read (default: a temporary SQLite file).')
+    parser.add_argument('--donors', type=int, default=10000, help='Synthetic data scale (0 to skip generation).')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--rtt-ms', type=float, default=300, help='Round trip time of the modelled link.')
+    parser.add_argument('--bandwidth-kbps', type=float, default=256, help='Bandwidth of the modelled link.')
+    parser.add_argument('--output', help='Write the JSON results to this file.')
+    args = parser.parse_args(argv)
+
+    database_url = args.database_url
+    if not database_url:
+        handle, path = tempfile.mkstemp(suffix='.db', prefix='bbms-compression-')
+        os.close(handle)
+        database_url = f'sqlite:///{path}'
+    app = build_app(database_url)
+
+    with app.app_context():
+        from backend.synthetic import generate
+        if args.donors:
+            print(f'Generating synthetic data for {args.donors} donors...', file=sys.stderr)
+            generate(donors=args.donors, seed=args.seed)
+
+    from backend.cache import response_cache
+    client = app.test_client()
+    # What warm_up does in every worker: build the asset manifest before the first visitor
+    client.get('/')
+    link = {'rtt_ms': args.rtt_ms, 'bandwidth_kbps': args.bandwidth_kbps}
+    page_loads = []
+    for name, accept_encoding in SCENARIOS:
+        if accept_encoding and 'br' in accept_encoding and brotli is None:
+            continue
+        app.config['COMPRESSION_ENABLED'] = accept_encoding is not None
+        response_cache.clear()
+        browser_cache = {}
+        first = page_load(client, accept_encoding, browser_cache, link)
+        repeat = page_load(client, accept_encoding, browser_cache, link)
+        page_loads.append({'scenario': name, 'first_visit': first, 'repeat_visit': repeat})
+    app.config['COMPRESSION_ENABLED'] = True
+
+    report = {
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'target': database_url.split('@')[-1],
+        'link': link,
+        'page_loads': page_loads,
+        'payloads': payload_sizes(client, app, response_cache),
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(text + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""Concurrent write stress test: proves the write path loses no updates and creates no duplicates.
+
+Worker threads hammer one inventory lot and one create endpoint through the
+in-process app, all released at once by a barrier:
+
+- naive: GET the lot, PUT ``units_available - 1`` without If-Match (the old
+  read-modify-write client; lost updates are expected and reported)
+- if-match: the same, but PUT with If-Match and re-read and retry on 412
+- delta: PUT ``{"units_delta": -1}``, applied in SQL
+- idempotency: every worker POSTs the same donation records with the same
+  Idempotency-Keys, as a client retrying on timeouts would
+
+A lost update is a successful decrement that is missing from the final stock.
+The run exits 1 if the if-match or delta scenarios lose an update, if an
+idempotency key creates more than one row, or if the dashboard counters drift:
+
+    python -m benchmarks.concurrency --workers 8 --iterations 50 --output concurrency.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import date, datetime
+
+from benchmarks.harness import build_app, git_revision
+
+MAX_RETRIES = 50
+
+
+def run_workers(workers, target):
+    """Run ``target(worker_id, client)`` on ``workers`` threads released together; returns summed Counters."""
+    barrier = threading.Barrier(workers)
+    results = []
+    lock = threading.Lock()
+
+    def run(worker_id):
+        client = target.app.test_client()
+        barrier.wait()
+        outcome = target(worker_id, client)
+        with lock:
+            results.append(outcome)
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(workers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    total = Counter()
+    for outcome in results:
+        total.update(outcome)
+    return total, time.perf_counter() - started
+
+
+class DecrementScenario:
+    """Each worker takes ``iterations`` single units from one lot in the given ``mode``."""
+
+    def __init__(self, app, lot_id, mode, iterations):
+        self.app = app
+        self.path = f'/api/inventory/{lot_id}'
+        self.mode = mode
+        self.iterations = iterations
+
+    def __call__(self, worker_id, client):
+        outcome = Counter()
+        for _ in range(self.iterations):
+            if self.mode == 'delta':
+                self._count(outcome, client.put(self.path, json={'units_delta': -1}).status_code)
+                continue
+            for _ in range(MAX_RETRIES):
+                current = client.get(self.path)
+                units = current.get_json()['inventory']['units_available']
+                headers = {'If-Match': current.headers['ETag']} if self.mode == 'if-match' else {}
+                status = client.put(self.path, json={'units_available': units - 1}, headers=headers).status_code
+                if status == 412:
+                    outcome['retries'] += 1
+                    continue
+                self._count(outcome, status)
+                break
+            else:
+                outcome['gave_up'] += 1
+        return outcome
+
+    @staticmethod
+    def _count(outcome, status):
+        outcome['succeeded' if status == 200 else f'status_{status}'] += 1
+
+
+class IdempotencyScenario:
+    """Every worker sends the same ``keys`` donation records, each with its own Idempotency-Key."""
+
+    def __init__(self, app, donor, keys):
+        self.app = app
+        self.body = {'donor_id': donor['id'], 'donor_name': donor['name'], 'blood_group': donor['blood_group'],
+                     'units_donated': 1, 'date_of_donation': date.today().isoformat()}
+        self.keys = keys
+
+    def __call__(self, worker_id, client):
+        outcome = Counter()
+        for key in self.keys:
+            response = client.post('/api/donation-records', json=self.body, headers={'Idempotency-Key': key})
+            replayed = response.headers.get('Idempotent-Replayed') == 'true'
+            outcome['replayed' if replayed else f'status_{response.status_code}'] += 1
+        return outcome
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Database to write to (default: a temporary SQLite file).')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--iterations', type=int, default=50, help='Decrements per worker per scenario.')
+    parser.add_argument('--keys', type=int, default=20, help='Idempotency keys each worker sends.')
+    parser.add_argument('--output', help='Write the JSON results to this file.')
+    args = parser.parse_args(argv)
+
+    database_url = args.database_url
+    if not database_url:
+        handle, path = tempfile.mkstemp(suffix='.db', prefix='bbms-concurrency-')
+        os.close(handle)
+        database_url = f'sqlite:///{path}'
+    app = build_app(database_url)
+    # Waiting on row and database locks is the point here; do not log each wait as a slow query
+    app.config['SLOW_QUERY_MS'] = float('inf')
+    client = app.test_client()
+
+    with app.app_context():
+        from backend.database import db
+        from backend.models import BloodInventory, DonationRecord
+        from backend.stats import counter_drift
+
+        def stock(lot_id):
+            db.session.expire_all()
+            return db.session.get(BloodInventory, lot_id).units_available
+
+        donor = client.post('/api/donors', json={
+            'name': 'Stress Donor', 'age': 30, 'gender': 'Other', 'blood_group': 'O+', 'contact': '555-0000',
+            'location': 'Stress City'}).get_json()['donor']
+
+        scenarios = []
+        starting_units = args.workers * args.iterations
+        for mode in ('naive', 'if-match', 'delta'):
+            lot = client.post('/api/inventory', json={
+                'blood_group': 'O+', 'units_available': starting_units, 'expiry_date': '2099-12-31'
+            }).get_json()['inventory']
+            print(f'Running {mode}...', file=sys.stderr)
+            outcome, elapsed = run_workers(args.workers, DecrementScenario(app, lot['id'], mode, args.iterations))
+            final = stock(lot['id'])
+            expected = starting_units - outcome['succeeded']
+            scenarios.append({'scenario': mode, 'starting_units': starting_units, 'final_units': final,
+                              'expected_units': expected, 'lost_updates': final - expected,
+                              'outcomes': dict(outcome), 'seconds': round(elapsed, 2)})
+
+        print('Running idempotency...', file=sys.stderr)
+        keys = [uuid.uuid4().hex for _ in range(args.keys)]
+        before = db.session.query(DonationRecord.id).filter(DonationRecord.donor_id == donor['id']).count()
+        outcome, elapsed = run_workers(args.workers, IdempotencyScenario(app, donor, keys))
+        db.session.expire_all()
+        created = db.session.query(DonationRecord.id).filter(DonationRecord.donor_id == donor['id']).count() - before
+        scenarios.append({'scenario': 'idempotency', 'requests': args.workers * args.keys, 'keys': args.keys,
+                          'rows_created': created, 'duplicates': created - args.keys, 'outcomes': dict(outcome),
+                          'seconds': round(elapsed, 2)})
+        drift = counter_drift()
+
+    by_name = {scenario['scenario']: scenario for scenario in scenarios}
+    passed = (by_name['if-match']['lost_updates'] == 0 and by_name['delta']['lost_updates'] == 0
+              and by_name['idempotency']['duplicates'] == 0 and not drift)
+    report = {
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'target': database_url.split('@')[-1],
+        'workers': args.workers,
+        'iterations': args.iterations,
+        'scenarios': scenarios,
+        'counter_drift': {f'{scope}/{key}': values for (scope, key), values in drift.items()},
+        'passed': passed,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(text + '\n')
+    print(text)
+    if not passed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,306 @@
+"""Load-test harness for the BBMS API.
+
+Drives the list, detail, dashboard and create endpoints with a weighted mix of
+operations from concurrent worker threads, then reports per-operation
+p50/p95/p99 latency, throughput, error counts and peak RSS as JSON.
+
+By default the app runs in-process against a throwaway SQLite file populated by
+the synthetic data generator:
+
+    python -m benchmarks.harness --donors 100000 --concurrency 8 --duration 30 --output results.json
+
+Point --database-url at a local PostgreSQL database to benchmark that instead,
+or use --url to drive an already running server over HTTP.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from datetime import date, datetime
+
+DEFAULT_MIX = 'list=40,detail=30,dashboard=20,create=10'
+
+LIST_ENDPOINTS = ('/api/donors', '/api/patients', '/api/inventory', '/api/requests', '/api/donation-records')
+BLOOD_GROUPS = ('A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-')
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, elapsed):
+    values = sorted(latencies)
+    return {
+        'requests': len(values),
+        'errors': errors,
+        'throughput_rps': round(len(values) / elapsed, 2) if elapsed else 0,
+        'p50_ms': round(percentile(values, 0.50) * 1000, 3) if values else None,
+        'p95_ms': round(percentile(values, 0.95) * 1000, 3) if values else None,
+        'p99_ms': round(percentile(values, 0.99) * 1000, 3) if values else None,
+        'max_ms': round(values[-1] * 1000, 3) if values else None,
+    }
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        mix[name.strip()] = float(weight)
+    unknown = set(mix) - set(OPERATIONS)
+    if unknown:
+        raise SystemExit(f"Unknown operation(s) in --mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+# Each operation returns (method, path, json body or None)
+def op_list(rng, max_ids):
+    endpoint = rng.choice(LIST_ENDPOINTS)
+    params = ['limit=100']
+    roll = rng.random()
+    if roll < 0.3:
+        params.append(f'blood_group={urllib.request.quote(rng.choice(BLOOD_GROUPS))}')
+    elif roll < 0.5 and max_ids.get(endpoint):
+        params.append(f'after_id={rng.randint(0, max_ids[endpoint])}')
+    return 'GET', f"{endpoint}?{'&'.join(params)}", None
+
+
+def op_detail(rng, max_ids):
+    endpoint = rng.choice(LIST_ENDPOINTS)
+    return 'GET', f'{endpoint}/{rng.randint(1, max(max_ids.get(endpoint, 1), 1))}', None
+
+
+def op_dashboard(rng, max_ids):
+    return 'GET', '/api/dashboard-stats', None
+
+
+def op_create(rng, max_ids):
+    kind = rng.random()
+    blood_group = rng.choice(BLOOD_GROUPS)
+    if kind < 0.4:
+        return 'POST', '/api/donors', {
+            'name': 'Bench Donor', 'age': rng.randint(18, 65), 'gender': 'Other', 'blood_group': blood_group,
+            'contact': '555-0000', 'location': 'Benchmark City'
+        }
+    if kind < 0.8:
+        return 'POST', '/api/donation-records', {
+            'donor_id': rng.randint(1, max(max_ids.get('/api/donors', 1), 1)), 'donor_name': 'Bench Donor',
+            'blood_group': blood_group, 'units_donated': 1, 'date_of_donation': date.today().isoformat()
+        }
+    return 'POST', '/api/requests', {
+        'patient_id': rng.randint(1, max(max_ids.get('/api/patients', 1), 1)), 'patient_name': 'Bench Patient',
+        'blood_group': blood_group, 'units_requested': rng.randint(1, 4), 'priority': 'Medium', 'status': 'Pending'
+    }
+
+
+OPERATIONS = {
+    'list': op_list,
+    'detail': op_detail,
+    'dashboard': op_dashboard,
+    'create': op_create,
+}
+
+
+class InProcessClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body):
+        response = self.client.open(path, method=method, json=body)
+        response.close()
+        return response.status_code
+
+
+class HttpClient:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, path, body):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                     headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(req, timeout=60) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+
+def peak_rss_kb(server_pid=None):
+    if server_pid:
+        try:
+            with open(f'/proc/{server_pid}/status') as status:
+                for line in status:
+                    if line.startswith('VmHWM:'):
+                        return int(line.split()[1])
+        except OSError:
+            return None
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss // 1024 if sys.platform == 'darwin' else maxrss
+
+
+def run_load(make_client, mix, concurrency, duration, requests_per_worker, max_ids, seed):
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration if duration else None
+
+    def worker(worker_id):
+        rng = random.Random(seed + worker_id)
+        client = make_client()
+        done = 0
+        local_latencies = defaultdict(list)
+        local_errors = defaultdict(int)
+        while True:
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            if requests_per_worker and done >= requests_per_worker:
+                break
+            name = rng.choices(names, weights)[0]
+            method, path, body = OPERATIONS[name](rng, max_ids)
+            started = time.perf_counter()
+            try:
+                status = client.request(method, path, body)
+            except Exception:
+                status = 599
+            local_latencies[name].append(time.perf_counter() - started)
+            if status >= 400 and status != 404:
+                local_errors[name] += 1
+            done += 1
+        with lock:
+            for name, values in local_latencies.items():
+                latencies[name].extend(values)
+            for name, count in local_errors.items():
+                errors[name] += count
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    operations = {name: summarize(latencies[name], errors[name], elapsed) for name in names if latencies[name]}
+    everything = [value for values in latencies.values() for value in values]
+    return {
+        'elapsed_seconds': round(elapsed, 3),
+        'overall': summarize(everything, sum(errors.values()), elapsed),
+        'operations': operations,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_app(database_url):
+    os.environ['DATABASE_URL'] = database_url
+    os.environ.setdefault('SESSION_SECRET', 'benchmark')
+    os.environ['AUTO_MIGRATE'] = 'true'
+    os.environ.pop('POPULATE_SAMPLE_DATA', None)
+    os.environ.pop('FLASK_ENV', None)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from main import app
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Database for the in-process app (default: a temporary SQLite file).')
+    parser.add_argument('--url', help='Benchmark a running server at this base URL instead of in-process.')
+    parser.add_argument('--server-pid', type=int, help='With --url, read peak RSS from this process.')
+    parser.add_argument('--donors', type=int, default=10000, help='Synthetic data scale (0 to skip generation).')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds to run (0 to use --requests).')
+    parser.add_argument('--requests', type=int, default=0, help='Requests per worker when --duration is 0.')
+    parser.add_argument('--warmup', type=int, default=20, help='Untimed requests per operation before measuring.')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Operation weights (default: {DEFAULT_MIX}).')
+    parser.add_argument('--output', help='Write the JSON results to this file.')
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    generated = None
+
+    if args.url:
+        make_client = lambda: HttpClient(args.url)  # noqa: E731
+        target = args.url
+        max_ids = {}
+        for endpoint in LIST_ENDPOINTS:
+            # Page to the end is too slow at scale; the last id of the first page is a floor
+            with urllib.request.urlopen(f"{args.url.rstrip('/')}{endpoint}?fields=id&limit=1000") as response:
+                rows = next(value for key, value in json.loads(response.read()).items() if isinstance(value, list))
+                max_ids[endpoint] = rows[-1]['id'] if rows else 1
+    else:
+        database_url = args.database_url
+        if not database_url:
+            handle, path = tempfile.mkstemp(suffix='.db', prefix='bbms-bench-')
+            os.close(handle)
+            database_url = f'sqlite:///{path}'
+        app = build_app(database_url)
+        make_client = lambda: InProcessClient(app)  # noqa: E731
+        target = database_url.split('@')[-1]
+        with app.app_context():
+            from backend.database import db
+            from backend.models import API_MODELS
+            from backend.synthetic import generate
+            if args.donors:
+                print(f'Generating synthetic data for {args.donors} donors...', file=sys.stderr)
+                generated = generate(donors=args.donors, seed=args.seed, echo=lambda m: print(m, file=sys.stderr))
+            max_ids = {f'/api/{path}': db.session.query(db.func.max(model.id)).scalar() or 1
+                       for path, model in API_MODELS.items()}
+
+    if args.warmup:
+        run_load(make_client, mix, 1, 0, args.warmup * len(mix), max_ids, args.seed + 1000)
+
+    print(f'Running {args.mix} with {args.concurrency} workers...', file=sys.stderr)
+    results = run_load(make_client, mix, args.concurrency, args.duration, args.requests, max_ids, args.seed)
+    report = {
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'target': target,
+        'config': {
+            'donors': args.donors if not args.url else None,
+            'generated_rows': generated,
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'requests_per_worker': args.requests,
+            'mix': mix,
+            'seed': args.seed,
+        },
+        'peak_rss_kb': peak_rss_kb(args.server_pid if args.url else None),
+        **results,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(text + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""Inventory ledger benchmark: write path cost and point-in-time stock queries.
+
+Times the inventory write endpoints (create a lot, set its units, adjust them
+by a delta) that now also append ledger rows, then fills the ledger with
+--days of synthetic movement history and times /api/inventory/stock at random
+past times twice: with no snapshots, when every query sums the ledger from the
+beginning, and after taking a snapshot every --snapshot-seconds, when it reads
+one snapshot plus the rows since. Both runs must return the same balances;
+exits 1 otherwise:
+
+    python -m benchmarks.ledger --days 365 --rows-per-day 2000 --output ledger.json
+
+Write timings without the ledger come from running the same endpoints on an
+older revision (--writes-only works on any revision with the endpoints).
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+from benchmarks.analytics import time_calls
+from benchmarks.harness import BLOOD_GROUPS, build_app, git_revision
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Database to use (default: a temporary SQLite file).')
+    parser.add_argument('--donors', type=int, default=5000, help='Synthetic data scale (0 to skip generation).')
+    parser.add_argument('--days', type=int, default=365, help='Days of synthetic ledger history.')
+    parser.add_argument('--rows-per-day', type=int, default=2000, help='Synthetic ledger rows per day.')
+    parser.add_argument('--snapshot-seconds', type=int, default=3600, help='Snapshot interval over the history.')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=200, help='Timed writes per endpoint and as-of queries per run.')
+    parser.add_argument('--writes-only', action='store_true', help='Only time the write endpoints.')
+    parser.add_argument('--output', help='Write the JSON results to this file.')
+    args = parser.parse_args(argv)
+
+    database_url = args.database_url
+    if not database_url:
+        handle, path = tempfile.mkstemp(suffix='.db', prefix='bbms-ledger-')
+        os.close(handle)
+        database_url = f'sqlite:///{path}'
+    app = build_app(database_url)
+    client = app.test_client()
+    rng = random.Random(args.seed)
+
+    if args.donors:
+        from backend.synthetic import generate
+        print(f'Generating {args.donors} donors...', file=sys.stderr)
+        with app.app_context():
+            generate(donors=args.donors, seed=args.seed, echo=lambda m: print(m, file=sys.stderr))
+
+    print('Timing inventory writes...', file=sys.stderr)
+    expiry = (datetime.utcnow() + timedelta(days=30)).date().isoformat()
+    lots = []
+
+    def create_lot():
+        response = client.post('/api/inventory', json={
+            'blood_group': rng.choice(BLOOD_GROUPS), 'units_available': 20, 'expiry_date': expiry})
+        assert response.status_code == 201, response.get_data(as_text=True)
+        lots.append(response.get_json()['inventory']['id'])
+
+    def set_units():
+        response = client.put(f'/api/inventory/{rng.choice(lots)}', json={'units_available': rng.randint(5, 40)})
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+    def adjust_units():
+        response = client.put(f'/api/inventory/{rng.choice(lots)}', json={'units_delta': rng.choice((-1, 1))})
+        assert response.status_code in (200, 409), response.get_data(as_text=True)
+
+    writes = {
+        'create_lot': time_calls(create_lot, args.repeat),
+        'set_units': time_calls(set_units, args.repeat),
+        'adjust_units': time_calls(adjust_units, args.repeat),
+    }
+
+    report = {
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'target': database_url.split('@')[-1],
+        'writes': writes,
+    }
+    passed = True
+    if not args.writes_only:
+        from sqlalchemy import insert
+
+        from backend.cache import response_cache
+        from backend.database import db
+        from backend.ledger import ADJUSTMENT, RECEIPT, take_snapshot
+        from backend.models import InventoryLedger, InventorySnapshot
+
+        with app.app_context():
+            # History ends before the oldest real row, so the generated data's own ledger rows stay on top of it
+            end = db.session.query(db.func.min(InventoryLedger.recorded_at)).scalar() or datetime.utcnow()
+            start = end - timedelta(days=args.days)
+            print(f'Writing {args.days * args.rows_per_day} ledger rows of history...', file=sys.stderr)
+            step = timedelta(days=1) / args.rows_per_day
+            for day in range(args.days):
+                rows = []
+                for index in range(args.rows_per_day):
+                    recorded_at = start + (day * args.rows_per_day + index) * step
+                    units = rng.randint(1, 5)
+                    rows.append({'recorded_at': recorded_at, 'lot_id': 0, 'blood_group': rng.choice(BLOOD_GROUPS),
+                                 'kind': RECEIPT if index % 2 == 0 else ADJUSTMENT,
+                                 'units': units if index % 2 == 0 else -units, 'request_id': None})
+                db.session.execute(insert(InventoryLedger), rows)
+                db.session.commit()
+            ledger_rows = db.session.query(db.func.count()).select_from(InventoryLedger).scalar()
+
+        times = [start + timedelta(seconds=rng.uniform(0, (end - start).total_seconds())) for _ in range(args.repeat)]
+
+        def timed(answers_out):
+            position = iter(range(len(times)))
+
+            def query():
+                index = next(position)
+                response_cache.clear()
+                response = client.get('/api/inventory/stock', query_string={'at': times[index].isoformat()})
+                assert response.status_code == 200, response.get_data(as_text=True)
+                answers_out.append(response.get_json())
+            return time_calls(query, len(times))
+
+        print('Timing as-of queries without snapshots...', file=sys.stderr)
+        unsnapshotted = []
+        without = timed(unsnapshotted)
+
+        print(f'Taking a snapshot every {args.snapshot_seconds}s of history...', file=sys.stderr)
+        with app.app_context():
+            at = start + timedelta(seconds=args.snapshot_seconds)
+            while at < end:
+                take_snapshot(at)
+                at += timedelta(seconds=args.snapshot_seconds)
+            snapshots = db.session.query(db.func.count(db.distinct(InventorySnapshot.as_of))).scalar()
+
+        print('Timing as-of queries with snapshots...', file=sys.stderr)
+        snapshotted = []
+        with_snapshots = timed(snapshotted)
+
+        mismatches = sum(before['blood_groups'] != after['blood_groups']
+                         for before, after in zip(unsnapshotted, snapshotted))
+        passed = mismatches == 0
+        report['as_of'] = {
+            'ledger_rows': ledger_rows,
+            'snapshots': snapshots,
+            'snapshot_seconds': args.snapshot_seconds,
+            'without_snapshots': {**without, 'mean_rows_read': round(
+                sum(answer['ledger_rows'] for answer in unsnapshotted) / len(times))},
+            'with_snapshots': {**with_snapshots, 'mean_rows_read': round(
+                sum(answer['ledger_rows'] for answer in snapshotted) / len(times))},
+            'mismatches': mismatches,
+        }
+    report['passed'] = passed
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(text + '\n')
+    print(text)
+    if not passed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
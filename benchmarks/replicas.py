@@ -0,0 +1,168 @@
+"""Read replica routing check: GET reads go to replicas, writers read their own writes, bad replicas drop out.
+
+Runs the in-process app against a SQLite primary and two SQLite replica
+files, which ``flask replicas sync`` (here: the same backup copy) refreshes in
+place of streaming replication, so the replicas are stale until the next
+sync. It checks that:
+
+- GET requests from a client that has not written are served by the replicas
+- a client reads every row it just created, although no replica has it yet
+- other clients do not see the row until the replicas are synced
+- a replica whose file is destroyed is ejected without failing a request,
+  and takes reads again once it is restored and REPLICA_RETRY_SECONDS pass
+
+and reports list read latency via replicas and via the primary. Exits 1 on
+any violation:
+
+    python -m benchmarks.replicas --writes 50 --output replicas.json
+
+With --database-url and --replica-urls (PostgreSQL with streaming standbys) only
+the read split and read-your-writes checks run.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.analytics import time_calls
+from benchmarks.harness import build_app, git_revision
+
+RETRY_SECONDS = 1.0
+
+
+def _temp_sqlite(prefix):
+    handle, path = tempfile.mkstemp(suffix='.db', prefix=prefix)
+    os.close(handle)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Primary database (default: a temporary SQLite file).')
+    parser.add_argument('--replica-urls', help='Comma-separated replica URLs (default: two temporary SQLite files).')
+    parser.add_argument('--donors', type=int, default=2000, help='Synthetic data scale (0 to skip generation).')
+    parser.add_argument('--reads', type=int, default=200, help='GET requests in the read split check.')
+    parser.add_argument('--writes', type=int, default=50, help='Create-then-read rounds.')
+    parser.add_argument('--repeat', type=int, default=50, help='Timed list reads per target.')
+    parser.add_argument('--output', help='Write the JSON results to this file.')
+    args = parser.parse_args(argv)
+
+    local = not args.database_url
+    database_url = args.database_url or f'sqlite:///{_temp_sqlite("bbms-primary-")}'
+    replica_urls = args.replica_urls or ','.join(
+        f'sqlite:///{_temp_sqlite(f"bbms-replica-{index}-")}' for index in range(2))
+    os.environ['DATABASE_REPLICA_URLS'] = replica_urls
+    os.environ['REPLICA_RETRY_SECONDS'] = str(RETRY_SECONDS)
+    app = build_app(database_url)
+    replicas = app.extensions['replicas']
+    cli = app.test_cli_runner()
+
+    def sync():
+        result = cli.invoke(args=['replicas', 'sync'])
+        assert result.exit_code == 0, result.output
+
+    def routed():
+        stats = replicas.stats()
+        return {key: value for key, value in stats.items() if 'reads' in key}
+
+    if args.donors:
+        from backend.synthetic import generate
+        print(f'Generating {args.donors} donors...', file=sys.stderr)
+        with app.app_context():
+            generate(donors=args.donors, seed=42, echo=lambda m: print(m, file=sys.stderr))
+    if local:
+        sync()
+
+    checks = {}
+    reader = app.test_client()
+
+    print('Checking the read split...', file=sys.stderr)
+    before = routed()
+    # A distinct query string per request keeps the response cache out of the way
+    paths = ['/api/donors?limit=20&n=', '/api/dashboard-stats?n=', '/api/inventory?limit=20&n=',
+             '/api/requests?limit=20&n=']
+    failed = sum(reader.get(f'{paths[index % len(paths)]}{index}').status_code != 200 for index in range(args.reads))
+    after = routed()
+    replica_reads = sum(after[key] - before.get(key, 0) for key in after if key.startswith('replica_'))
+    checks['read_split'] = {'requests': args.reads, 'failed': failed, 'replica_reads': replica_reads,
+                            'routed': {key: after[key] - before.get(key, 0) for key in after},
+                            'passed': failed == 0 and replica_reads == args.reads}
+
+    print('Checking read-your-writes...', file=sys.stderr)
+    writer = app.test_client()
+    created, missing = [], 0
+    for index in range(args.writes):
+        response = writer.post('/api/donors', json={
+            'name': f'Replica Writer {index}', 'age': 30, 'gender': 'Other', 'blood_group': 'O+',
+            'contact': f'555-{index:04d}', 'location': 'Replica City'})
+        donor_id = response.get_json()['donor']['id']
+        created.append(donor_id)
+        missing += writer.get(f'/api/donors/{donor_id}').status_code != 200
+    checks['read_your_writes'] = {'writes': args.writes, 'own_reads_missing': missing, 'passed': missing == 0}
+
+    if local:
+        print('Checking that replicas serve other clients stale data until synced...', file=sys.stderr)
+        visible_before = sum(reader.get(f'/api/donors/{donor_id}').status_code == 200 for donor_id in created)
+        sync()
+        visible_after = sum(reader.get(f'/api/donors/{donor_id}').status_code == 200 for donor_id in created)
+        checks['replica_staleness'] = {'visible_before_sync': visible_before, 'visible_after_sync': visible_after,
+                                       'passed': visible_before == 0 and visible_after == len(created)}
+
+        print('Checking ejection and recovery...', file=sys.stderr)
+        victim = replicas.replicas[0]
+        open(victim.engine.url.database, 'w').close()
+        before = routed()
+        statuses = [reader.get(f'/api/donors?limit=20&eject={index}').status_code for index in range(20)]
+        after = routed()
+        ejected = not victim.up()
+        time.sleep(RETRY_SECONDS)
+        sync()
+        for index in range(20):
+            reader.get(f'/api/donors?limit=20&recover={index}')
+        recovered = routed()[f'{victim.name}_reads'] > after[f'{victim.name}_reads']
+        checks['ejection'] = {'requests': len(statuses), 'failed': sum(status != 200 for status in statuses),
+                              'ejected': ejected, 'ejections': victim.ejections, 'recovered': recovered,
+                              'routed': {key: after[key] - before.get(key, 0) for key in after},
+                              'passed': ejected and recovered and all(status == 200 for status in statuses)}
+
+    print('Timing list reads...', file=sys.stderr)
+    # A fresh write pins the writer to the primary for the timed reads
+    writer.put(f'/api/donors/{created[0]}', json={'location': 'Replica Town'})
+    from backend.cache import response_cache
+
+    def list_read(client):
+        response_cache.clear()
+        assert client.get('/api/donors?limit=100').status_code == 200
+
+    latency = {
+        'replica': time_calls(lambda: list_read(reader), args.repeat),
+        'primary_pinned': time_calls(lambda: list_read(writer), args.repeat),
+    }
+
+    passed = all(check['passed'] for check in checks.values())
+    report = {
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'target': database_url.split('@')[-1],
+        'replicas': [replica.url.split('@')[-1] for replica in replicas.replicas],
+        'checks': checks,
+        'list_latency': latency,
+        'passed': passed,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(text + '\n')
+    print(text)
+    if not passed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
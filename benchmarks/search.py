@@ -0,0 +1,134 @@
+"""Benchmark for /api/search.
+
+Times exact, misspelled, partly typed, location and phone queries against the
+donor and patient search index, both through search() directly and through the
+endpoint with the response cache cleared before every call, and reports
+p50/p95/max latency per query as JSON:
+
+    python -m benchmarks.search --donors 800000 --output search.json
+
+The default scale gives 1M searchable rows (donors plus donors / 4 patients);
+donation history and requests are not generated. Reuse an already populated
+database with --database-url and --donors 0.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.analytics import time_calls
+from benchmarks.harness import build_app, git_revision
+
+# (kind, query, extra parameters)
+QUERIES = [
+    ('exact', 'smith', {}),
+    ('exact', 'maria garcia', {}),
+    ('typo', 'jon smth', {}),
+    ('typo', 'jhon', {}),
+    ('typo', 'rodriquez', {}),
+    ('typo', 'kwame mensa', {}),
+    ('location', 'nyc', {}),
+    ('location', 'seatle', {}),
+    ('location', 'priya patel san jose', {}),
+    # Four common words that few rows share: the join walks every posting of the rarest one
+    ('sparse', 'kwame mensah nashville tn', {}),
+    ('phone', '555-0123', {}),
+    ('phone', '0123', {}),
+    ('filtered', 'ahmed', {'table': 'donors', 'blood_group': 'AB-'}),
+    ('filtered', 'yuki kim', {'table': 'patients'}),
+    ('miss', 'xqzvw', {}),
+]
+# Keystrokes of a search box, each sent as the user types
+AS_YOU_TYPE = ['p', 'pr', 'pri', 'priy', 'priya', 'priya ', 'priya p', 'priya pa', 'priya pat']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Database to query (default: a temporary SQLite file).')
+    parser.add_argument('--donors', type=int, default=800000, help='Synthetic data scale (0 to skip generation).')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=20, help='Timed runs per query.')
+    parser.add_argument('--output', help='Write the JSON results to this file.')
+    args = parser.parse_args(argv)
+
+    database_url = args.database_url
+    if not database_url:
+        handle, path = tempfile.mkstemp(suffix='.db', prefix='bbms-search-')
+        os.close(handle)
+        database_url = f'sqlite:///{path}'
+    app = build_app(database_url)
+    client = app.test_client()
+
+    with app.app_context():
+        from backend.cache import response_cache
+        from backend.database import db
+        from backend.models import Donor, Patient, SearchGram, SearchPosting, SearchTerm
+        from backend.search import search, SEARCH_TABLES
+        from backend.synthetic import generate
+
+        generation_seconds = None
+        if args.donors:
+            print(f'Generating {args.donors} donors and {args.donors // 4} patients...', file=sys.stderr)
+            started = time.perf_counter()
+            generate(donors=args.donors, requests=0, mean_donations=0, seed=args.seed,
+                     echo=lambda m: print(m, file=sys.stderr))
+            generation_seconds = round(time.perf_counter() - started, 1)
+        rows = {model.__tablename__: db.session.query(db.func.count()).select_from(model).scalar()
+                for model in (Donor, Patient, SearchPosting, SearchTerm, SearchGram)}
+
+        queries = [(kind, text, params) for kind, text, params in QUERIES]
+        queries += [('as-you-type', text, {}) for text in AS_YOU_TYPE]
+        results = []
+        for kind, text, params in queries:
+            tables = (params['table'],) if 'table' in params else tuple(SEARCH_TABLES)
+            blood_group = params.get('blood_group')
+            print(f'Timing {text!r} {params}...', file=sys.stderr)
+
+            def direct():
+                search(text, tables=tables, blood_group=blood_group, limit=args.limit)
+                db.session.rollback()
+
+            def endpoint():
+                response_cache.clear()
+                response = client.get('/api/search', query_string={'q': text, 'limit': args.limit, **params})
+                assert response.status_code == 200, response.get_data(as_text=True)
+
+            found = search(text, tables=tables, blood_group=blood_group, limit=args.limit)
+            db.session.rollback()
+            results.append({
+                'kind': kind,
+                'query': text,
+                'params': params,
+                'results': len(found),
+                'top': [f"{result['record']['name']} ({result['record']['location']}) {result['score']}"
+                        for result in found[:3]],
+                'direct': time_calls(direct, args.repeat),
+                'endpoint': time_calls(endpoint, args.repeat),
+            })
+
+    report = {
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'target': database_url.split('@')[-1],
+        'rows': rows,
+        'generation_seconds': generation_seconds,
+        'limit': args.limit,
+        'queries': results,
+        'worst_p95_ms': max(result['endpoint']['p95_ms'] for result in results),
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(text + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Micro-benchmark of list serialization.
+
+Compares, over the same --rows donors, the original path (ORM objects, one
+``to_dict()`` per row, stdlib ``json.dumps`` as Flask-RESTful does) with the
+column-tuple path used by the list endpoints, in records and columns format,
+with orjson and with the stdlib fallback encoder:
+
+    python -m benchmarks.serialization --rows 100000 --output serialization.json
+
+Each variant includes the query, so hydration cost is part of the comparison.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import select
+
+from benchmarks.harness import build_app, git_revision
+
+
+def best_of(repeat, call):
+    """Fastest of ``repeat`` runs in ms, and the size of the output in bytes."""
+    timings, size = [], 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        size = len(call())
+        timings.append((time.perf_counter() - started) * 1000)
+    return round(min(timings), 1), size
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Database to read (default: a temporary SQLite file).')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write the JSON results to this file.')
+    args = parser.parse_args(argv)
+
+    database_url = args.database_url
+    if not database_url:
+        handle, path = tempfile.mkstemp(suffix='.db', prefix='bbms-serialization-')
+        os.close(handle)
+        database_url = f'sqlite:///{path}'
+    app = build_app(database_url)
+
+    with app.app_context():
+        from backend import serialization
+        from backend.database import db
+        from backend.models import Donor
+        from backend.serialization import dumps, shape_rows
+        from backend.synthetic import generate
+
+        available = db.session.query(db.func.count(Donor.id)).scalar()
+        if available < args.rows:
+            print(f'Generating {args.rows - available} donors...', file=sys.stderr)
+            generate(donors=args.rows - available, patients=0, requests=0, inventory=0, mean_donations=0,
+                     seed=args.seed)
+        names = list(Donor.__table__.columns.keys())
+
+        def orm_to_dict():
+            donors = Donor.query.order_by(Donor.id).limit(args.rows).all()
+            body = json.dumps({'donors': [donor.to_dict() for donor in donors], 'next_after_id': None})
+            db.session.expunge_all()
+            return body.encode()
+
+        def column_tuples(fmt):
+            def run():
+                stmt = select(*Donor.__table__.columns).order_by(Donor.id).limit(args.rows)
+                rows = db.session.connection().execute(stmt).all()
+                return dumps({'donors': shape_rows(names, rows, fmt), 'next_after_id': None})
+            return run
+
+        # (name, call, orjson module or None for the stdlib encoder)
+        original = serialization.orjson
+        variants = [('orm + to_dict + json.dumps', orm_to_dict, original)]
+        for encoder, module in ([('orjson', original)] if original else []) + [('stdlib', None)]:
+            for fmt in ('records', 'columns'):
+                variants.append((f'column tuples, {fmt}, {encoder}', column_tuples(fmt), module))
+        results = []
+        for name, call, module in variants:
+            print(f'Timing {name}...', file=sys.stderr)
+            serialization.orjson = module
+            try:
+                elapsed, size = best_of(args.repeat, call)
+            finally:
+                serialization.orjson = original
+            results.append({'variant': name, 'ms': elapsed, 'rows_per_second': round(args.rows / elapsed * 1000),
+                            'bytes': size})
+        baseline = results[0]['ms']
+        for result in results:
+            result['speedup'] = round(baseline / result['ms'], 2)
+
+    report = {
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'target': database_url.split('@')[-1],
+        'rows': args.rows,
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(text + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""Cold start regression check.
+
+Starts fresh interpreters that import ``main`` (which builds the app), the way
+an autoscaled worker boots, and reports:
+
+- wall-clock import + create_app time (median and max over --runs)
+- the slowest modules from ``python -X importtime``
+- whether any lazily registered module was imported during startup
+
+It exits 1 when the median cold start exceeds --max-ms or a lazy module was
+imported eagerly, so it can run in CI:
+
+    python -m benchmarks.startup --max-ms 1000 --output startup.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+from benchmarks.harness import git_revision
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+import main
+elapsed = time.perf_counter() - started
+print(json.dumps({'ms': elapsed * 1000, 'modules': sorted(sys.modules)}))
+'''
+
+# Everything create_app needs besides the registry: listener modules and the expiry scheduler
+BASELINE_PROBE = '''
+import json, sys
+import backend.expiry, backend.replicas, backend.serving
+from backend.registry import LISTENER_MODULES, load_modules
+load_modules(LISTENER_MODULES)
+print(json.dumps(sorted(sys.modules)))
+'''
+
+
+def _run(env, code):
+    output = subprocess.run([sys.executable, '-c', code], env=env, cwd=ROOT, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def lazy_modules(env):
+    """Modules reachable only through the route/command registry; none should load at startup."""
+    sys.path.insert(0, ROOT)
+    from backend.registry import COMMANDS, RESOURCES
+    targets = {target.split(':')[0] for target in [target for _, target, _ in RESOURCES] + list(COMMANDS.values())}
+    return sorted(targets - set(_run(env, BASELINE_PROBE)))
+
+
+def _environment(database_url):
+    env = dict(os.environ)
+    env.update(DATABASE_URL=database_url, SESSION_SECRET='startup', PYTHONPATH=ROOT)
+    for name in ('AUTO_MIGRATE', 'POPULATE_SAMPLE_DATA', 'FLASK_ENV', 'EXPIRY_SWEEP_INTERVAL'):
+        env.pop(name, None)
+    return env
+
+
+def import_profile(env, top):
+    """(module, self ms, cumulative ms) for the ``top`` slowest imports by cumulative time."""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'], env=env, cwd=ROOT,
+                            check=True, capture_output=True, text=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((name.strip(), int(self_us) / 1000, int(cumulative_us) / 1000, len(name) - len(name.lstrip())))
+    total = sum(cumulative for _, _, cumulative, depth in rows if depth == 1)
+    slowest = sorted(rows, key=lambda row: -row[2])[:top]
+    return round(total, 1), [{'module': name, 'self_ms': round(own, 1), 'cumulative_ms': round(cumulative, 1)}
+                             for name, own, cumulative, _ in slowest]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Database the app is configured with (default: a temporary SQLite file).')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help='Slowest imports to report.')
+    parser.add_argument('--max-ms', type=float, default=1000, help='Budget for the median cold start.')
+    parser.add_argument('--output', help='Write the JSON results to this file.')
+    args = parser.parse_args(argv)
+
+    database_url = args.database_url
+    if not database_url:
+        handle, path = tempfile.mkstemp(suffix='.db', prefix='bbms-startup-')
+        os.close(handle)
+        database_url = f'sqlite:///{path}'
+    env = _environment(database_url)
+
+    runs = [_run(env, PROBE) for _ in range(args.runs)]
+    timings = [run['ms'] for run in runs]
+    lazy = lazy_modules(env)
+    eager = sorted(set(lazy) & set(runs[0]['modules']))
+    import_total, slowest = import_profile(env, args.top)
+
+    median = statistics.median(timings)
+    report = {
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'runs': args.runs,
+        'cold_start_ms': {'median': round(median, 1), 'max': round(max(timings), 1)},
+        'budget_ms': args.max_ms,
+        'importtime_total_ms': import_total,
+        'slowest_imports': slowest,
+        'modules_loaded': len(runs[0]['modules']),
+        'lazy_modules_imported_at_startup': eager,
+        'passed': median <= args.max_ms and not eager,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(text + '\n')
+    print(text)
+    if not report['passed']:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+"""Reconnect cost: delta sync against refetching every table.
+
+Generates --donors of data and brings a simulated client up to date with a
+full /api/sync, then makes --changes writes through the API while the client
+is "offline" (lot adjustments, new donations, request status changes, new
+donors and deleted donation records). On reconnect it measures:
+
+- reload: every page of the five list endpoints (limit=1000), which is what
+  the dashboard fetched after a reconnect before delta sync
+- delta: /api/sync from the client's token
+
+Bytes are counted on the wire with gzip negotiated, plus the uncompressed JSON.
+The client's copy after applying the delta must equal a fresh full sync;
+exits 1 otherwise, or if the delta is more than --max-ratio of the reload:
+
+    python -m benchmarks.sync --donors 20000 --changes 200 --output sync.json
+
+SYNC_GRACE_SECONDS is set to 0 so nothing is sent twice; with the default
+grace the writes of the last 10 seconds before a sync are sent again.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+
+from benchmarks.analytics import time_calls
+from benchmarks.compression import decoded_body, wire_bytes
+from benchmarks.harness import BLOOD_GROUPS, LIST_ENDPOINTS, build_app, git_revision
+
+GZIP = {'Accept-Encoding': 'gzip'}
+
+
+class Transfer:
+    def __init__(self):
+        self.requests = 0
+        self.wire_bytes = 0
+        self.json_bytes = 0
+
+    def get(self, client, path):
+        response = client.get(path, headers=GZIP)
+        assert response.status_code == 200, response.get_data(as_text=True)
+        body = decoded_body(response)
+        self.requests += 1
+        self.wire_bytes += wire_bytes(response)
+        self.json_bytes += len(body)
+        return json.loads(body)
+
+    def to_dict(self):
+        return {'requests': self.requests, 'wire_bytes': self.wire_bytes, 'json_bytes': self.json_bytes}
+
+
+def sync(client, copy, token=None, limit=5000):
+    """Apply every change since ``token`` to ``copy`` ({table: {id: row}}); returns (next token, Transfer)."""
+    transfer = Transfer()
+    while True:
+        query = f'/api/sync?limit={limit}' + (f'&since={token}' if token else '')
+        delta = transfer.get(client, query)
+        if delta['reset']:
+            copy.clear()
+        for table, changes in delta['tables'].items():
+            rows = copy.setdefault(table, {})
+            for row_id in changes['deleted']:
+                rows.pop(row_id, None)
+            for values in changes['rows']:
+                rows[values[0]] = values
+        token = delta['next']
+        if not delta['more']:
+            return token, transfer
+
+
+def reload(client):
+    transfer = Transfer()
+    rows = 0
+    for endpoint in LIST_ENDPOINTS:
+        after_id = None
+        while True:
+            body = transfer.get(client, f'{endpoint}?limit=1000' + (f'&after_id={after_id}' if after_id else ''))
+            rows += sum(len(value) for key, value in body.items() if isinstance(value, list))
+            after_id = body['next_after_id']
+            if after_id is None:
+                break
+    return rows, transfer
+
+
+def make_changes(client, count, rng, max_ids):
+    """``count`` writes of the kinds a clinic makes while a client is offline; returns {kind: count}."""
+    made = {}
+    today = date.today().isoformat()
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.4:
+            kind, response = 'lot_adjustment', client.put(
+                f'/api/inventory/{rng.randint(1, max_ids["blood_inventory"])}', json={'units_delta': 1})
+        elif roll < 0.6:
+            kind, response = 'new_donation', client.post('/api/donation-records', json={
+                'donor_id': rng.randint(1, max_ids['donors']), 'donor_name': 'Sync Bench',
+                'blood_group': rng.choice(BLOOD_GROUPS), 'units_donated': 1, 'date_of_donation': today})
+        elif roll < 0.8:
+            kind, response = 'request_status', client.put(
+                f'/api/requests/{rng.randint(1, max_ids["requests"])}', json={'status': 'Approved'})
+        elif roll < 0.9:
+            kind, response = 'new_donor', client.post('/api/donors', json={
+                'name': 'Sync Bench', 'age': rng.randint(18, 65), 'gender': 'Other',
+                'blood_group': rng.choice(BLOOD_GROUPS), 'contact': '555-0100', 'location': 'Field Site'})
+        else:
+            kind, response = 'deleted_donation', client.delete(
+                f'/api/donation-records/{rng.randint(1, max_ids["donation_records"])}')
+        # Random ids may hit archived or already deleted rows
+        if response.status_code < 300:
+            made[kind] = made.get(kind, 0) + 1
+    return made
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Database to use (default: a temporary SQLite file).')
+    parser.add_argument('--donors', type=int, default=20000, help='Synthetic data scale (0 to skip generation).')
+    parser.add_argument('--changes', type=int, default=200, help='Writes made while the client is offline.')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=20, help='Timed runs of each reconnect.')
+    parser.add_argument('--max-ratio', type=float, default=0.05,
+                        help='Largest allowed delta size as a fraction of the reload, on the wire.')
+    parser.add_argument('--output', help='Write the JSON results to this file.')
+    args = parser.parse_args(argv)
+
+    database_url = args.database_url
+    if not database_url:
+        handle, path = tempfile.mkstemp(suffix='.db', prefix='bbms-sync-')
+        os.close(handle)
+        database_url = f'sqlite:///{path}'
+    app = build_app(database_url)
+    app.config['SYNC_GRACE_SECONDS'] = 0
+    client = app.test_client()
+    rng = random.Random(args.seed)
+
+    from backend.database import db
+    from backend.sync import SYNCED_MODELS
+
+    with app.app_context():
+        if args.donors:
+            from backend.synthetic import generate
+            print(f'Generating {args.donors} donors...', file=sys.stderr)
+            generate(donors=args.donors, seed=args.seed, echo=lambda m: print(m, file=sys.stderr))
+        max_ids = {model.__tablename__: db.session.query(db.func.max(model.id)).scalar() or 1
+                   for model in SYNCED_MODELS}
+
+    print('Full sync of a new client...', file=sys.stderr)
+    copy = {}
+    started = time.perf_counter()
+    token, first = sync(client, copy)
+    first_ms = round((time.perf_counter() - started) * 1000, 1)
+    print(f'Making {args.changes} changes while the client is offline...', file=sys.stderr)
+    made = make_changes(client, args.changes, rng, max_ids)
+    time.sleep(0.01)
+
+    print('Reconnecting...', file=sys.stderr)
+    reload_rows, reloaded = reload(client)
+    _, delta = sync(client, copy, token)
+    # Both are read-only, so they can be repeated for latency percentiles
+    latency = {'reload': time_calls(lambda: reload(client), args.repeat),
+               'delta': time_calls(lambda: sync(client, {}, token), args.repeat)}
+    fresh = {}
+    sync(client, fresh)
+    mismatches = sorted(table for table in set(copy) | set(fresh) if copy.get(table) != fresh.get(table))
+
+    ratio = round(delta.wire_bytes / reloaded.wire_bytes, 4)
+    passed = not mismatches and ratio <= args.max_ratio
+    report = {
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'target': database_url.split('@')[-1],
+        'rows': {table: len(rows) for table, rows in fresh.items()},
+        'changes': made,
+        'first_sync': {**first.to_dict(), 'ms': first_ms},
+        'reconnect': {
+            'reload': {**reloaded.to_dict(), 'rows': reload_rows, 'latency': latency['reload']},
+            'delta': {**delta.to_dict(), 'latency': latency['delta']},
+        },
+        'delta_to_reload_wire_ratio': ratio,
+        'mismatched_tables': mismatches,
+        'passed': passed,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(text + '\n')
+    print(text)
+    if not passed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
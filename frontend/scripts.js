@@ -14,12 +14,25 @@ let currentData = {
     donations: []
 };
 
+// Server-side list state: active filters and keyset cursor per table
+const PAGE_SIZE = 100;
+// Typed donor and patient searches go to the ranked, typo-tolerant /api/search index instead
+const SEARCH_LIMIT = 100;
+const listState = {
+    donors: { endpoint: '/donors', key: 'donors', render: displayDonors, params: {}, nextAfterId: null, searchTable: 'donors' },
+    patients: { endpoint: '/patients', key: 'patients', render: displayPatients, params: {}, nextAfterId: null, searchTable: 'patients' },
+    inventory: { endpoint: '/inventory', key: 'inventory', render: displayInventory, params: {}, nextAfterId: null },
+    requests: { endpoint: '/requests', key: 'requests', render: displayRequests, params: {}, nextAfterId: null },
+    donations: { endpoint: '/donation-records', key: 'donation_records', render: displayDonations, params: {}, nextAfterId: null }
+};
+
 // Initialize the application
 document.addEventListener('DOMContentLoaded', function() {
     // Wait for the DOM to be fully loaded
     setTimeout(() => {
+        startChangeStream();
+        startOfflineCache();
         showSection('dashboard');
-        loadDashboardData();
         setupEventListeners();
     }, 100);
 });
@@ -27,19 +40,19 @@ document.addEventListener('DOMContentLoaded', function() {
 // Setup event listeners
 function setupEventListeners() {
     // Search functionality
-    document.getElementById('donor-search').addEventListener('input', filterDonors);
+    document.getElementById('donor-search').addEventListener('input', debounce(filterDonors));
     document.getElementById('donor-blood-filter').addEventListener('change', filterDonors);
     
-    document.getElementById('patient-search').addEventListener('input', filterPatients);
+    document.getElementById('patient-search').addEventListener('input', debounce(filterPatients));
     document.getElementById('patient-blood-filter').addEventListener('change', filterPatients);
     
-    document.getElementById('inventory-search').addEventListener('input', filterInventory);
+    document.getElementById('inventory-search').addEventListener('input', debounce(filterInventory));
     document.getElementById('inventory-blood-filter').addEventListener('change', filterInventory);
     
-    document.getElementById('request-search').addEventListener('input', filterRequests);
+    document.getElementById('request-search').addEventListener('input', debounce(filterRequests));
     document.getElementById('request-status-filter').addEventListener('change', filterRequests);
     
-    document.getElementById('donation-search').addEventListener('input', filterDonations);
+    document.getElementById('donation-search').addEventListener('input', debounce(filterDonations));
     document.getElementById('donation-blood-filter').addEventListener('change', filterDonations);
 }
 
@@ -79,29 +92,34 @@ function showSection(sectionName) {
         console.error('Error in showSection:', error);
     }
     
-    // Load section data
+    currentSection = sectionName;
+    
+    // Load section data; with the change stream connected, loaded sections are already current
     switch(sectionName) {
         case 'dashboard':
-            loadDashboardData();
+            if (!isLive() || dashboardStale) loadDashboardData();
             break;
         case 'donors':
-            loadDonors();
+            if (!isLive() || !listState.donors.loaded) loadDonors();
             break;
         case 'patients':
-            loadPatients();
+            if (!isLive() || !listState.patients.loaded) loadPatients();
             break;
         case 'inventory':
-            loadInventory();
+            if (!isLive() || !listState.inventory.loaded) loadInventory();
             break;
         case 'requests':
-            loadRequests();
+            if (!isLive() || !listState.requests.loaded) loadRequests();
             break;
         case 'donations':
-            loadDonations();
+            if (!isLive() || !listState.donations.loaded) loadDonations();
             break;
     }
 }
 
+// Last GET response per URL, revalidated with If-None-Match
+const etagCache = new Map();
+
 // API Functions
 async function fetchAPI(endpoint, method = 'GET', data = null) {
     try {
@@ -116,9 +134,45 @@ async function fetchAPI(endpoint, method = 'GET', data = null) {
             config.body = JSON.stringify(data);
         }
         
-        const response = await fetch(`${API_BASE}${endpoint}`, config);
+        // Creates carry an Idempotency-Key so a retry after a network error cannot add a second row
+        if (method === 'POST') {
+            // crypto.randomUUID is only available on secure (HTTPS or localhost) pages
+            config.headers['Idempotency-Key'] = window.crypto && crypto.randomUUID
+                ? crypto.randomUUID()
+                : `${Date.now()}-${Math.random().toString(36).slice(2)}${Math.random().toString(36).slice(2)}`;
+        }
+        
+        const cachedEntry = method === 'GET' ? etagCache.get(endpoint) : null;
+        if (cachedEntry) {
+            config.headers['If-None-Match'] = cachedEntry.etag;
+            config.cache = 'no-store';
+        }
+        
+        let response;
+        try {
+            response = await fetch(`${API_BASE}${endpoint}`, config);
+        } catch (networkError) {
+            networkError.offline = true;
+            if (method === 'GET') throw networkError;
+            try {
+                if (method !== 'POST') throw networkError;
+                response = await fetch(`${API_BASE}${endpoint}`, config);
+            } catch (retryError) {
+                // Still no connection: keep the write and replay it when the connection returns
+                return queueWrite(method, endpoint, data, config.headers['Idempotency-Key']);
+            }
+        }
+        if (response.status === 304 && cachedEntry) {
+            return cachedEntry.result;
+        }
+        
         const result = await response.json();
         
+        const etag = response.headers.get('ETag');
+        if (method === 'GET' && response.ok && etag) {
+            etagCache.set(endpoint, { etag, result });
+        }
+        
         if (!response.ok) {
             throw new Error(result.error || 'API request failed');
         }
@@ -126,15 +180,392 @@ async function fetchAPI(endpoint, method = 'GET', data = null) {
         return result;
     } catch (error) {
         console.error('API Error:', error);
-        showNotification(error.message, 'error');
+        // Reads without a connection fall back to the offline copy instead
+        if (!error.offline) {
+            showNotification(error.message, 'error');
+        }
         throw error;
     }
 }
 
+// Paginated list loading; filters are applied server-side
+function buildQueryString(params) {
+    const query = new URLSearchParams();
+    Object.entries(params).forEach(([name, value]) => {
+        if (value !== '' && value !== null && value !== undefined) {
+            query.set(name, value);
+        }
+    });
+    return query.toString();
+}
+
+async function loadList(type, params = listState[type].params, append = false) {
+    const state = listState[type];
+    state.params = params;
+    
+    let rows;
+    try {
+        if (state.searchTable && params.q) {
+            // Best matches first, in a single page
+            const response = await fetchAPI(`/search?${buildQueryString({
+                q: params.q, table: state.searchTable, blood_group: params.blood_group, limit: SEARCH_LIMIT
+            })}`);
+            rows = response.results.map(result => result.record);
+            state.nextAfterId = null;
+        } else {
+            const query = { ...params, limit: PAGE_SIZE };
+            if (append && state.nextAfterId) {
+                query.after_id = state.nextAfterId;
+            }
+            const response = await fetchAPI(`${state.endpoint}?${buildQueryString(query)}`);
+            rows = response[state.key];
+            state.nextAfterId = response.next_after_id;
+        }
+    } catch (error) {
+        if (!error.offline || !window.indexedDB) throw error;
+        // No connection: the same page from the offline copy
+        const page = await loadOfflinePage(type, params, append ? state.nextAfterId : null);
+        rows = page.rows;
+        state.nextAfterId = page.nextAfterId;
+    }
+    currentData[type] = append ? currentData[type].concat(rows) : rows;
+    state.loaded = true;
+    state.render(currentData[type]);
+    
+    const loadMoreBtn = document.getElementById(`${type}-load-more`);
+    if (loadMoreBtn) {
+        loadMoreBtn.classList.toggle('hidden', !state.nextAfterId);
+    }
+}
+
+async function loadMore(type) {
+    try {
+        await loadList(type, listState[type].params, true);
+    } catch (error) {
+        console.error(`Error loading more ${type}:`, error);
+    }
+}
+
+function debounce(fn, wait = 300) {
+    let timer = null;
+    return (...args) => {
+        clearTimeout(timer);
+        timer = setTimeout(() => fn(...args), wait);
+    };
+}
+
+// Live updates: committed changes arrive over server-sent events and patch currentData in place.
+// EventSource reconnects on its own and resumes from the last event id it saw.
+const TABLE_TYPES = {
+    donors: 'donors',
+    patients: 'patients',
+    blood_inventory: 'inventory',
+    requests: 'requests',
+    donation_records: 'donations'
+};
+let changeStream = null;
+let currentSection = 'dashboard';
+let dashboardStale = true;
+
+function isLive() {
+    return changeStream !== null && changeStream.readyState === EventSource.OPEN;
+}
+
+function startChangeStream() {
+    if (!window.EventSource) {
+        return;
+    }
+    changeStream = new EventSource(`${API_BASE}/stream`);
+    changeStream.addEventListener('change', event => {
+        applyChange(JSON.parse(event.data));
+        // Keep the offline copy current too
+        syncSoon();
+    });
+    changeStream.addEventListener('reset', () => {
+        // Too far behind to replay: everything reloads on next view
+        Object.values(listState).forEach(state => { state.loaded = false; });
+        dashboardStale = true;
+        refreshVisibleSection();
+        syncSoon();
+    });
+}
+
+function hasActiveFilters(params) {
+    return Object.values(params).some(value => value !== '' && value !== null && value !== undefined);
+}
+
+function applyChange(change) {
+    dashboardStale = true;
+    const type = TABLE_TYPES[change.table];
+    const state = type ? listState[type] : null;
+    if (state && change.op === 'reset') {
+        state.loaded = false;
+    } else if (state && state.loaded) {
+        const rows = currentData[type];
+        const index = rows.findIndex(row => row.id === change.row_id);
+        if (change.op === 'delete') {
+            if (index >= 0) rows.splice(index, 1);
+        } else if (index >= 0) {
+            rows[index] = change.record;
+        } else if (change.op === 'insert' && !state.nextAfterId && !hasActiveFilters(state.params)) {
+            // New rows have the highest id, so they belong at the end of a fully loaded list
+            rows.push(change.record);
+        }
+    }
+    refreshVisibleSection();
+}
+
+const refreshVisibleSection = debounce(() => {
+    if (currentSection === 'dashboard') {
+        loadDashboardData();
+        return;
+    }
+    const state = listState[currentSection];
+    if (!state) {
+        return;
+    }
+    if (state.loaded) {
+        state.render(currentData[currentSection]);
+    } else {
+        loadList(currentSection).catch(error => console.error(`Error reloading ${currentSection}:`, error));
+    }
+}, 250);
+
+function refreshAfterWrite(load) {
+    // The change stream delivers our own write too; reload only without it
+    if (!isLive()) {
+        load();
+    }
+}
+
+// Offline copy: every table is kept in IndexedDB and brought up to date with /api/sync deltas,
+// so a clinic that was offline for hours downloads only what changed meanwhile.
+// Writes made without a connection wait in an outbox and are replayed in order once it returns.
+const SYNC_DB_NAME = 'bbms';
+const SYNC_DB_VERSION = 1;
+const SYNC_PAGE_SIZE = 1000;
+// Without the change stream, poll for changes this often
+const SYNC_INTERVAL_MS = 60000;
+let syncDB = null;
+let syncRunning = null;
+
+function idbRequest(request) {
+    return new Promise((resolve, reject) => {
+        request.onsuccess = () => resolve(request.result);
+        request.onerror = () => reject(request.error);
+    });
+}
+
+function idbDone(transaction) {
+    return new Promise((resolve, reject) => {
+        transaction.oncomplete = () => resolve();
+        transaction.onerror = transaction.onabort = () => reject(transaction.error);
+    });
+}
+
+function openSyncDB() {
+    if (!syncDB) {
+        const request = indexedDB.open(SYNC_DB_NAME, SYNC_DB_VERSION);
+        request.onupgradeneeded = () => {
+            const database = request.result;
+            Object.values(TABLE_TYPES).forEach(type => database.createObjectStore(type, { keyPath: 'id' }));
+            // The sync token, under the key 'token'
+            database.createObjectStore('meta');
+            database.createObjectStore('outbox', { keyPath: 'seq', autoIncrement: true });
+        };
+        syncDB = idbRequest(request);
+    }
+    return syncDB;
+}
+
+function startOfflineCache() {
+    if (!window.indexedDB) {
+        return;
+    }
+    window.addEventListener('online', () => replayOutbox().then(syncNow));
+    window.addEventListener('offline', updateSyncStatus);
+    setInterval(() => {
+        if (!isLive()) syncNow();
+    }, SYNC_INTERVAL_MS);
+    replayOutbox().then(syncNow);
+}
+
+// Pull every change since the stored token into IndexedDB and patch the loaded lists
+async function syncNow() {
+    if (!window.indexedDB || !navigator.onLine) {
+        updateSyncStatus();
+        return;
+    }
+    if (syncRunning) {
+        return syncRunning;
+    }
+    syncRunning = (async () => {
+        const database = await openSyncDB();
+        let more = true;
+        while (more) {
+            const token = await idbRequest(database.transaction('meta').objectStore('meta').get('token'));
+            const query = buildQueryString({ since: token, limit: SYNC_PAGE_SIZE });
+            const response = await fetch(`${API_BASE}/sync?${query}`, { cache: 'no-store' });
+            if (!response.ok) {
+                throw new Error(`Sync failed with status ${response.status}`);
+            }
+            const delta = await response.json();
+            await storeDelta(database, delta);
+            // A first sync only fills the offline copy; the lists on screen came from the server
+            if (delta.since) applyDelta(delta);
+            more = delta.more;
+        }
+    })().catch(error => console.error('Error syncing offline copy:', error)).finally(() => {
+        syncRunning = null;
+        updateSyncStatus();
+    });
+    return syncRunning;
+}
+
+const syncSoon = debounce(syncNow, 2000);
+
+function storeDelta(database, delta) {
+    const stores = Object.values(TABLE_TYPES);
+    const transaction = database.transaction([...stores, 'meta'], 'readwrite');
+    if (delta.reset) {
+        // The server no longer knows what was deleted since our last sync: start over
+        stores.forEach(type => transaction.objectStore(type).clear());
+    }
+    Object.entries(delta.tables).forEach(([table, changes]) => {
+        const store = transaction.objectStore(TABLE_TYPES[table]);
+        changes.deleted.forEach(id => store.delete(id));
+        changes.rows.forEach(values => store.put(rowObject(changes.columns, values)));
+    });
+    // Saved with the rows, so a sync cut short resumes where the stored rows end
+    transaction.objectStore('meta').put(delta.next, 'token');
+    return idbDone(transaction);
+}
+
+function rowObject(columns, values) {
+    return Object.fromEntries(columns.map((name, i) => [name, values[i]]));
+}
+
+// Changes the change stream may already have applied; applying one twice is harmless
+function applyDelta(delta) {
+    if (delta.reset) {
+        Object.values(listState).forEach(state => { state.loaded = false; });
+        dashboardStale = true;
+        refreshVisibleSection();
+        return;
+    }
+    Object.entries(delta.tables).forEach(([table, changes]) => {
+        changes.deleted.forEach(id => applyChange({ table, op: 'delete', row_id: id }));
+        changes.rows.forEach(values => {
+            const record = rowObject(changes.columns, values);
+            applyChange({ table, op: 'insert', row_id: record.id, record });
+        });
+    });
+}
+
+function matchesOffline(row, params) {
+    return Object.entries(params).every(([name, value]) => {
+        if (value === '' || value === null || value === undefined) {
+            return true;
+        }
+        if (name === 'q') {
+            const needle = value.toLowerCase();
+            return Object.values(row).some(field => typeof field === 'string' && field.toLowerCase().includes(needle));
+        }
+        return String(row[name]) === String(value);
+    });
+}
+
+// One page of a list from the offline copy, filtered like the server would, in id order
+async function loadOfflinePage(type, params, afterId) {
+    const database = await openSyncDB();
+    const range = afterId ? IDBKeyRange.lowerBound(afterId, true) : null;
+    const request = database.transaction(type).objectStore(type).openCursor(range);
+    const rows = [];
+    return new Promise((resolve, reject) => {
+        request.onsuccess = () => {
+            const cursor = request.result;
+            if (!cursor) {
+                resolve({ rows, nextAfterId: null });
+            } else if (rows.length === PAGE_SIZE) {
+                resolve({ rows, nextAfterId: rows[rows.length - 1].id });
+            } else {
+                if (matchesOffline(cursor.value, params)) rows.push(cursor.value);
+                cursor.continue();
+            }
+        };
+        request.onerror = () => reject(request.error);
+    });
+}
+
+async function queueWrite(method, endpoint, data, idempotencyKey) {
+    if (!window.indexedDB) {
+        throw Object.assign(new Error('No connection'), { offline: true });
+    }
+    const database = await openSyncDB();
+    const transaction = database.transaction('outbox', 'readwrite');
+    transaction.objectStore('outbox').add({ method, endpoint, data, idempotencyKey, queuedAt: new Date().toISOString() });
+    await idbDone(transaction);
+    showNotification('No connection: saved, and will be sent when the connection returns', 'info');
+    updateSyncStatus();
+    return { queued: true };
+}
+
+// Send queued writes in order; stops at the first one the server cannot take yet
+async function replayOutbox() {
+    if (!window.indexedDB || !navigator.onLine) {
+        return;
+    }
+    const database = await openSyncDB();
+    const entries = await idbRequest(database.transaction('outbox').objectStore('outbox').getAll());
+    for (const entry of entries) {
+        const headers = { 'Content-Type': 'application/json' };
+        if (entry.idempotencyKey) {
+            // The same key as the first attempt, so a write that did reach the server is not applied twice
+            headers['Idempotency-Key'] = entry.idempotencyKey;
+        }
+        let response;
+        try {
+            response = await fetch(`${API_BASE}${entry.endpoint}`, {
+                method: entry.method,
+                headers,
+                body: entry.data ? JSON.stringify(entry.data) : undefined
+            });
+        } catch (networkError) {
+            break;
+        }
+        if (response.status === 429 || response.status >= 500) {
+            break;
+        }
+        // A replayed delete of a row that is already gone has done its job
+        if (!response.ok && !(entry.method === 'DELETE' && response.status === 404)) {
+            const result = await response.json().catch(() => ({}));
+            showNotification(`Queued change to ${entry.endpoint} was rejected: ${result.error || response.status}`, 'error');
+        }
+        const transaction = database.transaction('outbox', 'readwrite');
+        transaction.objectStore('outbox').delete(entry.seq);
+        await idbDone(transaction);
+    }
+    updateSyncStatus();
+}
+
+async function updateSyncStatus() {
+    const status = document.getElementById('sync-status');
+    if (!status || !window.indexedDB) {
+        return;
+    }
+    const database = await openSyncDB();
+    const queued = await idbRequest(database.transaction('outbox').objectStore('outbox').count());
+    const parts = [];
+    if (!navigator.onLine) parts.push('Offline');
+    if (queued) parts.push(`${queued} change${queued === 1 ? '' : 's'} waiting to send`);
+    status.textContent = parts.join(' · ');
+}
+
 // Dashboard Functions
 async function loadDashboardData() {
     try {
         const stats = await fetchAPI('/dashboard-stats');
+        dashboardStale = false;
         updateMetricCards(stats.summary_cards);
         updateCharts(stats.charts);
         updateAlerts(stats.alerts);
@@ -285,9 +716,7 @@ function updateAlerts(alerts) {
 // Donor Functions
 async function loadDonors() {
     try {
-        const response = await fetchAPI('/donors');
-        currentData.donors = response.donors;
-        displayDonors(currentData.donors);
+        await loadList('donors');
     } catch (error) {
         console.error('Error loading donors:', error);
     }
@@ -328,19 +757,10 @@ function displayDonors(donors) {
 }
 
 function filterDonors() {
-    const searchTerm = document.getElementById('donor-search').value.toLowerCase();
-    const bloodGroupFilter = document.getElementById('donor-blood-filter').value;
-    
-    const filtered = currentData.donors.filter(donor => {
-        const matchesSearch = donor.name.toLowerCase().includes(searchTerm) ||
-                            donor.contact.includes(searchTerm) ||
-                            donor.location.toLowerCase().includes(searchTerm);
-        const matchesBloodGroup = !bloodGroupFilter || donor.blood_group === bloodGroupFilter;
-        
-        return matchesSearch && matchesBloodGroup;
-    });
-    
-    displayDonors(filtered);
+    loadList('donors', {
+        q: document.getElementById('donor-search').value.trim(),
+        blood_group: document.getElementById('donor-blood-filter').value
+    }).catch(error => console.error('Error filtering donors:', error));
 }
 
 function showAddDonorForm() {
@@ -413,10 +833,10 @@ async function saveDonor(event) {
     const data = Object.fromEntries(formData.entries());
     
     try {
-        await fetchAPI('/donors', 'POST', data);
-        showNotification('Donor added successfully!', 'success');
+        const result = await fetchAPI('/donors', 'POST', data);
+        if (!result.queued) showNotification('Donor added successfully!', 'success');
         closeModal();
-        loadDonors();
+        refreshAfterWrite(loadDonors);
     } catch (error) {
         console.error('Error saving donor:', error);
     }
@@ -425,9 +845,9 @@ async function saveDonor(event) {
 async function deleteDonor(id) {
     if (confirm('Are you sure you want to delete this donor?')) {
         try {
-            await fetchAPI(`/donors/${id}`, 'DELETE');
-            showNotification('Donor deleted successfully!', 'success');
-            loadDonors();
+            const result = await fetchAPI(`/donors/${id}`, 'DELETE');
+            if (!result.queued) showNotification('Donor deleted successfully!', 'success');
+            refreshAfterWrite(loadDonors);
         } catch (error) {
             console.error('Error deleting donor:', error);
         }
@@ -437,9 +857,7 @@ async function deleteDonor(id) {
 // Patient Functions
 async function loadPatients() {
     try {
-        const response = await fetchAPI('/patients');
-        currentData.patients = response.patients;
-        displayPatients(currentData.patients);
+        await loadList('patients');
     } catch (error) {
         console.error('Error loading patients:', error);
     }
@@ -476,19 +894,10 @@ function displayPatients(patients) {
 }
 
 function filterPatients() {
-    const searchTerm = document.getElementById('patient-search').value.toLowerCase();
-    const bloodGroupFilter = document.getElementById('patient-blood-filter').value;
-    
-    const filtered = currentData.patients.filter(patient => {
-        const matchesSearch = patient.name.toLowerCase().includes(searchTerm) ||
-                            patient.contact.includes(searchTerm) ||
-                            patient.location.toLowerCase().includes(searchTerm);
-        const matchesBloodGroup = !bloodGroupFilter || patient.blood_group === bloodGroupFilter;
-        
-        return matchesSearch && matchesBloodGroup;
-    });
-    
-    displayPatients(filtered);
+    loadList('patients', {
+        q: document.getElementById('patient-search').value.trim(),
+        blood_group: document.getElementById('patient-blood-filter').value
+    }).catch(error => console.error('Error filtering patients:', error));
 }
 
 function showAddPatientForm() {
@@ -552,10 +961,10 @@ async function savePatient(event) {
     const data = Object.fromEntries(formData.entries());
     
     try {
-        await fetchAPI('/patients', 'POST', data);
-        showNotification('Patient added successfully!', 'success');
+        const result = await fetchAPI('/patients', 'POST', data);
+        if (!result.queued) showNotification('Patient added successfully!', 'success');
         closeModal();
-        loadPatients();
+        refreshAfterWrite(loadPatients);
     } catch (error) {
         console.error('Error saving patient:', error);
     }
@@ -564,9 +973,9 @@ async function savePatient(event) {
 async function deletePatient(id) {
     if (confirm('Are you sure you want to delete this patient?')) {
         try {
-            await fetchAPI(`/patients/${id}`, 'DELETE');
-            showNotification('Patient deleted successfully!', 'success');
-            loadPatients();
+            const result = await fetchAPI(`/patients/${id}`, 'DELETE');
+            if (!result.queued) showNotification('Patient deleted successfully!', 'success');
+            refreshAfterWrite(loadPatients);
         } catch (error) {
             console.error('Error deleting patient:', error);
         }
@@ -576,9 +985,7 @@ async function deletePatient(id) {
 // Inventory Functions
 async function loadInventory() {
     try {
-        const response = await fetchAPI('/inventory');
-        currentData.inventory = response.inventory;
-        displayInventory(currentData.inventory);
+        await loadList('inventory');
     } catch (error) {
         console.error('Error loading inventory:', error);
     }
@@ -599,7 +1006,10 @@ function displayInventory(inventory) {
         let statusClass = 'bg-green-500';
         let statusText = 'Good';
         
-        if (daysUntilExpiry <= 7) {
+        if (item.status === 'Discarded') {
+            statusClass = 'bg-gray-500';
+            statusText = 'Discarded';
+        } else if (daysUntilExpiry <= 7) {
             statusClass = 'bg-red-500';
             statusText = 'Expiring Soon';
         } else if (item.units_available < 10) {
@@ -630,17 +1040,10 @@ function displayInventory(inventory) {
 }
 
 function filterInventory() {
-    const searchTerm = document.getElementById('inventory-search').value.toLowerCase();
-    const bloodGroupFilter = document.getElementById('inventory-blood-filter').value;
-    
-    const filtered = currentData.inventory.filter(item => {
-        const matchesSearch = item.blood_group.toLowerCase().includes(searchTerm);
-        const matchesBloodGroup = !bloodGroupFilter || item.blood_group === bloodGroupFilter;
-        
-        return matchesSearch && matchesBloodGroup;
-    });
-    
-    displayInventory(filtered);
+    loadList('inventory', {
+        q: document.getElementById('inventory-search').value.trim(),
+        blood_group: document.getElementById('inventory-blood-filter').value
+    }).catch(error => console.error('Error filtering inventory:', error));
 }
 
 function showAddInventoryForm() {
@@ -690,10 +1093,10 @@ async function saveInventory(event) {
     const data = Object.fromEntries(formData.entries());
     
     try {
-        await fetchAPI('/inventory', 'POST', data);
-        showNotification('Blood units added successfully!', 'success');
+        const result = await fetchAPI('/inventory', 'POST', data);
+        if (!result.queued) showNotification('Blood units added successfully!', 'success');
         closeModal();
-        loadInventory();
+        refreshAfterWrite(loadInventory);
     } catch (error) {
         console.error('Error saving inventory:', error);
     }
@@ -702,9 +1105,9 @@ async function saveInventory(event) {
 async function deleteInventory(id) {
     if (confirm('Are you sure you want to delete this inventory item?')) {
         try {
-            await fetchAPI(`/inventory/${id}`, 'DELETE');
-            showNotification('Inventory item deleted successfully!', 'success');
-            loadInventory();
+            const result = await fetchAPI(`/inventory/${id}`, 'DELETE');
+            if (!result.queued) showNotification('Inventory item deleted successfully!', 'success');
+            refreshAfterWrite(loadInventory);
         } catch (error) {
             console.error('Error deleting inventory:', error);
         }
@@ -714,9 +1117,7 @@ async function deleteInventory(id) {
 // Request Functions
 async function loadRequests() {
     try {
-        const response = await fetchAPI('/requests');
-        currentData.requests = response.requests;
-        displayRequests(currentData.requests);
+        await loadList('requests');
     } catch (error) {
         console.error('Error loading requests:', error);
     }
@@ -774,18 +1175,10 @@ function displayRequests(requests) {
 }
 
 function filterRequests() {
-    const searchTerm = document.getElementById('request-search').value.toLowerCase();
-    const statusFilter = document.getElementById('request-status-filter').value;
-    
-    const filtered = currentData.requests.filter(request => {
-        const matchesSearch = request.patient_name.toLowerCase().includes(searchTerm) ||
-                            request.blood_group.toLowerCase().includes(searchTerm);
-        const matchesStatus = !statusFilter || request.status === statusFilter;
-        
-        return matchesSearch && matchesStatus;
-    });
-    
-    displayRequests(filtered);
+    loadList('requests', {
+        q: document.getElementById('request-search').value.trim(),
+        status: document.getElementById('request-status-filter').value
+    }).catch(error => console.error('Error filtering requests:', error));
 }
 
 function showAddRequestForm() {
@@ -859,10 +1252,10 @@ async function saveRequest(event) {
     const data = Object.fromEntries(formData.entries());
     
     try {
-        await fetchAPI('/requests', 'POST', data);
-        showNotification('Blood request created successfully!', 'success');
+        const result = await fetchAPI('/requests', 'POST', data);
+        if (!result.queued) showNotification('Blood request created successfully!', 'success');
         closeModal();
-        loadRequests();
+        refreshAfterWrite(loadRequests);
     } catch (error) {
         console.error('Error saving request:', error);
     }
@@ -871,9 +1264,9 @@ async function saveRequest(event) {
 async function deleteRequest(id) {
     if (confirm('Are you sure you want to delete this request?')) {
         try {
-            await fetchAPI(`/requests/${id}`, 'DELETE');
-            showNotification('Request deleted successfully!', 'success');
-            loadRequests();
+            const result = await fetchAPI(`/requests/${id}`, 'DELETE');
+            if (!result.queued) showNotification('Request deleted successfully!', 'success');
+            refreshAfterWrite(loadRequests);
         } catch (error) {
             console.error('Error deleting request:', error);
         }
@@ -883,9 +1276,7 @@ async function deleteRequest(id) {
 // Donation Functions
 async function loadDonations() {
     try {
-        const response = await fetchAPI('/donation-records');
-        currentData.donations = response.donation_records;
-        displayDonations(currentData.donations);
+        await loadList('donations');
     } catch (error) {
         console.error('Error loading donations:', error);
     }
@@ -920,18 +1311,10 @@ function displayDonations(donations) {
 }
 
 function filterDonations() {
-    const searchTerm = document.getElementById('donation-search').value.toLowerCase();
-    const bloodGroupFilter = document.getElementById('donation-blood-filter').value;
-    
-    const filtered = currentData.donations.filter(donation => {
-        const matchesSearch = donation.donor_name.toLowerCase().includes(searchTerm) ||
-                            donation.blood_group.toLowerCase().includes(searchTerm);
-        const matchesBloodGroup = !bloodGroupFilter || donation.blood_group === bloodGroupFilter;
-        
-        return matchesSearch && matchesBloodGroup;
-    });
-    
-    displayDonations(filtered);
+    loadList('donations', {
+        q: document.getElementById('donation-search').value.trim(),
+        blood_group: document.getElementById('donation-blood-filter').value
+    }).catch(error => console.error('Error filtering donations:', error));
 }
 
 function showAddDonationForm() {
@@ -991,10 +1374,10 @@ async function saveDonation(event) {
     const data = Object.fromEntries(formData.entries());
     
     try {
-        await fetchAPI('/donation-records', 'POST', data);
-        showNotification('Donation recorded successfully!', 'success');
+        const result = await fetchAPI('/donation-records', 'POST', data);
+        if (!result.queued) showNotification('Donation recorded successfully!', 'success');
         closeModal();
-        loadDonations();
+        refreshAfterWrite(loadDonations);
     } catch (error) {
         console.error('Error saving donation:', error);
     }
@@ -1003,9 +1386,9 @@ async function saveDonation(event) {
 async function deleteDonation(id) {
     if (confirm('Are you sure you want to delete this donation record?')) {
         try {
-            await fetchAPI(`/donation-records/${id}`, 'DELETE');
-            showNotification('Donation record deleted successfully!', 'success');
-            loadDonations();
+            const result = await fetchAPI(`/donation-records/${id}`, 'DELETE');
+            if (!result.queued) showNotification('Donation record deleted successfully!', 'success');
+            refreshAfterWrite(loadDonations);
         } catch (error) {
             console.error('Error deleting donation:', error);
         }
@@ -1045,52 +1428,25 @@ function showNotification(message, type = 'info') {
 }
 
 function exportToCSV(type) {
-    let data = [];
-    let filename = '';
-    
-    switch(type) {
-        case 'donors':
-            data = currentData.donors;
-            filename = 'donors.csv';
-            break;
-        case 'inventory':
-            data = currentData.inventory;
-            filename = 'inventory.csv';
-            break;
-        case 'requests':
-            data = currentData.requests;
-            filename = 'requests.csv';
-            break;
-        case 'patients':
-            data = currentData.patients;
-            filename = 'patients.csv';
-            break;
-        case 'donations':
-            data = currentData.donations;
-            filename = 'donations.csv';
-            break;
-    }
-    
-    if (data.length === 0) {
-        showNotification('No data to export', 'error');
+    // Stream the export from the server using the table's active filters
+    const exportTables = {
+        donors: 'donors',
+        inventory: 'inventory',
+        requests: 'requests',
+        patients: 'patients',
+        donations: 'donation-records'
+    };
+    const table = exportTables[type];
+    if (!table) {
+        showNotification('Unknown export type', 'error');
         return;
     }
     
-    // Convert to CSV
-    const headers = Object.keys(data[0]);
-    const csvContent = [
-        headers.join(','),
-        ...data.map(row => headers.map(header => `"${row[header] || ''}"`).join(','))
-    ].join('\\n');
-    
-    // Download file
-    const blob = new Blob([csvContent], { type: 'text/csv' });
-    const url = window.URL.createObjectURL(blob);
+    const query = buildQueryString({ ...listState[type].params, format: 'csv' });
     const a = document.createElement('a');
-    a.href = url;
-    a.download = filename;
+    a.href = `${API_BASE}/export/${table}?${query}`;
+    a.download = `${table}.csv`;
     a.click();
-    window.URL.revokeObjectURL(url);
     
-    showNotification(`${filename} downloaded successfully!`, 'success');
-}
\ No newline at end of file
+    showNotification(`${table}.csv download started`, 'success');
+}
@@ -0,0 +1,52 @@
+"""Gunicorn configuration for production: gunicorn -c gunicorn.conf.py main:app
+
+The app is loaded once in the master (with AUTO_MIGRATE=true the schema
+upgrade runs there, a single time) and forked into WEB_CONCURRENCY workers of
+WEB_THREADS threads. Each worker drops the connections inherited from the
+master, then opens its own pool, starts its expiry sweeper (with
+EXPIRY_SWEEP_INTERVAL set) and warms up before it accepts requests.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('WEB_THREADS', 4))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread' if threads > 1 else 'sync')
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+preload_app = True
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then so slow leaks cannot accumulate
+max_requests = 10000
+max_requests_jitter = 1000
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def when_ready(server):
+    from main import app
+    from backend.serving import require_secret_key
+
+    require_secret_key(app)
+
+
+def post_fork(server, worker):
+    from main import app
+    from backend.database import db
+    from backend.expiry import start_expiry_scheduler
+    from backend.serving import warm_up
+
+    with app.app_context():
+        # Connections opened in the master (primary and replicas) must not be shared across processes
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    # Threads do not survive fork, so each worker runs its own sweeper; the lease lets one sweep at a time
+    start_expiry_scheduler(app)
+    if os.environ.get('WARM_UP', 'true').lower() == 'true':
+        warmed = warm_up(app)
+        server.log.info('Worker %s warmed %d connections and %d endpoints in %d ms', worker.pid,
+                        warmed['connections'], warmed['endpoints'], warmed['ms'])
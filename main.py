@@ -4,74 +4,118 @@ from flask_restful import Api
 from flask_cors import CORS
 from backend.database import db
 
-# Create the app
-app = Flask(__name__, static_folder='frontend', static_url_path='')
-
-# Enable CORS for all domains on all routes
-CORS(app, resources={r"/api/*": {"origins": "*"}})
-
-# Setup a secret key, required by sessions
-session_secret = os.environ.get("SESSION_SECRET")
-if not session_secret:
-    raise ValueError("SESSION_SECRET environment variable is required for production deployment. Set a secure random string.")
-app.secret_key = session_secret
-
-# Configure the database
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-
-# Initialize the app with the extension
-db.init_app(app)
-
-# Initialize Flask-RESTful
-api = Api(app)
-
-# Import models and resources after app creation to avoid circular imports
-# Import resources
-from backend.resources import (
-    DonorListResource, DonorResource,
-    PatientListResource, PatientResource,
-    InventoryListResource, InventoryResource,
-    RequestListResource, RequestResource,
-    DonationRecordListResource, DonationRecordResource,
-    DashboardStatsResource
-)
-
-with app.app_context():
-    # Import models to ensure they are registered with SQLAlchemy
-    import backend.models  # noqa: F401
-    
-    # Create all tables
-    db.create_all()
-    
-    # Import and run sample data population only in development
-    if os.environ.get('FLASK_ENV') == 'development' or os.environ.get('POPULATE_SAMPLE_DATA', '').lower() == 'true':
-        from backend.sample_data import populate_sample_data
-        populate_sample_data()
-
-# Add API endpoints
-api.add_resource(DonorListResource, '/api/donors')
-api.add_resource(DonorResource, '/api/donors/<int:donor_id>')
-api.add_resource(PatientListResource, '/api/patients')
-api.add_resource(PatientResource, '/api/patients/<int:patient_id>')
-api.add_resource(InventoryListResource, '/api/inventory')
-api.add_resource(InventoryResource, '/api/inventory/<int:inventory_id>')
-api.add_resource(RequestListResource, '/api/requests')
-api.add_resource(RequestResource, '/api/requests/<int:request_id>')
-api.add_resource(DonationRecordListResource, '/api/donation-records')
-api.add_resource(DonationRecordResource, '/api/donation-records/<int:record_id>')
-api.add_resource(DashboardStatsResource, '/api/dashboard-stats')
-
-@app.route('/')
-def index():
-    return app.send_static_file('index.html')
+
+def _env_flag(name):
+    return os.environ.get(name, '').lower() == 'true'
+
+
+def create_app(config=None):
+    """Build the app: configuration, database and pool, metrics, API routes and CLI.
+
+    ``config`` overrides settings read from the environment. Creating the app
+    touches neither the schema nor the data; that happens in
+    ``prepare_database``, which runs only when AUTO_MIGRATE is set (or from
+    ``flask db upgrade`` and the development server).
+    """
+    # Create the app
+    app = Flask(__name__, static_folder='frontend', static_url_path='')
+    app.config.from_mapping(
+        SECRET_KEY=os.environ.get("SESSION_SECRET"),
+        SQLALCHEMY_DATABASE_URI=os.environ.get("DATABASE_URL"),
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        AUTO_MIGRATE=_env_flag('AUTO_MIGRATE'),
+        POPULATE_SAMPLE_DATA=os.environ.get('FLASK_ENV') == 'development' or _env_flag('POPULATE_SAMPLE_DATA'),
+        REQUIRE_IF_MATCH=_env_flag('REQUIRE_IF_MATCH'),
+    )
+    app.config.update(config or {})
+
+    # Enable CORS for all domains on all routes
+    CORS(app, resources={r"/api/*": {"origins": "*"}})
+
+    # Size the connection pool per worker process (DB_POOL_SIZE, DB_MAX_OVERFLOW, ...)
+    from backend.serving import configure_pool, pool_stats
+    configure_pool(app)
+
+    # Configure the in-process response cache for read endpoints
+    from backend.cache import response_cache
+    response_cache.configure(
+        max_entries=int(os.environ.get('CACHE_MAX_ENTRIES', 1024)),
+        ttl=float(os.environ.get('CACHE_TTL_SECONDS', 30))
+    )
+
+    # Read replicas (DATABASE_REPLICA_URLS) become extra binds of the extension
+    from backend.replicas import configure_replicas, init_replicas
+    configure_replicas(app)
+
+    # Initialize the app with the extension
+    db.init_app(app)
+
+    # GET requests read from a healthy replica; writing clients are pinned to the primary
+    replicas = init_replicas(app)
+
+    # Request latency, SQL instrumentation and the Prometheus /metrics endpoint
+    from backend.metrics import init_metrics, metrics
+    init_metrics(app)
+    metrics.register_gauges('cache', response_cache.stats)
+    metrics.register_gauges('db_pool', pool_stats)
+    if replicas is not None:
+        metrics.register_gauges('replicas', replicas.stats)
+
+    # Under saturation, queue or shed API requests by class so critical requests keep their slots
+    from backend.admission import init_admission
+    admission = init_admission(app)
+    if admission is not None:
+        metrics.register_gauges('admission', admission.stats)
+
+    # gzip/brotli for API and export responses; the frontend under content-hashed, immutable URLs
+    from backend.compression import init_compression
+    from backend.assets import init_assets
+    init_compression(app)
+    init_assets(app)
+
+    # Session listeners must be installed before any write; API routes and CLI
+    # commands are registered from tables and their modules imported on first use
+    from backend.registry import LazyAppGroup, LISTENER_MODULES, load_modules, register_resources
+    load_modules(LISTENER_MODULES)
+    register_resources(Api(app), app)
+    app.cli = LazyAppGroup(name=app.name)
+
+    if app.config['AUTO_MIGRATE']:
+        prepare_database(app)
+
+    # Sweeper settings only; the thread is started by serving processes (start_expiry_scheduler)
+    from backend.expiry import configure_expiry
+    configure_expiry(app)
+
+    return app
+
+
+def prepare_database(app, echo=print):
+    """Create missing tables, apply pending migrations, seed counters and, if enabled, sample data."""
+    from backend.migrations import upgrade
+    from backend.stats import ensure_counters
+    with app.app_context():
+        upgrade(echo=echo)
+        # Seed the materialized dashboard counters for databases that predate them
+        ensure_counters()
+        # Sample data only in development
+        if app.config['POPULATE_SAMPLE_DATA']:
+            from backend.sample_data import populate_sample_data
+            populate_sample_data()
+
+
+app = create_app()
 
 if __name__ == '__main__':
-    import os
+    # Development server; production runs under gunicorn (see gunicorn.conf.py)
+    from backend.serving import require_secret_key
+    require_secret_key(app)
+    if not app.config['AUTO_MIGRATE']:
+        prepare_database(app)
     port = int(os.environ.get('PORT', 5000))
     debug_mode = os.environ.get('FLASK_DEBUG', 'False').lower() == 'true'
-    app.run(host='0.0.0.0', port=5000, debug=debug_mode)
+    # With the reloader, only the child process that serves requests sweeps
+    if not debug_mode or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        from backend.expiry import start_expiry_scheduler
+        start_expiry_scheduler(app)
+    app.run(host='0.0.0.0', port=port, debug=debug_mode)
@@ -0,0 +1,48 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# main builds a module-level app on import: give it a secret and keep it off real data
+os.environ['SESSION_SECRET'] = 'test'
+os.environ['DATABASE_URL'] = 'sqlite://'
+for name in ('AUTO_MIGRATE', 'POPULATE_SAMPLE_DATA', 'FLASK_ENV', 'EXPIRY_SWEEP_INTERVAL', 'DATABASE_REPLICA_URLS'):
+    os.environ.pop(name, None)
+
+
+@pytest.fixture
+def app(tmp_path):
+    """A migrated app on its own SQLite file; the response cache is process-wide, so it starts empty."""
+    from main import create_app, prepare_database
+    from backend.cache import response_cache
+    from backend.database import db
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'bbms.db'}", 'TESTING': True})
+    prepare_database(app, echo=lambda message: None)
+    response_cache.clear()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+    response_cache.clear()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+DONOR = {'name': 'Ada Lovelace', 'age': 36, 'gender': 'Female', 'blood_group': 'O-',
+         'contact': '555-0100', 'location': 'London'}
+PATIENT = {'name': 'Alan Turing', 'age': 41, 'blood_group': 'A+', 'contact': '555-0101',
+           'location': 'Manchester', 'units_needed': 2}
+LOT = {'blood_group': 'O-', 'units_available': 10, 'expiry_date': '2099-01-01'}
+
+
+def create(client, path, body, key):
+    response = client.post(path, json=body)
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()[key]
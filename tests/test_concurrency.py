@@ -0,0 +1,53 @@
+from benchmarks.concurrency import DecrementScenario, run_workers
+from tests.conftest import LOT, create
+
+
+def _stock(app, lot):
+    from backend.models import BloodInventory
+    from backend.database import db
+    with app.app_context():
+        return db.session.get(BloodInventory, lot['id']).units_available
+
+
+def test_if_match_guards_updates(client):
+    lot = create(client, '/api/inventory', LOT, 'inventory')
+    path = f"/api/inventory/{lot['id']}"
+    etag = client.get(path).headers['ETag']
+
+    updated = client.put(path, json={'units_available': 8}, headers={'If-Match': etag})
+    assert updated.status_code == 200
+    assert updated.headers['ETag'] != etag
+
+    stale = client.put(path, json={'units_available': 5}, headers={'If-Match': etag})
+    assert stale.status_code == 412
+    assert stale.headers['ETag'] == updated.headers['ETag']
+    assert client.delete(path, headers={'If-Match': etag}).status_code == 412
+    assert client.get(path).get_json()['inventory']['units_available'] == 8
+
+
+def test_if_match_can_be_required(app, client):
+    lot = create(client, '/api/inventory', LOT, 'inventory')
+    app.config['REQUIRE_IF_MATCH'] = True
+    assert client.put(f"/api/inventory/{lot['id']}", json={'units_available': 8}).status_code == 428
+
+
+def test_units_delta_cannot_go_below_zero(app, client):
+    lot = create(client, '/api/inventory', LOT, 'inventory')
+    path = f"/api/inventory/{lot['id']}"
+    assert client.put(path, json={'units_delta': -11}).status_code == 409
+    assert client.put(path, json={'units_delta': -10}).status_code == 200
+    assert _stock(app, lot) == 0
+
+
+def test_concurrent_writers_lose_no_updates(app, client):
+    app.config['SLOW_QUERY_MS'] = float('inf')
+    workers, iterations = 4, 10
+    for mode in ('delta', 'if-match'):
+        lot = create(client, '/api/inventory', dict(LOT, units_available=workers * iterations), 'inventory')
+        outcome, _ = run_workers(workers, DecrementScenario(app, lot['id'], mode, iterations))
+        assert _stock(app, lot) == workers * iterations - outcome['succeeded'], mode
+        assert outcome['succeeded'] == workers * iterations, (mode, outcome)
+
+    from backend.stats import counter_drift
+    with app.app_context():
+        assert counter_drift() == {}
@@ -0,0 +1,66 @@
+import uuid
+
+from benchmarks.concurrency import IdempotencyScenario, run_workers
+from tests.conftest import DONOR, create
+
+
+def _record_body(donor):
+    return {'donor_id': donor['id'], 'donor_name': donor['name'], 'blood_group': donor['blood_group'],
+            'units_donated': 1}
+
+
+def _record_count(app, donor):
+    from backend.models import DonationRecord
+    with app.app_context():
+        return DonationRecord.query.filter_by(donor_id=donor['id']).count()
+
+
+def test_replay_returns_the_original_bytes_and_headers(app, client):
+    donor = create(client, '/api/donors', DONOR, 'donor')
+    headers = {'Idempotency-Key': 'record-1'}
+    first = client.post('/api/donation-records', json=_record_body(donor), headers=headers)
+    again = client.post('/api/donation-records', json=_record_body(donor), headers=headers)
+
+    assert first.status_code == again.status_code == 201
+    assert again.get_data() == first.get_data()
+    assert again.headers['Idempotent-Replayed'] == 'true'
+    assert 'Idempotent-Replayed' not in first.headers
+    # Server-Timing is added after the handler and describes each request's own work
+    for name, value in first.headers.items():
+        if name != 'Server-Timing':
+            assert again.headers.get(name) == value, name
+    assert _record_count(app, donor) == 1
+
+
+def test_key_reused_with_another_body_is_rejected(app, client):
+    donor = create(client, '/api/donors', DONOR, 'donor')
+    headers = {'Idempotency-Key': 'record-1'}
+    assert client.post('/api/donation-records', json=_record_body(donor), headers=headers).status_code == 201
+    body = dict(_record_body(donor), units_donated=2)
+    assert client.post('/api/donation-records', json=body, headers=headers).status_code == 422
+    assert _record_count(app, donor) == 1
+
+
+def test_failed_request_is_not_recorded(app, client):
+    donor = create(client, '/api/donors', DONOR, 'donor')
+    headers = {'Idempotency-Key': 'record-1'}
+    invalid = {name: value for name, value in _record_body(donor).items() if name != 'units_donated'}
+    assert client.post('/api/donation-records', json=invalid, headers=headers).status_code == 400
+    assert client.post('/api/donation-records', json=_record_body(donor), headers=headers).status_code == 201
+    assert _record_count(app, donor) == 1
+
+
+def test_invalid_key_is_rejected(client):
+    response = client.post('/api/donors', json=DONOR, headers={'Idempotency-Key': 'k' * 256})
+    assert response.status_code == 400
+
+
+def test_concurrent_retries_create_one_row_per_key(app, client):
+    app.config['SLOW_QUERY_MS'] = float('inf')
+    donor = create(client, '/api/donors', DONOR, 'donor')
+    keys = [uuid.uuid4().hex for _ in range(5)]
+    outcome, _ = run_workers(6, IdempotencyScenario(app, donor, keys))
+
+    assert _record_count(app, donor) == len(keys)
+    assert outcome['status_201'] == len(keys)
+    assert outcome['status_201'] + outcome['replayed'] + outcome['status_409'] == 6 * len(keys)
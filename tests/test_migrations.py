@@ -0,0 +1,75 @@
+from sqlalchemy import inspect, text
+
+from backend.database import db
+from backend.migrations import MIGRATIONS, PLAN_CHECKS, applied_versions, check_query_plans, orphan_rows, upgrade
+from tests.conftest import DONOR, PATIENT, create
+
+
+def test_dashboard_and_list_queries_use_an_index(app):
+    with app.app_context():
+        assert check_query_plans() == {}
+
+
+def test_check_plans_command(app):
+    result = app.test_cli_runner().invoke(args=['db', 'check-plans'])
+    assert result.exit_code == 0, result.output
+    assert f'All {len(PLAN_CHECKS)} query plans use an index.' in result.output
+
+
+def test_missing_index_is_reported(app):
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.execute(text('DROP INDEX ix_requests_status'))
+        assert 'requests by status' in check_query_plans()
+
+
+def test_fresh_database_records_every_migration(app):
+    with app.app_context():
+        assert applied_versions() == {version for version, _, _ in MIGRATIONS}
+        assert upgrade() == []
+
+
+def test_upgrade_adds_missing_columns_to_an_old_schema(app):
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.execute(text('DROP INDEX ix_donors_updated_at'))
+            connection.execute(text('ALTER TABLE donors DROP COLUMN updated_at'))
+            connection.execute(text('DELETE FROM schema_migrations WHERE version = 9'))
+        assert upgrade() == [9]
+        assert 'updated_at' in {column['name'] for column in inspect(db.engine).get_columns('donors')}
+        assert check_query_plans() == {}
+
+
+def test_orphan_rows_are_found(app, client):
+    donor = create(client, '/api/donors', DONOR, 'donor')
+    create(client, '/api/donation-records', {'donor_id': donor['id'], 'donor_name': donor['name'],
+                                             'blood_group': 'O-', 'units_donated': 1}, 'record')
+    with app.app_context():
+        assert orphan_rows('donation_records', 'donor_id', 'donors') == (0, [])
+        with db.engine.begin() as connection:
+            # SQLite does not enforce the key; this is how pre-foreign-key data looks
+            connection.execute(text('DELETE FROM donors'))
+        count, ids = orphan_rows('donation_records', 'donor_id', 'donors')
+        assert count == 1 and len(ids) == 1
+
+
+def test_donor_with_history_cannot_be_deleted(client):
+    donor = create(client, '/api/donors', DONOR, 'donor')
+    record = create(client, '/api/donation-records', {'donor_id': donor['id'], 'donor_name': donor['name'],
+                                                      'blood_group': 'O-', 'units_donated': 1}, 'record')
+    response = client.delete(f"/api/donors/{donor['id']}")
+    assert response.status_code == 409
+    assert '1 donation record(s)' in response.get_json()['error']
+
+    assert client.delete(f"/api/donation-records/{record['id']}").status_code == 200
+    assert client.delete(f"/api/donors/{donor['id']}").status_code == 200
+
+
+def test_patient_with_requests_cannot_be_deleted_in_a_batch(client):
+    patient = create(client, '/api/patients', PATIENT, 'patient')
+    create(client, '/api/requests', {'patient_id': patient['id'], 'patient_name': patient['name'],
+                                     'blood_group': 'A+', 'units_requested': 1}, 'request')
+    response = client.post('/api/batch', json={'operations': [
+        {'op': 'delete', 'table': 'patients', 'id': patient['id']}]})
+    assert response.status_code == 409
+    assert response.get_json()['committed'] is False
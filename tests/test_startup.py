@@ -0,0 +1,36 @@
+import threading
+
+from sqlalchemy import inspect
+
+from benchmarks.startup import PROBE, _environment, _run, lazy_modules
+
+
+def test_import_loads_no_lazy_modules(tmp_path):
+    env = _environment(f"sqlite:///{tmp_path / 'startup.db'}")
+    loaded = set(_run(env, PROBE)['modules'])
+    lazy = lazy_modules(env)
+    assert lazy, 'the registry should have modules that load on first use'
+    assert sorted(loaded & set(lazy)) == []
+
+
+def test_create_app_leaves_schema_alone(tmp_path):
+    from main import create_app
+    from backend.database import db
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'empty.db'}"})
+    with app.app_context():
+        assert inspect(db.engine).get_table_names() == []
+        db.engine.dispose()
+
+
+def test_create_app_starts_no_sweeper(tmp_path):
+    from main import create_app
+
+    create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'bbms.db'}", 'EXPIRY_SWEEP_INTERVAL': 1})
+    assert 'expiry-sweeper' not in [thread.name for thread in threading.enumerate()]
+
+
+def test_lazy_route_resolves_on_first_request(client):
+    response = client.get('/api/donors')
+    assert response.status_code == 200
+    assert client.get('/api/donors').status_code == 200
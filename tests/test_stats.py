@@ -0,0 +1,62 @@
+from datetime import date
+
+from tests.conftest import DONOR, LOT, PATIENT, create
+
+
+def _drift(app):
+    from backend.stats import counter_drift
+    with app.app_context():
+        return counter_drift()
+
+
+def _summary(client):
+    return client.get('/api/dashboard-stats').get_json()['summary_cards']
+
+
+def test_counters_follow_single_record_writes(app, client):
+    donor = create(client, '/api/donors', DONOR, 'donor')
+    patient = create(client, '/api/patients', PATIENT, 'patient')
+    lot = create(client, '/api/inventory', LOT, 'inventory')
+    create(client, '/api/donation-records', {'donor_id': donor['id'], 'donor_name': DONOR['name'],
+                                             'blood_group': 'O-', 'units_donated': 1}, 'record')
+    request = create(client, '/api/requests', {'patient_id': patient['id'], 'patient_name': PATIENT['name'],
+                                               'blood_group': 'A+', 'units_requested': 2}, 'request')
+    assert _summary(client)['pending_requests'] == 1
+
+    assert client.put(f"/api/inventory/{lot['id']}", json={'units_delta': -3}).status_code == 200
+    assert client.put(f"/api/requests/{request['id']}", json={'status': 'Rejected'}).status_code == 200
+    assert client.put(f"/api/inventory/{lot['id']}", json={'blood_group': 'B+'}).status_code == 200
+    assert _drift(app) == {}
+
+    summary = _summary(client)
+    assert (summary['total_donors'], summary['total_blood_units'], summary['pending_requests']) == (1, 7, 0)
+
+    assert client.delete(f"/api/inventory/{lot['id']}").status_code == 200
+    assert client.delete(f"/api/requests/{request['id']}").status_code == 200
+    assert _drift(app) == {}
+    assert _summary(client)['total_blood_units'] == 0
+
+
+def test_counters_follow_bulk_batch_and_sweep(app, client):
+    rows = '\n'.join(['blood_group,units_available,expiry_date',
+                      'A+,5,2099-01-01', 'B-,4,2000-01-01', 'AB+,nope,2099-01-01'])
+    response = client.post('/api/bulk/inventory', data=rows, content_type='text/csv')
+    assert response.status_code == 207
+    assert response.get_json()['inserted'] == 2
+    assert _drift(app) == {}
+
+    lots = client.get('/api/inventory').get_json()['inventory']
+    by_group = {lot['blood_group']: lot['id'] for lot in lots}
+    response = client.post('/api/batch', json={'operations': [
+        {'op': 'update', 'table': 'inventory', 'id': by_group['A+'], 'data': {'units_available': 9}},
+        {'op': 'create', 'table': 'inventory', 'data': dict(LOT)},
+        {'op': 'create', 'table': 'donors', 'data': dict(DONOR)},
+    ]})
+    assert response.status_code == 200, response.get_json()
+    assert _drift(app) == {}
+
+    from backend.expiry import sweep_expired
+    with app.app_context():
+        assert sweep_expired(today=date(2024, 1, 1)) == 1
+    assert _drift(app) == {}
+    assert _summary(client)['total_blood_units'] == 19
@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from tests.conftest import DONOR, LOT, create
+
+
+@pytest.fixture
+def app(app):
+    # No grace period: each sync sees everything committed before it, once
+    app.config['SYNC_GRACE_SECONDS'] = 0
+    return app
+
+
+def _sync(client, since=None, **params):
+    if since:
+        params['since'] = since
+    response = client.get('/api/sync', query_string=params)
+    assert response.status_code == 200, response.get_json()
+    assert response.headers['Cache-Control'] == 'no-store'
+    return response.get_json()
+
+
+def _ids(body, table):
+    section = body['tables'].get(table, {'columns': ['id'], 'rows': []})
+    position = section['columns'].index('id')
+    return [row[position] for row in section['rows']]
+
+
+def test_delta_carries_changes_and_tombstones(client):
+    donor = create(client, '/api/donors', DONOR, 'donor')
+    lot = create(client, '/api/inventory', LOT, 'inventory')
+    full = _sync(client)
+    assert full['reset'] is False and full['more'] is False
+    assert _ids(full, 'donors') == [donor['id']]
+    assert 'updated_at' not in full['tables']['donors']['columns']
+
+    assert _sync(client, full['next'])['tables'] == {}
+
+    assert client.put(f"/api/inventory/{lot['id']}", json={'units_delta': -1}).status_code == 200
+    assert client.delete(f"/api/donors/{donor['id']}").status_code == 200
+    delta = _sync(client, full['next'])
+    assert _ids(delta, 'blood_inventory') == [lot['id']]
+    assert delta['tables']['donors'] == {'columns': full['tables']['donors']['columns'], 'rows': [],
+                                         'deleted': [donor['id']]}
+
+    assert _sync(client, delta['next'])['tables'] == {}
+
+
+def test_reused_id_is_sent_as_a_change(client):
+    donor = create(client, '/api/donors', DONOR, 'donor')
+    since = _sync(client)['next']
+    assert client.delete(f"/api/donors/{donor['id']}").status_code == 200
+    again = create(client, '/api/donors', dict(DONOR, name='Grace Hopper'), 'donor')
+    assert again['id'] == donor['id']
+
+    delta = _sync(client, since)
+    assert _ids(delta, 'donors') == [again['id']]
+    assert delta['tables']['donors']['deleted'] == []
+
+
+def test_limit_pages_through_changes(client):
+    ids = [create(client, '/api/donors', dict(DONOR, contact=f'555-01{n:02}'), 'donor')['id'] for n in range(5)]
+    seen, since = [], None
+    for _ in range(5):
+        body = _sync(client, since, limit=2)
+        seen += _ids(body, 'donors')
+        since = body['next']
+        if not body['more']:
+            break
+    assert seen == ids
+
+
+def test_stale_client_is_reset_and_old_tombstones_pruned(app, client):
+    from backend.models import Tombstone
+    from backend.sync import changes_since, prune_tombstones
+
+    donor = create(client, '/api/donors', DONOR, 'donor')
+    since = _sync(client)['next']
+    assert client.delete(f"/api/donors/{donor['id']}").status_code == 200
+    later = datetime.utcnow() + timedelta(days=31)
+
+    with app.app_context():
+        body = changes_since(since, now=later)
+        assert body['reset'] is True
+        assert body['tables'] == {}
+        assert prune_tombstones(now=later) == 1
+        assert Tombstone.query.count() == 0
+
+
+def test_malformed_token_is_rejected(client):
+    assert client.get('/api/sync', query_string={'since': 'nope'}).status_code == 400
+    assert client.get('/api/sync', query_string={'limit': 0}).status_code == 400